@@ -0,0 +1,202 @@
+from collections import deque
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# fuzzy fallback: search this many characters around the claimed range, accept at this similarity
+FUZZY_WINDOW = 40
+FUZZY_MIN_RATIO = 0.8
+
+
+class AhoCorasick:
+    """multi-pattern matcher: all occurrences of all patterns in one pass over the text"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.goto: List[Dict[str, int]] = [{}]
+        self.fail: List[int] = [0]
+        self.out: List[List[str]] = [[]]
+        for pattern in set(patterns):
+            if pattern:
+                self._add(pattern)
+        self._link()
+
+    def _add(self, pattern: str):
+        state = 0
+        for ch in pattern:
+            nxt = self.goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[state][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.out.append([])
+            state = nxt
+        self.out[state].append(pattern)
+
+    def _link(self):
+        queue = deque(self.goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self.goto[state].items():
+                queue.append(nxt)
+                f = self.fail[state]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0) if self.goto[f].get(ch, 0) != nxt else 0
+                self.out[nxt] = self.out[nxt] + self.out[self.fail[nxt]]
+
+    def find_all(self, text: str) -> Dict[str, List[int]]:
+        """pattern -> start offsets of its occurrences in text"""
+        found: Dict[str, List[int]] = {}
+        goto, fail, out = self.goto, self.fail, self.out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for pattern in out[state]:
+                found.setdefault(pattern, []).append(i - len(pattern) + 1)
+        return found
+
+
+def _range(value: Any) -> Optional[Tuple[int, int]]:
+    if isinstance(value, (list, tuple)) and len(value) == 2 and all(isinstance(v, int) for v in value):
+        return value[0], value[1]
+    return None
+
+
+def _fuzzy_find(content: str, term: str, near: int) -> Optional[int]:
+    """start of the best approximate occurrence of term within FUZZY_WINDOW of near"""
+    n = len(term)
+    lo, hi = max(0, near - FUZZY_WINDOW), min(len(content), near + n + FUZZY_WINDOW)
+    matcher = SequenceMatcher(autojunk=False)
+    matcher.set_seq2(term.lower())
+    best, best_start = FUZZY_MIN_RATIO, None
+    for start in range(lo, max(lo, hi - n) + 1):
+        matcher.set_seq1(content[start:start + n].lower())
+        if matcher.real_quick_ratio() < best or matcher.quick_ratio() < best:
+            continue
+        ratio = matcher.ratio()
+        if ratio > best or (ratio == best and (best_start is None or abs(start - near) < abs(best_start - near))):
+            best, best_start = ratio, start
+    return best_start
+
+
+def _whole_word(content: str, start: int, end: int) -> bool:
+    """no letter or digit continues the match on either side (same test as GlossaryMatcher.annotate)"""
+    return not ((start > 0 and content[start - 1].isalnum() and content[start].isalnum()) or
+                (end < len(content) and content[end - 1].isalnum() and content[end].isalnum()))
+
+
+def _snap_to_words(content: str, start: int, end: int) -> Optional[Tuple[int, int]]:
+    """clamp to the content and widen to whole words; None if nothing is left"""
+    start, end = max(0, min(start, len(content))), max(0, min(end, len(content)))
+    while start < end and content[start].isspace():
+        start += 1
+    while end > start and content[end - 1].isspace():
+        end -= 1
+    if start >= end:
+        return None
+    while start > 0 and content[start - 1].isalnum() and content[start].isalnum():
+        start -= 1
+    while end < len(content) and content[end - 1].isalnum() and content[end].isalnum():
+        end += 1
+    return start, end
+
+
+class AlignStats(dict):
+    """counts of ranges checked / repaired / dropped"""
+
+    def __init__(self):
+        super().__init__(checked=0, repaired=0, dropped=0)
+
+    def add(self, other: Dict[str, int]):
+        for key, value in other.items():
+            self[key] = self.get(key, 0) + value
+
+
+def align_annotations(content: str, annotations: Dict[str, Any], occurrences: Dict[str, List[int]],
+                      stats: AlignStats) -> Dict[str, Any]:
+    """
+    repair the ranges of one block's raw LLM annotations against its content
+    occurrences: lowercased term -> start offsets in content (from the batch automaton)
+    """
+    anchors = []
+    for anchor in annotations.get("bilingual_anchors") or []:
+        stats["checked"] += 1
+        if not isinstance(anchor, dict) or not isinstance(anchor.get("term"), str) or not anchor["term"].strip():
+            stats["dropped"] += 1
+            continue
+        term = anchor["term"].strip()
+        claimed = _range(anchor.get("range"))
+        if claimed and content[claimed[0]:claimed[1]] == term and _whole_word(content, *claimed):
+            anchors.append(anchor)
+            continue
+
+        near = claimed[0] if claimed else 0
+        starts = occurrences.get(term.lower(), [])
+        # prefer whole-word occurrences ("cat" in "the cat", not in "concatenate"), then exact case
+        starts = [s for s in starts if _whole_word(content, s, s + len(term))] or starts
+        exact = [s for s in starts if content[s:s + len(term)] == term]
+        candidates = exact or starts
+        start = min(candidates, key=lambda s: abs(s - near)) if candidates else _fuzzy_find(content, term, near)
+        if start is None:
+            stats["dropped"] += 1
+            continue
+        anchors.append(dict(anchor, range=[start, start + len(term)]))
+        if claimed != (start, start + len(term)):
+            stats["repaired"] += 1
+    if "bilingual_anchors" in annotations:
+        annotations = dict(annotations, bilingual_anchors=anchors)
+
+    topic = _range(annotations.get("topic_sentence_range"))
+    if annotations.get("topic_sentence_range") is not None:
+        stats["checked"] += 1
+        snapped = _snap_to_words(content, *topic) if topic else None
+        if snapped is None:
+            stats["dropped"] += 1
+        elif snapped != topic:
+            stats["repaired"] += 1
+        annotations = dict(annotations, topic_sentence_range=list(snapped) if snapped else None)
+
+    svo = annotations.get("svo_structure")
+    if isinstance(svo, dict):
+        # svo ranges are relative to the topic sentence, so they go with it
+        topic = _range(annotations.get("topic_sentence_range"))
+        sentence = content[topic[0]:topic[1]] if topic else ""
+        repaired_svo = {}
+        for role, value in svo.items():
+            stats["checked"] += 1
+            claimed = _range(value)
+            snapped = _snap_to_words(sentence, *claimed) if claimed and sentence else None
+            if snapped is None:
+                stats["dropped"] += 1
+                continue
+            if snapped != claimed:
+                stats["repaired"] += 1
+            repaired_svo[role] = list(snapped)
+        annotations = dict(annotations, svo_structure=repaired_svo or None)
+    return annotations
+
+
+def align_batch(batch: List[Dict[str, Any]], matched: Dict[int, Dict[str, Any]]) -> AlignStats:
+    """
+    re-anchor the annotations of one LLM batch (position -> raw annotations, as from
+    match_batch_annotations) in place; one automaton over all terms of the batch
+    """
+    stats = AlignStats()
+    if not matched:
+        return stats
+    # length-preserving lowercasing only, so offsets in the lowered text are offsets in the content
+    lowered = {i: batch[i].get("content", "").lower() for i in matched}
+    terms = [anchor["term"].strip().lower()
+             for annotations in matched.values() if isinstance(annotations, dict)
+             for anchor in annotations.get("bilingual_anchors") or []
+             if isinstance(anchor, dict) and isinstance(anchor.get("term"), str)]
+    automaton = AhoCorasick(terms)
+    for i, annotations in list(matched.items()):
+        if not isinstance(annotations, dict):
+            continue
+        content = batch[i].get("content", "")
+        occurrences = automaton.find_all(lowered[i]) if len(lowered[i]) == len(content) else {}
+        matched[i] = align_annotations(content, annotations, occurrences, stats)
+    return stats
@@ -0,0 +1,391 @@
+import json
+import math
+import os
+import queue
+import re
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+# append-only gaze store under repo-root data/
+ANALYTICS_DIR = Path(os.getenv(
+    "ANALYTICS_DIR", Path(__file__).resolve().parent.parent / "data" / "analytics"))
+# the writer appends whatever arrived within this window in one write per column
+ANALYTICS_FLUSH_MS = int(os.getenv("ANALYTICS_FLUSH_MS", "250"))
+# beacons waiting for the writer; above it the endpoint answers 503
+ANALYTICS_QUEUE_MAX = int(os.getenv("ANALYTICS_QUEUE_MAX", "10000"))
+ANALYTICS_MAX_BEACON_BYTES = int(os.getenv("ANALYTICS_MAX_BEACON_BYTES", str(256 * 1024)))
+# longer dwell values are clamped (a tab left open is not reading)
+MAX_DWELL_MS = 10 * 60 * 1000
+
+# one uint32 file per column, one row per (beacon, block) event
+COLUMNS = ("time", "session", "block", "dwell_ms")
+BLOCKS_FILE = "blocks.txt"      # block id of each block code, one per line
+SESSIONS_FILE = "sessions.txt"  # session id of each session code (code 0 = anonymous)
+
+# ids become directory names: no separators, and not "." / ".."
+_ID = re.compile(r"(?!\.+$)[A-Za-z0-9_.:-]{1,128}$")
+_U32 = "I" if array("I").itemsize == 4 else "L"
+
+
+class BeaconError(ValueError):
+    """a beacon payload that cannot be ingested (answered with 400)"""
+
+
+class Beacon(NamedTuple):
+    doc_id: str
+    session_id: Optional[str]
+    dwell: List[Tuple[str, int]]  # (block id, milliseconds)
+
+
+def _valid_id(value: Any) -> bool:
+    return isinstance(value, str) and _ID.match(value) is not None
+
+
+def _beacon(doc_id: Any, session_id: Any, dwell: Any) -> Beacon:
+    if not _valid_id(doc_id):
+        raise BeaconError("missing or invalid doc_id")
+    if session_id is not None and not _valid_id(session_id):
+        raise BeaconError("invalid session_id")
+    if not isinstance(dwell, dict):
+        raise BeaconError("dwell must map block ids to milliseconds")
+    entries = []
+    for block_id, ms in dwell.items():
+        # ids become lines of blocks.txt, so no line separator of any kind (\r, \x85, \u2028, ...);
+        # non-positive or non-numeric dwell is skipped
+        if not block_id or len(block_id) > 256 or block_id.splitlines() != [block_id]:
+            continue
+        if isinstance(ms, bool) or not isinstance(ms, (int, float)) or not ms > 0:
+            continue
+        entries.append((block_id, min(int(ms), MAX_DWELL_MS)))
+    return Beacon(doc_id, session_id, entries)
+
+
+def parse_beacon(body: bytes, doc_id: Optional[str] = None, session_id: Optional[str] = None) -> List[Beacon]:
+    """
+    beacons of one request body; accepted shapes:
+        {"doc_id": ..., "session_id": ..., "dwell": {block_id: ms}}
+        a list of those (beacons batched by the client)
+        {block_id: ms} with doc_id (and session_id) from the query string
+    """
+    if len(body) > ANALYTICS_MAX_BEACON_BYTES:
+        raise BeaconError("beacon too large")
+    try:
+        data = json.loads(body)
+    except ValueError:
+        raise BeaconError("beacon is not valid JSON")
+    if isinstance(data, dict) and "dwell" in data:
+        data = [data]
+    if isinstance(data, list):
+        return [
+            _beacon(item.get("doc_id", doc_id), item.get("session_id", session_id), item.get("dwell"))
+            if isinstance(item, dict) else _beacon(None, None, None)
+            for item in data
+        ]
+    return [_beacon(doc_id, session_id, data)]
+
+
+class _DocDwell:
+    """
+    one document's dwell data in memory, rebuilt from its columns on first use
+    per block: an array of dwell totals, one slot per session (anonymous beacons get a slot each),
+    and a sorted copy that is rebuilt only after the block changed
+    """
+
+    def __init__(self):
+        self.block_ids: List[str] = []
+        self.block_codes: Dict[str, int] = {}
+        self.session_ids: List[Optional[str]] = [None]
+        self.session_codes: Dict[str, int] = {}
+        self.totals: List[array] = []
+        self.slots: List[Dict[int, int]] = []
+        self.sorted: List[Optional[array]] = []
+        self.events = 0
+
+    def block_code(self, block_id: str) -> Tuple[int, bool]:
+        code = self.block_codes.get(block_id)
+        if code is not None:
+            return code, False
+        code = self.block_codes[block_id] = len(self.block_ids)
+        self.block_ids.append(block_id)
+        self.totals.append(array(_U32))
+        self.slots.append({})
+        self.sorted.append(None)
+        return code, True
+
+    def session_code(self, session_id: Optional[str]) -> Tuple[int, bool]:
+        if session_id is None:
+            return 0, False
+        code = self.session_codes.get(session_id)
+        if code is not None:
+            return code, False
+        code = self.session_codes[session_id] = len(self.session_ids)
+        self.session_ids.append(session_id)
+        return code, True
+
+    def add(self, session: int, block: int, ms: int):
+        totals, slots = self.totals[block], self.slots[block]
+        slot = slots.get(session) if session else None
+        if slot is None:
+            if session:
+                slots[session] = len(totals)
+            totals.append(ms)
+        else:
+            totals[slot] = min(totals[slot] + ms, 0xFFFFFFFF)
+        self.sorted[block] = None
+        self.events += 1
+
+    def sorted_totals(self, block: int) -> array:
+        if self.sorted[block] is None:
+            self.sorted[block] = array(_U32, sorted(self.totals[block]))
+        return self.sorted[block]
+
+
+def _read_lines(path: Path) -> List[str]:
+    if not path.exists():
+        return []
+    # split on "\n" only, the one separator the store writes (the file ends with one after _repair_lines)
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        return f.read().split("\n")[:-1]
+
+
+def _read_column(path: Path) -> array:
+    column = array(_U32)
+    if path.exists():
+        with open(path, "rb") as f:
+            data = f.read()
+        column.frombytes(data[:len(data) - len(data) % column.itemsize])
+    return column
+
+
+def _repair_lines(path: Path):
+    """cut a partial last line (a crash mid-append) so the next append starts on a line of its own"""
+    if not path.exists():
+        return
+    with open(path, "rb+") as f:
+        data = f.read()
+        if data and not data.endswith(b"\n"):
+            f.truncate(data.rfind(b"\n") + 1)
+
+
+def _repair_columns(doc_dir: Path, rows: int):
+    """cut every column to rows (drops rows of a crash mid-append and partial trailing values)"""
+    size = rows * array(_U32).itemsize
+    for name in COLUMNS:
+        path = doc_dir / f"{name}.u32"
+        if path.exists() and path.stat().st_size != size:
+            os.truncate(path, size)
+            print(f"[Analytics] Truncated {path} to {rows} rows")
+
+
+def percentile(sorted_values: array, q: float) -> int:
+    """nearest-rank percentile of a sorted array"""
+    rank = max(1, math.ceil(q / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+
+class GazeStore:
+    """
+    append-only columnar dwell store, written by one background thread
+    the endpoint only parses and enqueues; the writer appends every flush window's events in one
+    write per column and per document, and keeps per-block aggregates current in memory
+    """
+
+    def __init__(self, root: Path = ANALYTICS_DIR, flush_s: float = ANALYTICS_FLUSH_MS / 1000,
+                 queue_max: int = ANALYTICS_QUEUE_MAX):
+        self.root = Path(root)
+        self.flush_s = flush_s
+        self._queue: "queue.Queue[Optional[Beacon]]" = queue.Queue(maxsize=queue_max)
+        self._lock = threading.Lock()        # in-memory documents
+        self._write_lock = threading.RLock()  # column files (held while a document loads)
+        self._docs: Dict[str, _DocDwell] = {}
+        self._thread: Optional[threading.Thread] = None
+        self.beacons_dropped = 0
+        self.events_written = 0
+        self.flushes = 0
+
+    # --- ingestion ---------------------------------------------------------
+
+    def submit(self, beacons: Iterable[Beacon]) -> bool:
+        """enqueue beacons for the writer; False (nothing enqueued past that point) when the queue is full"""
+        for beacon in beacons:
+            try:
+                self._queue.put_nowait(beacon)
+            except queue.Full:
+                self.beacons_dropped += 1
+                return False
+        return True
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="gaze-writer", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        """write what is queued and stop the writer"""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        while True:
+            beacon = self._queue.get()
+            if beacon is None:
+                return
+            batch = [beacon]
+            deadline = time.monotonic() + self.flush_s
+            while True:
+                timeout = deadline - time.monotonic()
+                try:
+                    beacon = self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if beacon is None:
+                    self._write(batch)
+                    return
+                batch.append(beacon)
+            self._write(batch)
+
+    def flush(self):
+        """write everything queued now, in the calling thread"""
+        batch = []
+        while True:
+            try:
+                beacon = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if beacon is not None:
+                batch.append(beacon)
+        if batch:
+            self._write(batch)
+
+    def _write(self, beacons: List[Beacon]):
+        by_doc: Dict[str, List[Beacon]] = {}
+        for beacon in beacons:
+            if beacon.dwell:
+                by_doc.setdefault(beacon.doc_id, []).append(beacon)
+        now = int(time.time())
+        with self._write_lock:
+            for doc_id, doc_beacons in by_doc.items():
+                try:
+                    self._append(doc_id, doc_beacons, now)
+                except OSError as e:
+                    print(f"[Analytics] Could not write gaze events of {doc_id}: {e}")
+            self.flushes += 1
+
+    def _append(self, doc_id: str, beacons: List[Beacon], now: int):
+        doc = self._document(doc_id)
+        columns = {name: array(_U32) for name in COLUMNS}
+        new_blocks, new_sessions = [], []
+        with self._lock:
+            for beacon in beacons:
+                session, is_new = doc.session_code(beacon.session_id)
+                if is_new:
+                    new_sessions.append(beacon.session_id)
+                for block_id, ms in beacon.dwell:
+                    block, is_new = doc.block_code(block_id)
+                    if is_new:
+                        new_blocks.append(block_id)
+                    doc.add(session, block, ms)
+                    columns["time"].append(now)
+                    columns["session"].append(session)
+                    columns["block"].append(block)
+                    columns["dwell_ms"].append(ms)
+
+        doc_dir = self.root / doc_id
+        doc_dir.mkdir(parents=True, exist_ok=True)
+        # dictionaries first: a crash between the files leaves unused codes, never unknown ones
+        for filename, lines in ((BLOCKS_FILE, new_blocks), (SESSIONS_FILE, new_sessions)):
+            if lines:
+                with open(doc_dir / filename, "a", encoding="utf-8", newline="") as f:
+                    f.write("".join(line + "\n" for line in lines))
+        for name, column in columns.items():
+            with open(doc_dir / f"{name}.u32", "ab") as f:
+                column.tofile(f)
+        self.events_written += len(columns["time"])
+
+    # --- queries -----------------------------------------------------------
+
+    def _document(self, doc_id: str) -> _DocDwell:
+        """the in-memory document, loaded from its columns on first use (file I/O: off the event loop)"""
+        with self._lock:
+            doc = self._docs.get(doc_id)
+        if doc is not None:
+            return doc
+        with self._write_lock:
+            with self._lock:
+                doc = self._docs.get(doc_id)
+            if doc is None:
+                doc = self._load(self.root / doc_id)
+                with self._lock:
+                    self._docs[doc_id] = doc
+        return doc
+
+    @staticmethod
+    def _load(doc_dir: Path) -> _DocDwell:
+        """read a document's files, repairing them first (called under _write_lock, before any append)"""
+        doc = _DocDwell()
+        for filename in (BLOCKS_FILE, SESSIONS_FILE):
+            _repair_lines(doc_dir / filename)
+        for block_id in _read_lines(doc_dir / BLOCKS_FILE):
+            doc.block_code(block_id)
+        for session_id in _read_lines(doc_dir / SESSIONS_FILE):
+            doc.session_code(session_id)
+        columns = [_read_column(doc_dir / f"{name}.u32") for name in COLUMNS]
+        # rows past the shortest column were cut off by a crash mid-append; the files are cut back
+        # to that length so the next append lines up again
+        rows = min(len(column) for column in columns)
+        _repair_columns(doc_dir, rows)
+        _, sessions, blocks, dwell = columns
+        for row in range(rows):
+            if blocks[row] < len(doc.block_ids) and sessions[row] < len(doc.session_ids):
+                doc.add(sessions[row], blocks[row], dwell[row])
+        if rows:
+            print(f"[Analytics] Loaded {rows} gaze events of {doc_dir.name}")
+        return doc
+
+    def document(self, doc_id: str) -> Optional[_DocDwell]:
+        """the in-memory dwell data of a document, None if it has none"""
+        if not self.has_document(doc_id):
+            return None
+        return self._document(doc_id)
+
+    def has_document(self, doc_id: str) -> bool:
+        with self._lock:
+            if doc_id in self._docs:
+                return True
+        return (self.root / doc_id / BLOCKS_FILE).exists()
+
+    def dwell_percentiles(self, doc_id: str, percentiles: List[float]) -> Optional[Dict[str, Any]]:
+        """
+        per-block dwell percentiles (ms, over sessions) of one document, None if it has no data
+        only blocks that received events since the last query are re-sorted
+        """
+        if not self.has_document(doc_id):
+            return None
+        doc = self._document(doc_id)
+        blocks = {}
+        with self._lock:
+            for code, block_id in enumerate(doc.block_ids):
+                values = doc.sorted_totals(code)
+                if not values:
+                    continue
+                summary = {"samples": len(values), "total_ms": sum(values)}
+                for q in percentiles:
+                    summary[f"p{q:g}"] = percentile(values, q)
+                blocks[block_id] = summary
+            return {"doc_id": doc_id, "events": doc.events, "sessions": len(doc.session_ids) - 1,
+                    "blocks": blocks}
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            documents = len(self._docs)
+        return {"queued": self._queue.qsize(), "events_written": self.events_written,
+                "beacons_dropped": self.beacons_dropped, "flushes": self.flushes, "documents_loaded": documents}
+
+
+gaze_store = GazeStore()
@@ -0,0 +1,150 @@
+import gzip
+import json
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+
+from schemas import DocumentResponse, BlockSource
+from block_index import (CONTENT_FILE, OFFSETS_FILE, BLOCKS_META_FILE, SOURCES_FILE, SOURCES_OFFSETS_FILE,
+                         serialize_indexed, serialize_sources, pack_offsets, index_files, has_index)
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# compression levels for the precompressed responses (paid once per document, not per request)
+ARTIFACT_GZIP_LEVEL = int(os.getenv("ARTIFACT_GZIP_LEVEL", "9"))
+ARTIFACT_BROTLI_QUALITY = int(os.getenv("ARTIFACT_BROTLI_QUALITY", "9"))
+
+# get_pdf's success response around the content.json bytes
+ENVELOPE_PREFIX = b'{"status":"success","data":'
+ENVELOPE_SUFFIX = b'}'
+# Content-Encoding -> precompressed response file, in server preference order
+RESPONSE_VARIANTS = {"br": "response.json.br", "gzip": "response.json.gz"}
+
+
+def serialize_document(document: DocumentResponse) -> bytes:
+    """compact content.json bytes (pydantic's serializer, no indentation)"""
+    return document.model_dump_json().encode("utf-8")
+
+
+def envelope(content: bytes) -> bytes:
+    return ENVELOPE_PREFIX + content + ENVELOPE_SUFFIX
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    if encoding == "gzip":
+        # mtime=0: the same document always compresses to the same bytes
+        return gzip.compress(data, compresslevel=ARTIFACT_GZIP_LEVEL, mtime=0)
+    if encoding == "br":
+        return brotli.compress(data, quality=ARTIFACT_BROTLI_QUALITY)
+    raise ValueError(f"unsupported encoding: {encoding}")
+
+
+def available_encodings() -> List[str]:
+    return [encoding for encoding in RESPONSE_VARIANTS if encoding != "br" or brotli is not None]
+
+
+def write_atomic(path: Path, data: bytes):
+    """
+    temp file + rename: readers see the old file or the whole new one, never a partial write
+    the temp name is unique, so concurrent writers of the same path never share one (the last rename wins)
+    """
+    fd, tmp_name = tempfile.mkstemp(dir=path.parent, prefix=path.name + ".", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_name, path)
+    except BaseException:
+        Path(tmp_name).unlink(missing_ok=True)
+        raise
+
+
+def write_content_artifacts(target_dir: Path, document: DocumentResponse,
+                            sources: Optional[List[BlockSource]] = None) -> Dict[str, Any]:
+    """
+    write content.json, its block index sidecars, the block sources (in document block order)
+    and the precompressed get_pdf responses
+    content.json goes last: its existence is what marks the document as ready
+    returns bytes and encode seconds per format
+    """
+    stats: Dict[str, Any] = {}
+    start = time.perf_counter()
+    content, spans = serialize_indexed(document)
+    stats["json"] = {"bytes": len(content), "encode_s": round(time.perf_counter() - start, 4)}
+
+    for filename, data in index_files(document, content, spans).items():
+        write_atomic(target_dir / filename, data)
+    if sources:
+        # aligned with the document's blocks, whose positions blocks.json records
+        by_id = {source.id: source for source in sources}
+        data, source_spans = serialize_sources([by_id.get(block.id) or BlockSource(id=block.id)
+                                                for block in document.blocks])
+        write_atomic(target_dir / SOURCES_OFFSETS_FILE, pack_offsets(source_spans, data))
+        write_atomic(target_dir / SOURCES_FILE, data)
+        stats["sources"] = {"bytes": len(data)}
+    else:
+        # no stale sources of another version of the document
+        for filename in (SOURCES_OFFSETS_FILE, SOURCES_FILE):
+            (target_dir / filename).unlink(missing_ok=True)
+
+    response = envelope(content)
+    for encoding in available_encodings():
+        start = time.perf_counter()
+        compressed = compress(response, encoding)
+        write_atomic(target_dir / RESPONSE_VARIANTS[encoding], compressed)
+        stats[encoding] = {"bytes": len(compressed), "encode_s": round(time.perf_counter() - start, 4)}
+
+    write_atomic(target_dir / CONTENT_FILE, content)
+    return stats
+
+
+def remove_content_artifacts(target_dir: Path):
+    """delete a document's content.json (first, so it stops being ready), sidecars and responses"""
+    for filename in (CONTENT_FILE, OFFSETS_FILE, BLOCKS_META_FILE, SOURCES_FILE, SOURCES_OFFSETS_FILE,
+                     *RESPONSE_VARIANTS.values()):
+        (target_dir / filename).unlink(missing_ok=True)
+
+
+def ensure_block_index(doc_dir: Path) -> bool:
+    """
+    rewrite a document written before the block index existed (indented content.json, no sidecars)
+    source html / offset maps still stored in its blocks move to the sources sidecar
+    returns True if it was rewritten; the caller invalidates cached responses
+    """
+    if has_index(doc_dir):
+        return False
+    with open(doc_dir / CONTENT_FILE, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    document = DocumentResponse.model_validate(data)
+    sources = [BlockSource(id=block["id"], html=block.get("html"), offset_map=block.get("offset_map"))
+               for block in data.get("blocks", [])]
+    write_content_artifacts(doc_dir, document,
+                            sources if any(source.offset_map is not None for source in sources) else None)
+    print(f"[Artifacts] Added block index to {doc_dir.name}")
+    return True
+
+
+def parse_accept_encoding(header: Optional[str]) -> Dict[str, float]:
+    """Accept-Encoding -> {coding: q}"""
+    accepted: Dict[str, float] = {}
+    for item in (header or "").split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.strip().partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        accepted[coding] = q
+    return accepted
@@ -0,0 +1,141 @@
+import os
+import re
+from typing import List, Dict, Any, Optional, Tuple
+
+# token budgets per LLM call (estimated locally, system prompt excluded)
+LLM_BATCH_INPUT_TOKENS = int(os.getenv("LLM_BATCH_INPUT_TOKENS", "4000"))
+LLM_BATCH_OUTPUT_TOKENS = int(os.getenv("LLM_BATCH_OUTPUT_TOKENS", "6000"))
+LLM_BATCH_MAX_BLOCKS = int(os.getenv("LLM_BATCH_MAX_BLOCKS", "25"))
+# blocks above this many input tokens are split at sentence boundaries
+LLM_BLOCK_MAX_TOKENS = int(os.getenv("LLM_BLOCK_MAX_TOKENS", "600"))
+
+# expected annotation output on top of the echoed content
+PARAGRAPH_OUTPUT_TOKENS = 400
+HEADING_OUTPUT_TOKENS = 60
+# per-block JSON framing ({"id":..,"type":..,"content":..})
+BLOCK_OVERHEAD_TOKENS = 12
+
+PART_SEPARATOR = "#part"
+
+_SENTENCE_END = re.compile(r'[.!?。！？；;]["\')\]]*\s+')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    local token estimate: ~4 chars per token for ASCII, ~1 token per CJK / non-ASCII char
+    """
+    if not text:
+        return 0
+    non_ascii = len(text) - len(text.encode("ascii", "ignore"))
+    return (len(text) - non_ascii) // 4 + non_ascii + 1
+
+
+def estimate_block_input_tokens(block: Dict[str, Any]) -> int:
+    return estimate_tokens(block.get("content", "")) + BLOCK_OVERHEAD_TOKENS
+
+
+def estimate_block_output_tokens(block: Dict[str, Any]) -> int:
+    # the model echoes id/type/content before the annotations
+    annotations = HEADING_OUTPUT_TOKENS if block.get("type") == "heading" else PARAGRAPH_OUTPUT_TOKENS
+    return estimate_block_input_tokens(block) + annotations
+
+
+def split_oversized_block(block: Dict[str, Any], max_tokens: int = LLM_BLOCK_MAX_TOKENS) -> List[Tuple[int, Dict[str, Any]]]:
+    """
+    split a block whose content exceeds max_tokens at sentence boundaries
+    returns [(char_offset, part_block)]; part ids are "<id>#part<n>"
+    a block that fits is returned as [(0, block)]
+    """
+    content = block.get("content", "")
+    if estimate_tokens(content) <= max_tokens:
+        return [(0, block)]
+
+    # candidate cut points after sentence ends, plus the end of the text
+    cuts = [m.end() for m in _SENTENCE_END.finditer(content)] + [len(content)]
+    parts: List[Tuple[int, int]] = []
+    start = 0
+    last_cut = None
+    for cut in cuts:
+        if estimate_tokens(content[start:cut]) <= max_tokens:
+            last_cut = cut
+            continue
+        if last_cut is not None and last_cut > start:
+            parts.append((start, last_cut))
+            start = last_cut
+        # a single sentence longer than the budget is hard-cut
+        while estimate_tokens(content[start:cut]) > max_tokens:
+            step = max_tokens * 4
+            while step > 1 and estimate_tokens(content[start:start + step]) > max_tokens:
+                step //= 2
+            parts.append((start, start + step))
+            start += step
+        last_cut = cut
+    if start < len(content):
+        parts.append((start, len(content)))
+
+    return [
+        (part_start, {
+            "id": f"{block['id']}{PART_SEPARATOR}{n}",
+            "type": block.get("type", "paragraph"),
+            "content": content[part_start:part_end],
+        })
+        for n, (part_start, part_end) in enumerate(parts)
+    ]
+
+
+def pack_batches(items: List[Any], block_of=lambda item: item,
+                 input_budget: int = LLM_BATCH_INPUT_TOKENS,
+                 output_budget: int = LLM_BATCH_OUTPUT_TOKENS,
+                 max_blocks: int = LLM_BATCH_MAX_BLOCKS) -> List[List[Any]]:
+    """
+    greedily pack items (in document order) into batches under the input/output token budgets
+    block_of(item) returns the block dict to estimate; an item over budget on its own gets its own batch
+    """
+    batches: List[List[Any]] = []
+    current: List[Any] = []
+    current_in = current_out = 0
+    for item in items:
+        block = block_of(item)
+        block_in = estimate_block_input_tokens(block)
+        block_out = estimate_block_output_tokens(block)
+        if current and (current_in + block_in > input_budget
+                        or current_out + block_out > output_budget
+                        or len(current) >= max_blocks):
+            batches.append(current)
+            current, current_in, current_out = [], 0, 0
+        current.append(item)
+        current_in += block_in
+        current_out += block_out
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _shift(span, offset: int):
+    if isinstance(span, (list, tuple)) and len(span) == 2:
+        return [span[0] + offset, span[1] + offset]
+    return span
+
+
+def merge_part_annotations(parts: List[Tuple[int, Optional[Dict[str, Any]]]]) -> Optional[Dict[str, Any]]:
+    """
+    merge raw LLM annotations of the parts of a split block back into block coordinates
+    parts: [(char_offset, annotations or None)] in document order
+    the topic sentence (and its relative SVO) comes from the first part that has one
+    """
+    merged: Dict[str, Any] = {}
+    anchors = []
+    for offset, annotations in parts:
+        if not annotations:
+            continue
+        if "topic_sentence_range" not in merged and annotations.get("topic_sentence_range"):
+            merged["topic_sentence_range"] = _shift(annotations["topic_sentence_range"], offset)
+            if annotations.get("svo_structure"):
+                # SVO ranges are relative to the topic sentence, so they need no shift
+                merged["svo_structure"] = annotations["svo_structure"]
+        for anchor in annotations.get("bilingual_anchors") or []:
+            if isinstance(anchor, dict):
+                anchors.append(dict(anchor, range=_shift(anchor.get("range"), offset)))
+    if anchors:
+        merged["bilingual_anchors"] = anchors
+    return merged or None
@@ -0,0 +1,6 @@
+"""
+Benchmarks for the backend pipeline
+
+Run from backend/:
+    python -m bench.run --sizes 1000,10000 --repeats 5
+"""
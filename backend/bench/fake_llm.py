@@ -0,0 +1,84 @@
+import json
+import random
+import threading
+import time
+from types import SimpleNamespace
+from typing import Any, Dict
+
+from batching import estimate_tokens
+
+
+class FakeGeminiClient:
+    """
+    stand-in for the google.generativeai module (client_type "gemini")
+    replies with plausible annotations after latency_s +/- jitter_s;
+    failure_rate of calls raise (half) or return malformed JSON (half)
+    """
+
+    def __init__(self, latency_s: float = 0.05, jitter_s: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.latency_s = latency_s
+        self.jitter_s = jitter_s
+        self.failure_rate = failure_rate
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.failures = 0
+        client = self
+
+        class GenerativeModel:
+            def __init__(self, model_name: str, generation_config: Dict[str, Any] = None):
+                self.model_name = model_name
+
+            def generate_content(self, prompt: str):
+                return client._generate(prompt)
+
+        self.GenerativeModel = GenerativeModel
+
+    def _generate(self, prompt: str):
+        with self._lock:
+            self.calls += 1
+            delay = max(0.0, self.latency_s + self._rng.uniform(-self.jitter_s, self.jitter_s))
+            roll = self._rng.random()
+        time.sleep(delay)
+
+        if roll < self.failure_rate:
+            with self._lock:
+                self.failures += 1
+            if roll < self.failure_rate / 2:
+                raise TimeoutError("fake LLM timeout")
+            return SimpleNamespace(text='{"blocks": [', usage_metadata=None)
+
+        payload = prompt.split("Input blocks:\n", 1)[1].split("\n\nReturn the enriched", 1)[0]
+        blocks = json.loads(payload)
+        text = json.dumps({"blocks": [self._annotate(block) for block in blocks]}, ensure_ascii=False)
+        usage = SimpleNamespace(prompt_token_count=estimate_tokens(prompt),
+                                candidates_token_count=estimate_tokens(text))
+        return SimpleNamespace(text=text, usage_metadata=usage)
+
+    @staticmethod
+    def _annotate(block: Dict[str, Any]) -> Dict[str, Any]:
+        content = block.get("content", "")
+        end = content.find(". ")
+        end = len(content) if end < 0 else end + 1
+        words = content.split(" ")
+        known = {term.lower() for term in block.get("known_terms") or []}
+        anchors = []
+        pos = 0
+        for word in words[:40]:
+            if len(word) > 8 and len(anchors) < 4 and word.lower() not in known:
+                anchors.append({
+                    "term": word,
+                    "range": [pos, pos + len(word)],
+                    "translation": "术语",
+                    "nuance_note": "Synthetic nuance note for benchmarking.",
+                    "trigger_threshold_ms": 800,
+                })
+            pos += len(word) + 1
+        first_space = content.find(" ")
+        annotations = {"topic_sentence_range": [0, end], "bilingual_anchors": anchors}
+        if 0 < first_space < end:
+            annotations["svo_structure"] = {
+                "subject": [0, first_space], "verb": [first_space + 1, first_space + 2],
+                "object": [first_space + 3, end],
+            }
+        return dict(block, annotations=annotations)
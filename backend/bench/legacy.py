@@ -0,0 +1,72 @@
+"""
+Frozen copies of replaced pipeline code, kept as baselines for bench.run
+
+load_walk_twice is how process_pdf read Marker output before load_marker_blocks:
+json.load the whole tree, walk it recursively to fix image paths, walk it again to extract blocks
+(text via the two-regex extract_text_from_html that htmltext.html_to_text replaced).
+serialize_document is the indent=2 content.json writer replaced by artifacts.serialize_document.
+"""
+import json
+import re
+from pathlib import Path
+from typing import Any, Dict, List
+
+from llm import normalize_blocks
+
+TEXT_TYPES = {"Text", "SectionHeader", "Title", "ListItem", "Caption", "Footnote"}
+
+
+def extract_text_from_html(html: str) -> str:
+    if not html:
+        return ""
+    text = re.sub(r'<[^>]+>', '', html)
+    text = re.sub(r'\s+', ' ', text).strip()
+    return text
+
+
+def fix_image_paths(data):
+    if isinstance(data, dict):
+        if "image" in data and isinstance(data["image"], str):
+            if not data["image"].startswith("images/"):
+                data["image"] = f"images/{data['image']}"
+        for k, v in data.items():
+            fix_image_paths(v)
+    elif isinstance(data, list):
+        for item in data:
+            fix_image_paths(item)
+    return data
+
+
+def parse_marker_children(children: List[Dict], blocks: List[Dict], block_counter: List[int]):
+    for child in children:
+        if not isinstance(child, dict):
+            continue
+        block_type = child.get("block_type", "")
+        html = child.get("html", "")
+        nested = child.get("children")
+
+        if block_type in TEXT_TYPES and html:
+            text = extract_text_from_html(html)
+            if text and len(text) > 10:
+                blocks.append({
+                    "id": child.get("id", f"blk_{block_counter[0]:03d}"),
+                    "type": "heading" if "Header" in block_type else "paragraph",
+                    "content": text
+                })
+                block_counter[0] += 1
+
+        if nested and isinstance(nested, list):
+            parse_marker_children(nested, blocks, block_counter)
+
+
+def load_walk_twice(json_path: Path) -> List[Dict[str, Any]]:
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    data = fix_image_paths(data)
+    blocks: List[Dict[str, Any]] = []
+    parse_marker_children(data["children"], blocks, [0])
+    return normalize_blocks(blocks)
+
+
+def serialize_document(document) -> bytes:
+    return json.dumps(document.model_dump(), ensure_ascii=False, indent=2).encode("utf-8")
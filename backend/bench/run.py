@@ -0,0 +1,460 @@
+"""
+Benchmark harness for pipeline.py / llm.py
+
+    python -m bench.run --sizes 1000,10000,100000 --repeats 5
+    python -m bench.run --cases parse,fix_image_paths --depth 50 --html-scale 4
+    python -m bench.run --compare ../data/bench/<previous>.json
+    python -m bench.run --cases load_walk_twice,load_single_pass,load_stream --sizes 100000
+
+Each case is timed separately on synthetic Marker trees; results (p50/p99, throughput,
+peak traced memory) are written as JSON under data/bench/ so runs can be compared across commits.
+The load_* cases read the tree from a file and also report peak RSS, measured in a fresh process.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import multiprocessing
+import platform
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bench.fake_llm import FakeGeminiClient
+from bench.synthetic import make_marker_tree
+
+BENCH_DIR = Path(__file__).resolve().parent.parent.parent / "data" / "bench"
+
+# name -> factory(workload, args) returning (setup, run, units[, extra]) or None to skip the size
+# extra: {"rss": (picklable function, args)} run once in a fresh process to measure peak RSS,
+#        {"info": {...}} static figures (e.g. output bytes) added to the result
+CASES: Dict[str, Callable] = {}
+
+
+def case(name: str):
+    def register(factory):
+        CASES[name] = factory
+        return factory
+    return register
+
+
+class Workload:
+    """one synthetic tree, kept as a JSON string so every repeat can parse a fresh copy"""
+
+    def __init__(self, size: int, depth: int, html_scale: int, seed: int):
+        self.size = size
+        self.tree_json = json.dumps(make_marker_tree(size, depth=depth, html_scale=html_scale, seed=seed))
+
+        self._tmp: Optional[tempfile.TemporaryDirectory] = None
+
+    def fresh_tree(self) -> Dict[str, Any]:
+        return json.loads(self.tree_json)
+
+    def tmp_dir(self) -> Path:
+        """scratch directory removed by close()"""
+        if self._tmp is None:
+            self._tmp = tempfile.TemporaryDirectory(prefix="bench-")
+        return Path(self._tmp.name)
+
+    def json_path(self) -> Path:
+        """the tree written to a temp file, as Marker leaves it on disk"""
+        path = self.tmp_dir() / "tree.json"
+        if not path.exists():
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(self.tree_json)
+        return path
+
+    def close(self):
+        if self._tmp is not None:
+            self._tmp.cleanup()
+
+
+@contextlib.contextmanager
+def quiet():
+    """swallow pipeline prints so they do not dominate timings"""
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# --- cases ------------------------------------------------------------------
+
+@case("parse")
+def bench_parse(workload: Workload, args):
+    from llm import parse_marker_children
+
+    def run(tree):
+        blocks = []
+        parse_marker_children(tree["children"], blocks, [0])
+        return blocks
+    return workload.fresh_tree, run, workload.size
+
+
+def block_htmls(workload: Workload) -> List[str]:
+    from llm import TEXT_TYPES
+    htmls, stack = [], list(workload.fresh_tree()["children"])
+    while stack:
+        node = stack.pop()
+        if node.get("block_type") in TEXT_TYPES and node.get("html"):
+            htmls.append(node["html"])
+        stack.extend(node.get("children") or [])
+    return htmls
+
+
+@case("html_text_regex")
+def bench_html_text_regex(workload: Workload, args):
+    from bench.legacy import extract_text_from_html
+    htmls = block_htmls(workload)
+    return (lambda: htmls), (lambda hs: [extract_text_from_html(h) for h in hs]), len(htmls)
+
+
+@case("html_text")
+def bench_html_text(workload: Workload, args):
+    from htmltext import html_to_text_many
+    htmls = block_htmls(workload)
+    return (lambda: htmls), html_to_text_many, len(htmls)
+
+
+@case("fix_image_paths")
+def bench_fix_image_paths(workload: Workload, args):
+    from pipeline import fix_image_paths
+    return workload.fresh_tree, fix_image_paths, workload.size
+
+
+@case("skim")
+def bench_skim(workload: Workload, args):
+    from llm import extract_blocks
+    from skim import skim_blocks
+    blocks = extract_blocks(workload.fresh_tree())
+    return (lambda: blocks), skim_blocks, len(blocks)
+
+
+@case("enrich")
+def bench_enrich(workload: Workload, args):
+    from llm import enrich_with_llm
+    if workload.size > args.enrich_max_blocks:
+        return None
+    client = FakeGeminiClient(latency_s=args.latency, jitter_s=args.jitter, failure_rate=args.failure_rate)
+
+    def run(tree):
+        with quiet():
+            return enrich_with_llm(tree, "bench", "bench", client=client, client_type="gemini", use_cache=False)
+    return workload.fresh_tree, run, workload.size
+
+
+@case("load_walk_twice")
+def bench_load_walk_twice(workload: Workload, args):
+    from bench.legacy import load_walk_twice
+    path = workload.json_path()
+    return (lambda: path), load_walk_twice, workload.size, {"rss": (load_walk_twice, (path,))}
+
+
+@case("load_single_pass")
+def bench_load_single_pass(workload: Workload, args):
+    from pipeline import load_marker_blocks
+    path = workload.json_path()
+    return (lambda: path), (lambda p: load_marker_blocks(p, streaming=False)), workload.size, \
+        {"rss": (load_marker_blocks, (path, False))}
+
+
+@case("load_stream")
+def bench_load_stream(workload: Workload, args):
+    import pipeline
+    if pipeline.ijson is None:
+        return None
+    path = workload.json_path()
+    return (lambda: path), (lambda p: pipeline.load_marker_blocks(p, streaming=True)), workload.size, \
+        {"rss": (pipeline.load_marker_blocks, (path, True))}
+
+
+def build_document(workload: Workload):
+    """DocumentResponse with fake annotations on every block, without going through the LLM path"""
+    from llm import parse_marker_children, build_block_annotations
+    from schemas import Block, DocumentResponse
+    blocks = []
+    parse_marker_children(workload.fresh_tree()["children"], blocks, [0])
+    return DocumentResponse(doc_id="bench", title="bench", blocks=[
+        Block(id=b["id"], type=b["type"], content=b["content"],
+              annotations=build_block_annotations(FakeGeminiClient._annotate(b)["annotations"]))
+        for b in blocks
+    ])
+
+
+@case("serialize")
+def bench_serialize(workload: Workload, args):
+    from artifacts import serialize_document
+    document = build_document(workload)
+    return (lambda: document), serialize_document, workload.size, \
+        {"info": {"bytes": len(serialize_document(document))}}
+
+
+@case("serialize_indent")
+def bench_serialize_indent(workload: Workload, args):
+    from bench.legacy import serialize_document
+    document = build_document(workload)
+    return (lambda: document), serialize_document, workload.size, \
+        {"info": {"bytes": len(serialize_document(document))}}
+
+
+def bench_compress(workload: Workload, encoding: str):
+    from artifacts import serialize_document, envelope, compress, available_encodings
+    if encoding not in available_encodings():
+        return None
+    response = envelope(serialize_document(build_document(workload)))
+    return (lambda: response), (lambda data: compress(data, encoding)), workload.size, \
+        {"info": {"bytes": len(compress(response, encoding)), "bytes_in": len(response)}}
+
+
+@case("compress_gzip")
+def bench_compress_gzip(workload: Workload, args):
+    return bench_compress(workload, "gzip")
+
+
+@case("compress_br")
+def bench_compress_br(workload: Workload, args):
+    return bench_compress(workload, "br")
+
+
+GAZE_BLOCKS_PER_BEACON = 20
+
+
+def gaze_beacons(workload: Workload) -> List[bytes]:
+    """beacon bodies with workload.size dwell events in total, spread over 8 documents and 500 sessions"""
+    import random
+    rng = random.Random(workload.size)
+    bodies = []
+    for i in range(max(1, workload.size // GAZE_BLOCKS_PER_BEACON)):
+        first = rng.randrange(0, 2000)
+        dwell = {f"/page/{b // 10}/Text/{b}": rng.randint(50, 20000)
+                 for b in range(first, first + GAZE_BLOCKS_PER_BEACON)}
+        bodies.append(json.dumps({"doc_id": f"doc{i % 8}", "session_id": f"s{i % 500}", "dwell": dwell}).encode())
+    return bodies
+
+
+@case("gaze_ingest")
+def bench_gaze_ingest(workload: Workload, args):
+    """
+    sustained ingestion: --producers threads parse and enqueue beacons (the endpoint's work)
+    while the background writer appends them; timed until every event is on disk
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from analytics import GazeStore, parse_beacon
+    bodies = gaze_beacons(workload)
+    runs = [0]
+
+    def setup():
+        runs[0] += 1
+        store = GazeStore(workload.tmp_dir() / f"gaze-{runs[0]}", queue_max=len(bodies) + 1)
+        store.start()
+        return store
+
+    def run(store):
+        with ThreadPoolExecutor(max_workers=args.producers) as pool:
+            list(pool.map(lambda body: store.submit(parse_beacon(body)), bodies, chunksize=64))
+        with quiet():
+            store.stop()
+        assert store.events_written == len(bodies) * GAZE_BLOCKS_PER_BEACON
+    return setup, run, len(bodies) * GAZE_BLOCKS_PER_BEACON
+
+
+@case("gaze_percentiles")
+def bench_gaze_percentiles(workload: Workload, args):
+    """per-block p50/p90/p99 of one document after every block received new events"""
+    from analytics import GazeStore, parse_beacon
+    store = GazeStore(workload.tmp_dir() / "gaze-query")
+    for body in gaze_beacons(workload):
+        store.submit(parse_beacon(body))
+        if store.stats()["queued"] > 1000:
+            store.flush()
+    store.flush()
+    doc = store.document("doc0")
+
+    def setup():
+        doc.sorted = [None] * len(doc.sorted)
+        return "doc0"
+    return setup, (lambda doc_id: store.dwell_percentiles(doc_id, [50, 90, 99])), doc.events
+
+
+# --- harness ----------------------------------------------------------------
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    """nearest-rank percentile"""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, min(len(sorted_values), round(q / 100 * len(sorted_values) + 0.5)))
+    return sorted_values[rank - 1]
+
+
+def _proc_status_kb(field: str) -> Optional[int]:
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _reset_peak_rss() -> bool:
+    """reset VmHWM to the current RSS (Linux), so import-time peaks do not mask the run"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except OSError:
+        return False
+
+
+def _rss_child(conn, func, func_args):
+    with quiet():
+        if _reset_peak_rss() and _proc_status_kb("VmRSS") is not None:
+            baseline = _proc_status_kb("VmRSS")
+            func(*func_args)
+            grown_kb = _proc_status_kb("VmHWM") - baseline
+        else:
+            # ru_maxrss is a high-water mark: kilobytes on Linux, bytes on macOS
+            scale = 1024 if sys.platform == "darwin" else 1
+            baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            func(*func_args)
+            grown_kb = (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - baseline) / scale
+    conn.send(grown_kb)
+    conn.close()
+
+
+def peak_rss_mb(func: Callable, func_args: Tuple) -> Optional[float]:
+    """peak RSS growth of func(*func_args), measured in a fresh process"""
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    process = ctx.Process(target=_rss_child, args=(child, func, func_args))
+    process.start()
+    child.close()
+    try:
+        grown_kb = parent.recv()
+    except EOFError:
+        grown_kb = None
+    process.join()
+    return None if grown_kb is None else round(grown_kb / 1e3, 3)
+
+
+def measure(setup: Callable[[], Any], run: Callable[[Any], Any], units: int, repeats: int) -> Dict[str, Any]:
+    times = []
+    for _ in range(repeats):
+        state = setup()
+        start = time.perf_counter()
+        run(state)
+        times.append(time.perf_counter() - start)
+
+    # separate traced run: tracemalloc slows allocation-heavy code, so it is kept out of the timings
+    state = setup()
+    tracemalloc.start()
+    run(state)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    times.sort()
+    p50 = percentile(times, 50)
+    return {
+        "repeats": repeats,
+        "units": units,
+        "p50_s": round(p50, 6),
+        "p99_s": round(percentile(times, 99), 6),
+        "mean_s": round(sum(times) / len(times), 6),
+        "throughput_per_s": round(units / p50, 1) if p50 else None,
+        "peak_traced_mb": round(peak / 1e6, 3),
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).resolve().parent, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(previous_path: Path, results: List[Dict[str, Any]]):
+    with open(previous_path, "r", encoding="utf-8") as f:
+        previous = {(r["case"], r["size"]): r for r in json.load(f)["results"]}
+    print(f"\nvs {previous_path.name}:")
+    for r in results:
+        old = previous.get((r["case"], r["size"]))
+        if old and old["p50_s"]:
+            print(f"  {r['case']:<18} {r['size']:>7}  p50 x{r['p50_s'] / old['p50_s']:.2f}"
+                  f"  peak x{r['peak_traced_mb'] / old['peak_traced_mb'] if old['peak_traced_mb'] else 0:.2f}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the backend pipeline stages")
+    parser.add_argument("--sizes", default="1000,10000", help="comma-separated block counts")
+    parser.add_argument("--cases", default=",".join(CASES), help=f"comma-separated subset of {','.join(CASES)}")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--depth", type=int, default=1, help="nesting depth of blocks within a page")
+    parser.add_argument("--html-scale", type=int, default=1, help="paragraph length multiplier")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--latency", type=float, default=0.05, help="fake LLM latency per call (s)")
+    parser.add_argument("--jitter", type=float, default=0.02, help="fake LLM latency jitter (s)")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="fraction of fake LLM calls that fail")
+    parser.add_argument("--producers", type=int, default=8, help="concurrent beacon producers (gaze_ingest)")
+    parser.add_argument("--enrich-max-blocks", type=int, default=5000, help="skip enrich above this size")
+    parser.add_argument("--output", type=Path, help="result file (default: data/bench/<timestamp>-<commit>.json)")
+    parser.add_argument("--compare", type=Path, help="previous result file to compare p50/peak against")
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    names = [c for c in args.cases.split(",") if c]
+    unknown = set(names) - set(CASES)
+    if unknown:
+        parser.error(f"unknown cases: {', '.join(sorted(unknown))}")
+
+    # deep synthetic trees must not trip the recursion limit of the harness itself
+    sys.setrecursionlimit(max(sys.getrecursionlimit(), args.depth * 4 + 1000))
+
+    results = []
+    for size in sizes:
+        workload = Workload(size, args.depth, args.html_scale, args.seed)
+        for name in names:
+            spec = CASES[name](workload, args)
+            if spec is None:
+                continue
+            setup, run, units = spec[:3]
+            result = {"case": name, "size": size, **measure(setup, run, units, args.repeats)}
+            extra = spec[3] if len(spec) > 3 else {}
+            result.update(extra.get("info", {}))
+            if "rss" in extra:
+                result["peak_rss_mb"] = peak_rss_mb(*extra["rss"])
+            details = "".join(f"  {key} {result[key]}" for key in ("peak_rss_mb", "bytes") if key in result)
+            results.append(result)
+            print(f"{name:<18} {size:>7}  p50 {result['p50_s']:.4f}s  p99 {result['p99_s']:.4f}s  "
+                  f"{result['throughput_per_s']}/s  peak {result['peak_traced_mb']} MB{details}")
+        workload.close()
+
+    commit = git_commit()
+    report = {
+        "meta": {
+            "commit": commit,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: str(v) if isinstance(v, Path) else v for k, v in vars(args).items()},
+        },
+        "results": results,
+    }
+    output = args.output or BENCH_DIR / f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit or 'nogit'}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\nResults written to {output}")
+
+    if args.compare:
+        compare(args.compare, results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import random
+from typing import Any, Dict, List
+
+WORDS = (
+    "gradient descent transformer attention model layer training loss function parameter "
+    "variance estimator hypothesis sample distribution entropy regularization convergence "
+    "the of and to in is that for with as on by this we are an be from which results show"
+).split()
+
+TEXT_TYPES = ["Text", "Text", "Text", "Text", "SectionHeader", "ListItem", "Caption", "Footnote"]
+
+
+def _sentence(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(words)).capitalize() + "."
+
+
+def _html(rng: random.Random, block_type: str, html_scale: int) -> str:
+    if block_type == "SectionHeader":
+        return f"<h2>{_sentence(rng, rng.randint(3, 8))}</h2>"
+    sentences = [_sentence(rng, rng.randint(8, 25)) for _ in range(rng.randint(2, 6) * html_scale)]
+    # inline markup and entities, as Marker emits them
+    sentences[0] = f"<b>{sentences[0]}</b> <i>p</i> &lt; 0.05 &amp;"
+    if len(sentences) > 2:
+        sentences[2] = f'<a href="#ref{rng.randint(1, 99)}">{sentences[2]}</a> <math>x^2</math>'
+    return "<p>" + " ".join(sentences) + "</p>"
+
+
+def _geometry(rng: random.Random) -> Dict[str, Any]:
+    x, y = rng.uniform(0, 500), rng.uniform(0, 700)
+    return {
+        "polygon": [[x, y], [x + 100, y], [x + 100, y + 20], [x, y + 20]],
+        "bbox": [x, y, x + 100, y + 20],
+    }
+
+
+def make_marker_tree(blocks: int, depth: int = 1, html_scale: int = 1,
+                     blocks_per_page: int = 40, figure_every: int = 25, seed: int = 0) -> Dict[str, Any]:
+    """
+    synthetic Marker JSON tree with `blocks` text blocks
+    depth: nesting of text blocks under group blocks within each page (1 = flat)
+    html_scale: multiplies paragraph length
+    every figure_every-th block is a Figure with an image reference
+    """
+    rng = random.Random(seed)
+    pages: List[Dict[str, Any]] = []
+    made = 0
+    page_no = 0
+    while made < blocks:
+        page_id = f"/page/{page_no}/Page/0"
+        page = {"id": page_id, "block_type": "Page", "html": "", "children": [], **_geometry(rng)}
+        container = page["children"]
+        for level in range(1, depth):
+            group = {"id": f"/page/{page_no}/Group/{level}", "block_type": "Group", "html": "",
+                     "children": [], **_geometry(rng)}
+            container.append(group)
+            container = group["children"]
+        for n in range(min(blocks_per_page, blocks - made)):
+            if figure_every and made % figure_every == figure_every - 1:
+                container.append({
+                    "id": f"/page/{page_no}/Figure/{n}", "block_type": "Figure",
+                    "html": "", "image": f"_page_{page_no}_Figure_{n}.png", **_geometry(rng),
+                })
+            block_type = rng.choice(TEXT_TYPES)
+            container.append({
+                "id": f"/page/{page_no}/{block_type}/{n}",
+                "block_type": block_type,
+                "html": _html(rng, block_type, html_scale),
+                "children": None,
+                **_geometry(rng),
+            })
+            made += 1
+        pages.append(page)
+        page_no += 1
+    return {"block_type": "Document", "children": pages}
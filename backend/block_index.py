@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import struct
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from schemas import DocumentResponse, BlockSource
+
+CONTENT_FILE = "content.json"
+# sidecars next to content.json
+OFFSETS_FILE = "blocks.idx"    # (start, end) byte offsets of every block in content.json, uint64 little-endian
+BLOCKS_META_FILE = "blocks.json"  # block count, ids and table of contents
+# source HTML and offset maps of the blocks, in block order, kept out of content.json (served on request)
+SOURCES_FILE = "sources.json"
+SOURCES_OFFSETS_FILE = "sources.idx"
+
+_ENTRY = struct.Struct("<QQ")
+# an offset file starts with a magic and the sha256 of the data file its offsets point into:
+# the files are replaced one by one, so a reader can meet new offsets next to the old data
+_MAGIC = b"BIDX\x01\x00\x00\x00"
+_HEADER_SIZE = len(_MAGIC) + hashlib.sha256().digest_size
+_DIGEST_CACHE_SIZE = 256
+
+_digests: Dict[str, Tuple[Tuple[int, int, int], bytes]] = {}
+_digests_lock = threading.Lock()
+
+
+def serialize_indexed(document: DocumentResponse) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """
+    compact content.json bytes plus the byte span of every block in them
+    same bytes as document.model_dump_json(): blocks is the last field, so the document
+    without blocks ends in '[]}' and the blocks are serialized one by one in between
+    """
+    head = document.model_copy(update={"blocks": []}).model_dump_json().encode("utf-8")
+    if not head.endswith(b"[]}"):
+        # DocumentResponse no longer ends with its blocks; the spans below would be wrong
+        raise ValueError("serialized document does not end with its blocks field")
+    parts = [head[:-2]]
+    spans: List[Tuple[int, int]] = []
+    position = len(parts[0])
+    for i, block in enumerate(document.blocks):
+        if i:
+            parts.append(b",")
+            position += 1
+        data = block.model_dump_json().encode("utf-8")
+        parts.append(data)
+        spans.append((position, position + len(data)))
+        position += len(data)
+    parts.append(b"]}")
+    return b"".join(parts), spans
+
+
+def serialize_sources(sources: List[BlockSource]) -> Tuple[bytes, List[Tuple[int, int]]]:
+    """JSON array of the block sources plus the byte span of each"""
+    parts = [b"["]
+    spans: List[Tuple[int, int]] = []
+    position = 1
+    for i, source in enumerate(sources):
+        if i:
+            parts.append(b",")
+            position += 1
+        data = source.model_dump_json().encode("utf-8")
+        parts.append(data)
+        spans.append((position, position + len(data)))
+        position += len(data)
+    parts.append(b"]")
+    return b"".join(parts), spans
+
+
+def pack_offsets(spans: List[Tuple[int, int]], data: bytes) -> bytes:
+    """offset file for the entries at `spans` of `data`"""
+    return (_MAGIC + hashlib.sha256(data).digest() +
+            b"".join(_ENTRY.pack(start, end) for start, end in spans))
+
+
+def index_files(document: DocumentResponse, content: bytes, spans: List[Tuple[int, int]]) -> Dict[str, bytes]:
+    """sidecar file name -> bytes"""
+    meta = {
+        "doc_id": document.doc_id,
+        "title": document.title,
+        "count": len(spans),
+        "ids": [block.id for block in document.blocks],
+        "toc": [
+            {"index": i, "id": block.id, "content": block.content}
+            for i, block in enumerate(document.blocks) if block.type == "heading"
+        ],
+    }
+    return {
+        OFFSETS_FILE: pack_offsets(spans, content),
+        BLOCKS_META_FILE: json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8"),
+    }
+
+
+def has_index(doc_dir: Path) -> bool:
+    """both sidecars exist and the offsets carry a data digest (older ones are rewritten)"""
+    try:
+        with open(doc_dir / OFFSETS_FILE, "rb") as f:
+            magic = f.read(len(_MAGIC))
+    except FileNotFoundError:
+        return False
+    return magic == _MAGIC and (doc_dir / BLOCKS_META_FILE).exists()
+
+
+@lru_cache(maxsize=64)
+def _load_meta(path: str, mtime_ns: int) -> Dict[str, Any]:
+    with open(path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["positions"] = {block_id: i for i, block_id in enumerate(meta["ids"])}
+    return meta
+
+
+def load_meta(doc_dir: Path) -> Dict[str, Any]:
+    """blocks.json with an id -> index map (cached per file version)"""
+    path = doc_dir / BLOCKS_META_FILE
+    return _load_meta(str(path), os.stat(path).st_mtime_ns)
+
+
+def _digest(f) -> bytes:
+    """sha256 of an open data file, cached per file version"""
+    st = os.fstat(f.fileno())
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _digests_lock:
+        cached = _digests.get(f.name)
+    if cached and cached[0] == key:
+        return cached[1]
+    f.seek(0)
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+        hasher.update(chunk)
+    digest = hasher.digest()
+    with _digests_lock:
+        _digests.pop(f.name, None)
+        _digests[f.name] = (key, digest)
+        while len(_digests) > _DIGEST_CACHE_SIZE:
+            del _digests[next(iter(_digests))]
+    return digest
+
+
+def _parse_slice(f, offset: int, limit: int) -> Tuple[int, List[Any]]:
+    """(total, entries) by parsing the whole data file: content.json's blocks or the sources array"""
+    f.seek(0)
+    data = json.load(f)
+    entries = data["blocks"] if isinstance(data, dict) else data
+    return len(entries), entries[max(0, offset):max(0, offset) + max(0, limit)]
+
+
+def _read_slice(offsets_path: Path, data_path: Path, offset: int, limit: int) -> Tuple[int, bytes]:
+    """
+    (total, JSON array bytes) of entries [offset, offset + limit), read with one seek into the
+    offset index and one into the data file (entries are contiguous there)
+    while a document is being rewritten the offsets may belong to another version of the data
+    file; then the data file is parsed instead
+    """
+    with open(offsets_path, "rb") as f:
+        header = f.read(_HEADER_SIZE)
+        total = (os.fstat(f.fileno()).st_size - _HEADER_SIZE) // _ENTRY.size
+        offset = max(0, offset)
+        end = min(total, offset + max(0, limit))
+        if offset < end:
+            f.seek(_HEADER_SIZE + offset * _ENTRY.size)
+            entries = f.read((end - offset) * _ENTRY.size)
+    with open(data_path, "rb") as f:
+        if header[len(_MAGIC):] != _digest(f):
+            total, parsed = _parse_slice(f, offset, limit)
+            return total, json.dumps(parsed, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        if offset >= end:
+            return total, b"[]"
+        first_start, _ = _ENTRY.unpack_from(entries, 0)
+        _, last_end = _ENTRY.unpack_from(entries, len(entries) - _ENTRY.size)
+        f.seek(first_start)
+        data = f.read(last_end - first_start)
+    return total, b"[" + data + b"]"
+
+
+def _read_entry(offsets_path: Path, data_path: Path, doc_dir: Path, block_id: str) -> Optional[bytes]:
+    """JSON bytes of the entry of one block by id, None if unknown"""
+    index = load_meta(doc_dir)["positions"].get(block_id)
+    if index is None:
+        return None
+    _, data = _read_slice(offsets_path, data_path, index, 1)
+    entry = data[1:-1]
+    if entry and json.loads(entry).get("id") == block_id:
+        return entry
+    # blocks.json is from another version of the document
+    with open(data_path, "rb") as f:
+        _, entries = _parse_slice(f, 0, 1 << 62)
+    for candidate in entries:
+        if candidate.get("id") == block_id:
+            return json.dumps(candidate, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return None
+
+
+def read_blocks(doc_dir: Path, offset: int, limit: int) -> Tuple[int, bytes]:
+    """(total, JSON array bytes) of blocks [offset, offset + limit) of content.json"""
+    return _read_slice(doc_dir / OFFSETS_FILE, doc_dir / CONTENT_FILE, offset, limit)
+
+
+def read_block(doc_dir: Path, block_id: str) -> Optional[bytes]:
+    """JSON bytes of one block by id, None if unknown"""
+    return _read_entry(doc_dir / OFFSETS_FILE, doc_dir / CONTENT_FILE, doc_dir, block_id)
+
+
+def has_sources(doc_dir: Path) -> bool:
+    return (doc_dir / SOURCES_OFFSETS_FILE).exists() and (doc_dir / SOURCES_FILE).exists()
+
+
+def read_sources(doc_dir: Path, offset: int, limit: int) -> Tuple[int, bytes]:
+    """(total, JSON array bytes) of the sources of blocks [offset, offset + limit)"""
+    return _read_slice(doc_dir / SOURCES_OFFSETS_FILE, doc_dir / SOURCES_FILE, offset, limit)
+
+
+def read_source(doc_dir: Path, block_id: str) -> Optional[bytes]:
+    """JSON bytes of one block's source by block id, None if unknown"""
+    return _read_entry(doc_dir / SOURCES_OFFSETS_FILE, doc_dir / SOURCES_FILE, doc_dir, block_id)
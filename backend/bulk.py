@@ -0,0 +1,273 @@
+"""
+Offline bulk ingestion of a corpus of PDFs (e.g. a course reading list), without the API server
+
+    python bulk.py ~/readings/                          # every *.pdf below the directory
+    python bulk.py reading_list.txt --marker-workers 2 --llm-workers 8
+    python bulk.py reading_list.txt --mode skim --report ../data/bulk/fall.json
+
+A manifest lists one PDF path per line (relative to the manifest; blank lines and # comments ignored).
+Files run through pipeline.process_pdf on the job scheduler, so Marker conversions (CPU) and LLM
+enrichment (I/O) of different files overlap, each stage with its own worker limit. Files already
+processed (same bytes, per the server's content index) are skipped, and jobs interrupted by a crash
+resume from their checkpoints. A throughput report (docs/hour, tokens, failures) is written as JSON
+under data/bulk/. Stop the API server first: both processes write data/content_index.json.
+"""
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from pipeline import process_pdf, BASE_DIR, ARTIFACT_DIR, ENRICHMENT_MODES, ENRICHMENT_MODE
+from content_index import ContentIndex, index_key
+from checkpoint import Checkpoints, find_unfinished
+from artifacts import remove_content_artifacts
+from storage import StorageManager
+from jobs import JobScheduler, Job, DONE, FAILED, CANCELLED, JOB_MARKER_CONCURRENCY, JOB_LLM_CONCURRENCY
+import marker_pool
+import images
+
+BULK_DIR = BASE_DIR / "bulk"
+UPLOAD_DIR = BASE_DIR / "uploads"
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def collect_inputs(sources: List[Path]) -> List[Path]:
+    """PDF paths from directories (recursive), PDF files and manifests, in order, without duplicates"""
+    paths: List[Path] = []
+    for source in sources:
+        if source.is_dir():
+            paths.extend(sorted(p for p in source.rglob("*") if p.is_file() and p.suffix.lower() == ".pdf"))
+        elif source.suffix.lower() == ".pdf":
+            paths.append(source)
+        else:
+            with open(source, "r", encoding="utf-8") as f:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        path = Path(line).expanduser()
+                        paths.append(path if path.is_absolute() else source.parent / path)
+    seen = set()
+    unique = []
+    for path in paths:
+        resolved = path.resolve()
+        if resolved not in seen:
+            seen.add(resolved)
+            unique.append(resolved)
+    return unique
+
+
+def file_digest(path: Path) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def read_timings(doc_id: str) -> Dict[str, Any]:
+    try:
+        with open(ARTIFACT_DIR / doc_id / "timings.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+class BulkRun:
+    """
+    one corpus run: hashes and submits files, collects a result entry per file
+    results are recorded from the scheduler's worker threads
+    """
+
+    def __init__(self, mode: str, marker_workers: int, llm_workers: int):
+        self.mode = mode
+        self.marker_workers = marker_workers
+        self.llm_workers = llm_workers
+        self.content_index = ContentIndex(BASE_DIR / "content_index.json", ARTIFACT_DIR)
+        # the server's quota applies to bulk runs too (input PDFs are never deleted)
+        self.storage = StorageManager(ARTIFACT_DIR, UPLOAD_DIR, BASE_DIR / "storage.json")
+        self.scheduler = JobScheduler(lambda job: process_pdf(job.input_pdf, job.doc_id, job=job, **job.options),
+                                      marker_concurrency=marker_workers, llm_concurrency=llm_workers)
+        # jobs a previous (crashed) run left behind, by content index key
+        self.unfinished = {entry["digest"]: entry["doc_id"] for entry in find_unfinished(ARTIFACT_DIR)
+                           if entry.get("digest")}
+        self.results: List[Dict[str, Any]] = []
+        self.submitted: List[str] = []
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._idle = threading.Event()
+        self._idle.set()
+        self.started = time.time()
+
+    def _record(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.results.append(entry)
+            count = len(self.results)
+        detail = f" ({entry['error']})" if entry.get("error") else ""
+        print(f"[Bulk] {count} {entry['status']}: {entry['path']}{detail}")
+
+    def submit(self, path: Path):
+        try:
+            key = index_key(file_digest(path), self.mode)
+        except OSError as e:
+            self._record({"path": str(path), "doc_id": None, "status": FAILED, "error": str(e)})
+            return
+
+        resumed = self.unfinished.pop(key, None)
+        if resumed is not None:
+            doc_id = resumed
+            self.content_index.resume(key, doc_id)
+            print(f"[Bulk] Resuming {path} as {doc_id}")
+        else:
+            doc_id, hit = self.content_index.lookup_or_reserve(key, str(uuid.uuid4()))
+            if hit:
+                # processed before, or the same bytes earlier in this corpus
+                self._record({"path": str(path), "doc_id": doc_id, "status": "skipped"})
+                return
+            Checkpoints(ARTIFACT_DIR / doc_id).save_job(path, key, 0, self.mode)
+
+        with self._lock:
+            self._pending += 1
+            self._idle.clear()
+            self.submitted.append(doc_id)
+        self.scheduler.submit(doc_id, path, on_finish=lambda job: self._finish(job, path, key),
+                              options={"mode": self.mode})
+
+    def _finish(self, job: Job, path: Path, key: str):
+        # jobs are only cancelled by Ctrl-C: their checkpoints stay, so the next run resumes them
+        if job.stage == FAILED:
+            Checkpoints(ARTIFACT_DIR / job.doc_id).clear()
+            remove_content_artifacts(ARTIFACT_DIR / job.doc_id)
+        self.content_index.complete(key, job.doc_id)
+        timings = read_timings(job.doc_id) if job.stage == DONE else {}
+        self.storage.document_finished(job.doc_id)
+        self.storage.enforce(busy=self.scheduler.active(), on_evict=self.content_index.forget)
+        enrich = timings.get("enrich", {})
+        self._record({
+            "path": str(path),
+            "doc_id": job.doc_id,
+            "status": job.stage,
+            "error": job.error,
+            "total_s": timings.get("total_s"),
+            "stages": timings.get("stages", {}),
+            "input_tokens": enrich.get("input_tokens", 0),
+            "output_tokens": enrich.get("output_tokens", 0),
+            "calls": enrich.get("calls", {}),
+        })
+        with self._lock:
+            self._pending -= 1
+            if self._pending == 0:
+                self._idle.set()
+
+    def wait(self):
+        # short timeouts keep the main thread responsive to Ctrl-C
+        while not self._idle.wait(0.5):
+            pass
+
+    def cancel(self):
+        with self._lock:
+            doc_ids = list(self.submitted)
+        for doc_id in doc_ids:
+            self.scheduler.cancel(doc_id)
+
+    def report(self) -> Dict[str, Any]:
+        with self._lock:
+            results = list(self.results)
+        wall_s = time.time() - self.started
+        counts = {status: sum(1 for entry in results if entry["status"] == status)
+                  for status in (DONE, "skipped", FAILED, CANCELLED)}
+        done = [entry for entry in results if entry["status"] == DONE]
+        stage_totals: Dict[str, float] = {}
+        call_totals: Dict[str, int] = {}
+        for entry in done:
+            for stage, seconds in entry["stages"].items():
+                stage_totals[stage] = stage_totals.get(stage, 0.0) + seconds
+            for key, value in entry["calls"].items():
+                call_totals[key] = call_totals.get(key, 0) + value
+        input_tokens = sum(entry["input_tokens"] for entry in done)
+        output_tokens = sum(entry["output_tokens"] for entry in done)
+        return {
+            "started_at": datetime.fromtimestamp(self.started, timezone.utc).isoformat(timespec="seconds"),
+            "wall_s": round(wall_s, 1),
+            "mode": self.mode,
+            "marker_workers": self.marker_workers,
+            "llm_workers": self.llm_workers,
+            "files": len(results),
+            "processed": counts[DONE],
+            "skipped": counts["skipped"],
+            "failed": counts[FAILED],
+            "cancelled": counts[CANCELLED],
+            "docs_per_hour": round(counts[DONE] / wall_s * 3600, 1) if wall_s > 0 else None,
+            "tokens": {"input": input_tokens, "output": output_tokens,
+                       "per_doc": round((input_tokens + output_tokens) / len(done)) if done else 0},
+            "llm_calls": call_totals,
+            # summed over documents; with overlapping stages these exceed the wall time
+            "stage_seconds": {stage: round(seconds, 1) for stage, seconds in stage_totals.items()},
+            "storage": self.storage.stats(),
+            "failures": [{"path": entry["path"], "doc_id": entry["doc_id"], "error": entry["error"]}
+                         for entry in results if entry["status"] == FAILED],
+            "documents": results,
+        }
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Process a corpus of PDFs without the API server")
+    parser.add_argument("sources", nargs="+", type=Path, help="directories, PDF files or manifests")
+    parser.add_argument("--mode", default=ENRICHMENT_MODE, choices=ENRICHMENT_MODES, help="enrichment tier")
+    parser.add_argument("--marker-workers", type=int, default=JOB_MARKER_CONCURRENCY,
+                        help="concurrent Marker conversions")
+    parser.add_argument("--llm-workers", type=int, default=JOB_LLM_CONCURRENCY,
+                        help="concurrent document enrichments")
+    parser.add_argument("--marker-pool", type=int, default=marker_pool.MARKER_POOL_SIZE,
+                        help="warm Marker worker processes (0 = marker_single CLI per file)")
+    parser.add_argument("--report", type=Path, help="report file (default: data/bulk/<timestamp>.json)")
+    args = parser.parse_args(argv)
+
+    paths = collect_inputs(args.sources)
+    missing = [path for path in paths if not path.is_file()]
+    for path in missing:
+        print(f"[Bulk] Not found: {path}")
+    paths = [path for path in paths if path.is_file()]
+    print(f"[Bulk] {len(paths)} PDFs, mode {args.mode}, "
+          f"{args.marker_workers} Marker / {args.llm_workers} LLM workers")
+
+    marker_pool.start_pool(args.marker_pool)
+    run = BulkRun(args.mode, args.marker_workers, args.llm_workers)
+    try:
+        for path in paths:
+            run.submit(path)
+        run.wait()
+    except KeyboardInterrupt:
+        print("[Bulk] Interrupted, stopping queued and running jobs (run again to resume from their checkpoints)")
+        run.cancel()
+        run.wait()
+    finally:
+        run.storage.flush()
+        run.scheduler.shutdown()
+        marker_pool.stop_pool()
+        images.stop_pool()
+
+    report = run.report()
+    report["missing"] = [str(path) for path in missing]
+    report_path = args.report or BULK_DIR / f"{datetime.now(timezone.utc).strftime('%Y%m%d-%H%M%S')}.json"
+    report_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(report_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+    print(f"[Bulk] {report['processed']} processed, {report['skipped']} skipped, {report['failed']} failed, "
+          f"{report['cancelled']} cancelled in {report['wall_s']}s ({report['docs_per_hour']} docs/hour), "
+          f"{report['tokens']['input']} input / {report['tokens']['output']} output tokens")
+    print(f"[Bulk] Report: {report_path}")
+    return 1 if report["failed"] or missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,117 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from artifacts import write_atomic
+
+# per-document checkpoints of an unfinished job, removed once content.json is written
+CHECKPOINT_DIR = "checkpoints"
+JOB_FILE = "job.json"          # what to resume: input pdf, upload digest, priority, enrichment mode
+BATCHES_FILE = "batches.jsonl"  # one line of {block_id: annotations} per enriched batch
+# stage checkpoints: "<stage>.json"
+MARKER_STAGE = "marker"        # Marker output is complete at artifacts/<id>/<id>.json (+ images/)
+BLOCKS_STAGE = "blocks"        # normalized blocks and meta, image derivatives built
+
+
+class Checkpoints:
+    """
+    crash-safe progress of one document under artifacts/<id>/checkpoints/
+    stage files are replaced atomically; batch results are appended as whole lines,
+    and a line cut off by a crash is ignored when reading
+    """
+
+    def __init__(self, doc_dir: Path):
+        self.dir = Path(doc_dir) / CHECKPOINT_DIR
+        self._lock = threading.Lock()
+
+    def _write_json(self, name: str, data: Any):
+        self.dir.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.dir / name, json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+    def _read_json(self, name: str) -> Optional[Any]:
+        try:
+            with open(self.dir / name, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except ValueError as e:
+            print(f"[Checkpoint] Ignoring unreadable {self.dir / name}: {e}")
+            return None
+
+    def save_job(self, input_pdf: Path, digest: Optional[str], priority: int, mode: Optional[str] = None):
+        self._write_json(JOB_FILE, {"input_pdf": str(input_pdf), "digest": digest, "priority": priority,
+                                    "mode": mode, "created_at": time.time()})
+
+    def load_job(self) -> Optional[Dict[str, Any]]:
+        return self._read_json(JOB_FILE)
+
+    def save_stage(self, stage: str, data: Dict[str, Any]):
+        self._write_json(f"{stage}.json", data)
+
+    def load_stage(self, stage: str) -> Optional[Dict[str, Any]]:
+        return self._read_json(f"{stage}.json")
+
+    def append_batch(self, annotations: Dict[str, Any]):
+        """annotations of one finished batch: {block_id: BlockAnnotations dump}"""
+        if not annotations:
+            return
+        line = json.dumps(annotations, ensure_ascii=False, separators=(",", ":")) + "\n"
+        with self._lock:
+            self.dir.mkdir(parents=True, exist_ok=True)
+            with open(self.dir / BATCHES_FILE, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def load_batches(self) -> Dict[str, Any]:
+        """annotations of every checkpointed batch, by block id"""
+        annotations: Dict[str, Any] = {}
+        try:
+            with open(self.dir / BATCHES_FILE, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        annotations.update(json.loads(line))
+                    except ValueError:
+                        # the last line of a crashed append
+                        break
+        except FileNotFoundError:
+            pass
+        return annotations
+
+    def clear(self):
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def find_unfinished(artifact_dir: Path) -> List[Dict[str, Any]]:
+    """
+    startup recovery scan: documents with a job checkpoint, oldest first
+    each entry is the job checkpoint plus "doc_id"; leftover temp files of interrupted writes are removed
+    jobs that cannot be resumed (no pdf and no Marker checkpoint) are dropped
+    a content.json next to the checkpoints is the skim-tier document (or the final one of a job that
+    crashed before clearing them); either way the job is resumed, with every checkpointed batch reused
+    """
+    jobs = []
+    if not artifact_dir.is_dir():
+        return jobs
+    for doc_dir in artifact_dir.iterdir():
+        checkpoints = Checkpoints(doc_dir)
+        if not checkpoints.dir.is_dir():
+            continue
+        for tmp_path in list(doc_dir.glob("*.tmp")) + list(checkpoints.dir.glob("*.tmp")):
+            tmp_path.unlink(missing_ok=True)
+        job = checkpoints.load_job()
+        if job is None:
+            # never started properly
+            checkpoints.clear()
+            continue
+        if not Path(job["input_pdf"]).exists() and checkpoints.load_stage(MARKER_STAGE) is None:
+            print(f"[Checkpoint] Cannot resume {doc_dir.name}: input pdf is gone")
+            checkpoints.clear()
+            continue
+        jobs.append(dict(job, doc_id=doc_dir.name))
+    jobs.sort(key=lambda job: job.get("created_at", 0))
+    return jobs
@@ -0,0 +1,100 @@
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Set, Tuple
+
+from artifacts import write_atomic
+
+
+def index_key(digest: str, mode: str) -> str:
+    """content index key: a skim-only document does not satisfy an upload that wants LLM annotations"""
+    return digest + ":skim" if mode == "skim" else digest
+
+
+class ContentIndex:
+    """
+    content-addressed index of uploaded PDFs (sha256 -> doc_id)
+    persisted as JSON under data/ so repeat uploads reuse existing artifacts
+    instead of running Marker and the LLM again
+    """
+
+    def __init__(self, index_path: Path, artifact_dir: Path):
+        self.index_path = Path(index_path)
+        self.artifact_dir = Path(artifact_dir)
+        self._lock = threading.Lock()
+        self._entries: Dict[str, str] = {}
+        self._in_flight: Set[str] = set()
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _load(self):
+        if not self.index_path.exists():
+            return
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+        except Exception as e:
+            print(f"[ContentIndex] Could not read {self.index_path}, starting empty: {e}")
+            self._entries = {}
+
+    def _save(self):
+        # write to a temp file and rename so a crash never leaves a truncated index
+        self.index_path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.index_path, json.dumps(self._entries).encode("utf-8"))
+
+    def _is_ready(self, doc_id: str) -> bool:
+        return (self.artifact_dir / doc_id / "content.json").exists()
+
+    def lookup_or_reserve(self, digest: str, new_doc_id: str) -> Tuple[str, bool]:
+        """
+        return (doc_id, hit)
+        hit: the digest maps to a finished document or to an in-flight job
+        miss: new_doc_id is reserved for the digest and marked in-flight
+        """
+        with self._lock:
+            existing = self._entries.get(digest)
+            if existing and (existing in self._in_flight or self._is_ready(existing)):
+                self.hits += 1
+                return existing, True
+
+            # unknown digest, or a stale entry whose job failed / was lost
+            self.misses += 1
+            self._entries[digest] = new_doc_id
+            self._in_flight.add(new_doc_id)
+            self._save()
+            return new_doc_id, False
+
+    def resume(self, digest: str, doc_id: str):
+        """mark a job resumed after a restart as in flight again, so re-uploads attach to it"""
+        with self._lock:
+            self._in_flight.add(doc_id)
+            if self._entries.get(digest) != doc_id:
+                self._entries[digest] = doc_id
+                self._save()
+
+    def complete(self, digest: str, doc_id: str):
+        """mark the job for digest as finished; keep the entry only if it produced content.json"""
+        with self._lock:
+            self._in_flight.discard(doc_id)
+            if not self._is_ready(doc_id) and self._entries.get(digest) == doc_id:
+                del self._entries[digest]
+                self._save()
+
+    def forget(self, doc_id: str):
+        """drop the entries of a deleted document, so its bytes are processed again when re-uploaded"""
+        with self._lock:
+            digests = [digest for digest, entry in self._entries.items() if entry == doc_id]
+            for digest in digests:
+                del self._entries[digest]
+            if digests:
+                self._save()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "entries": len(self._entries),
+                "in_flight": len(self._in_flight),
+            }
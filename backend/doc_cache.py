@@ -0,0 +1,137 @@
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Dict, NamedTuple, Optional, Tuple
+
+from artifacts import CONTENT_FILE, RESPONSE_VARIANTS, envelope, parse_accept_encoding
+
+# memory budget for cached get_pdf responses (0 = disabled)
+HOT_DOC_CACHE_MB = float(os.getenv("HOT_DOC_CACHE_MB", "256"))
+
+IDENTITY = "identity"
+
+
+class Representation(NamedTuple):
+    body: bytes
+    etag: str
+    encoding: Optional[str]  # Content-Encoding, None for identity
+
+
+class _Entry:
+    def __init__(self, digest: str, encodings: Tuple[str, ...]):
+        self.digest = digest
+        self.encodings = encodings  # precompressed variants on disk, in preference order
+        self.bodies: Dict[str, bytes] = {}
+        self.size = 0
+
+
+def etag_for(digest: str, encoding: str) -> str:
+    """strong ETag per representation: same content, different encoding -> different tag"""
+    return f'"{digest}"' if encoding == IDENTITY else f'"{digest}-{encoding}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
+
+
+class HotDocumentCache:
+    """
+    size-bounded LRU of finished documents' get_pdf response bodies
+    loaded from disk on first request; the pipeline invalidates a document when it rewrites it
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._bytes = 0
+        # bumped by every invalidation, so a load that raced one is not cached
+        self._epoch = 0
+        self.hits = 0
+        self.misses = 0
+
+    def invalidate(self, doc_id: str):
+        """thread-safe; callable from pipeline threads"""
+        with self._lock:
+            self._epoch += 1
+            entry = self._entries.pop(doc_id, None)
+            if entry is not None:
+                self._bytes -= entry.size
+
+    @staticmethod
+    def _load_entry(doc_dir: Path) -> Optional[_Entry]:
+        try:
+            content = (doc_dir / CONTENT_FILE).read_bytes()
+        except FileNotFoundError:
+            return None
+        encodings = tuple(e for e, filename in RESPONSE_VARIANTS.items() if (doc_dir / filename).exists())
+        return _Entry(hashlib.sha256(content).hexdigest()[:32], encodings)
+
+    def representation(self, doc_id: str, doc_dir: Path, accept_encoding: Optional[str]) -> Optional[Representation]:
+        """
+        the response body for a finished document, in the best encoding the client accepts
+        None when content.json does not exist (yet); does file I/O on a miss, so call it off the event loop
+        """
+        with self._lock:
+            epoch = self._epoch
+            entry = self._entries.get(doc_id)
+            if entry is not None:
+                self._entries.move_to_end(doc_id)
+        if entry is None:
+            entry = self._load_entry(doc_dir)
+            if entry is None:
+                return None
+
+        accepted = parse_accept_encoding(accept_encoding)
+        encoding = next((e for e in entry.encodings if accepted.get(e, accepted.get("*", 0.0)) > 0), IDENTITY)
+        body = entry.bodies.get(encoding)
+        if body is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            try:
+                body = envelope((doc_dir / CONTENT_FILE).read_bytes()) if encoding == IDENTITY \
+                    else (doc_dir / RESPONSE_VARIANTS[encoding]).read_bytes()
+            except FileNotFoundError:
+                return None
+            self._store(doc_id, entry, encoding, body, epoch)
+        return Representation(body, etag_for(entry.digest, encoding), None if encoding == IDENTITY else encoding)
+
+    def _store(self, doc_id: str, entry: _Entry, encoding: str, body: bytes, epoch: int):
+        if self.max_bytes <= 0 or len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if self._epoch != epoch:
+                return
+            cached = self._entries.get(doc_id)
+            if cached is None:
+                self._entries[doc_id] = entry
+            elif cached is not entry:
+                # loaded concurrently by another request; keep the cached entry
+                entry = cached
+            if encoding in entry.bodies:
+                return
+            entry.bodies[encoding] = body
+            entry.size += len(body)
+            self._bytes += len(body)
+            while self._bytes > self.max_bytes:
+                evicted_id, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                if evicted_id == doc_id:
+                    break
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"documents": len(self._entries), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses}
+
+
+hot_documents = HotDocumentCache(int(HOT_DOC_CACHE_MB * 1024 * 1024))
@@ -0,0 +1,97 @@
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, Any
+
+
+def normalize_content(content: str) -> str:
+    """collapse whitespace so re-extracted copies of the same paragraph share a key"""
+    return re.sub(r'\s+', ' ', content or "").strip()
+
+
+class EnrichmentCache:
+    """
+    persistent per-block cache of validated BlockAnnotations (SQLite)
+    key: sha256(model, prompt hash, block type, normalized content)
+    bounded to max_entries with least-recently-used eviction
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 50000):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # one connection shared by the enrichment threads, serialized by _lock
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS annotations ("
+            " key TEXT PRIMARY KEY,"
+            " value TEXT NOT NULL,"
+            " last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_last_used ON annotations(last_used)")
+        self._conn.commit()
+
+    @staticmethod
+    def make_key(content: str, block_type: str, model_name: str, prompt_hash: str) -> str:
+        raw = "\0".join([model_name, prompt_hash, block_type or "", normalize_content(content)])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """return {key: annotations dict} for cached keys and refresh their LRU timestamp"""
+        keys = list(dict.fromkeys(keys))
+        found: Dict[str, Dict[str, Any]] = {}
+        if not keys:
+            return found
+        with self._lock:
+            # stay under SQLite's host-parameter limit
+            for i in range(0, len(keys), 500):
+                chunk = keys[i:i + 500]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._conn.execute(
+                    f"SELECT key, value FROM annotations WHERE key IN ({placeholders})", chunk
+                ).fetchall()
+                for key, value in rows:
+                    found[key] = json.loads(value)
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE annotations SET last_used = ? WHERE key = ?",
+                    [(now, key) for key in found]
+                )
+                self._conn.commit()
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, items: Dict[str, Dict[str, Any]]):
+        """store annotations dicts and evict least-recently-used rows beyond max_entries"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO annotations (key, value, last_used) VALUES (?, ?, ?)",
+                [(key, json.dumps(value, ensure_ascii=False, separators=(",", ":")), now)
+                 for key, value in items.items()]
+            )
+            count = self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+            if count > self.max_entries:
+                self._conn.execute(
+                    "DELETE FROM annotations WHERE key IN ("
+                    " SELECT key FROM annotations ORDER BY last_used ASC LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM annotations").fetchone()[0]
+        return {"hits": self.hits, "misses": self.misses, "entries": entries}
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+from typing import Any, Dict, List, Tuple
+
+# events after which a document stream ends
+TERMINAL_EVENTS = {"done", "failed"}
+
+
+class _Channel:
+    def __init__(self):
+        self.history: List[Tuple[str, Any]] = []
+        self.subscribers: List[Tuple[asyncio.AbstractEventLoop, asyncio.Queue]] = []
+
+
+class DocumentEventBus:
+    """
+    per-document pub/sub between the pipeline (worker threads) and SSE clients (event loop)
+    history is kept until a terminal event so late subscribers get a full replay
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._channels: Dict[str, _Channel] = {}
+
+    def publish(self, doc_id: str, event: str, data: Any):
+        """thread-safe; callable from pipeline threads"""
+        item = (event, data)
+        with self._lock:
+            channel = self._channels.setdefault(doc_id, _Channel())
+            channel.history.append(item)
+            for loop, queue in channel.subscribers:
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+            if event in TERMINAL_EVENTS:
+                # subscribers already have the terminal item queued; clients arriving later read content.json
+                del self._channels[doc_id]
+
+    def _register(self, doc_id: str, loop, queue) -> List[Tuple[str, Any]]:
+        with self._lock:
+            channel = self._channels.setdefault(doc_id, _Channel())
+            channel.subscribers.append((loop, queue))
+            return list(channel.history)
+
+    def _unregister(self, doc_id: str, queue):
+        with self._lock:
+            channel = self._channels.get(doc_id)
+            if channel is None:
+                return
+            channel.subscribers = [(l, q) for l, q in channel.subscribers if q is not queue]
+            if not channel.subscribers and not channel.history:
+                del self._channels[doc_id]
+
+    def subscribe(self, doc_id: str, keepalive_s: float = 15.0) -> "Subscription":
+        """
+        register a subscriber immediately (must be called from the event loop)
+        and return an async iterator over replayed history plus live events
+        """
+        return Subscription(self, doc_id, keepalive_s)
+
+
+class Subscription:
+    """
+    async iterator of (event, data) until a terminal event;
+    yields ("keepalive", None) when idle for keepalive_s
+    """
+
+    def __init__(self, bus: DocumentEventBus, doc_id: str, keepalive_s: float):
+        self._bus = bus
+        self.doc_id = doc_id
+        self.keepalive_s = keepalive_s
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._closed = False
+        for item in bus._register(doc_id, asyncio.get_running_loop(), self._queue):
+            self._queue.put_nowait(item)
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._bus._unregister(self.doc_id, self._queue)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> Tuple[str, Any]:
+        if self._closed:
+            raise StopAsyncIteration
+        try:
+            event, data = await asyncio.wait_for(self._queue.get(), timeout=self.keepalive_s)
+        except asyncio.TimeoutError:
+            return "keepalive", None
+        if event in TERMINAL_EVENTS:
+            self.close()
+        return event, data
+
+
+# shared by pipeline.py (publisher) and main.py (SSE endpoint)
+bus = DocumentEventBus()
@@ -0,0 +1,202 @@
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from align import AhoCorasick
+from batching import estimate_tokens
+
+# anchors a term needs from the LLM before it is pre-filled locally
+GLOSSARY_MIN_SEEN = int(os.getenv("GLOSSARY_MIN_SEEN", "2"))
+# local anchors per block (the prompt asks the model for 3-8 terms per paragraph)
+GLOSSARY_MAX_PER_BLOCK = int(os.getenv("GLOSSARY_MAX_PER_BLOCK", "5"))
+MIN_TERM_CHARS = 3
+MAX_TERM_CHARS = 64
+DEFAULT_TRIGGER_MS = 800
+
+
+def term_key(term: str) -> str:
+    return re.sub(r"\s+", " ", term).strip().lower()
+
+
+def _usable_term(key: str) -> bool:
+    return MIN_TERM_CHARS <= len(key) <= MAX_TERM_CHARS and any(ch.isalpha() for ch in key)
+
+
+def merge_local_anchors(annotations: Dict[str, Any], local: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], int]:
+    """
+    add glossary anchors to one block's raw LLM annotations; LLM anchors for the same terms
+    (or overlapping them) are dropped, the model was told to skip those
+    returns (annotations, estimated output tokens the local anchors saved)
+    """
+    keys = {term_key(anchor["term"]) for anchor in local}
+    spans = [anchor["range"] for anchor in local]
+    kept = [
+        anchor for anchor in annotations.get("bilingual_anchors") or []
+        if isinstance(anchor, dict) and term_key(str(anchor.get("term", ""))) not in keys
+        and not any(isinstance(anchor.get("range"), list) and len(anchor["range"]) == 2
+                    and anchor["range"][0] < end and start < anchor["range"][1] for start, end in spans)
+    ]
+    anchors = sorted(kept + local, key=lambda anchor: anchor["range"][0] if isinstance(anchor.get("range"), list) else 0)
+    saved = sum(estimate_tokens(json.dumps(anchor, ensure_ascii=False)) for anchor in local)
+    return dict(annotations, bilingual_anchors=anchors), saved
+
+
+class GlossaryMatcher:
+    """known terms of one domain, matched in one pass over a block"""
+
+    def __init__(self, entries: Dict[str, Dict[str, Any]]):
+        self.entries = entries
+        self._automaton = AhoCorasick(entries)
+
+    def annotate(self, content: str, limit: int = GLOSSARY_MAX_PER_BLOCK) -> List[Dict[str, Any]]:
+        """
+        anchors for known terms in content: whole words only, longest match first, no overlaps,
+        at most `limit` distinct terms (first occurrence of each)
+        """
+        if not self.entries or not content:
+            return []
+        lowered = content.lower()
+        if len(lowered) != len(content):
+            # lowercasing changed offsets (rare non-ASCII case folds); skip rather than misplace
+            return []
+        candidates = []
+        for key, starts in self._automaton.find_all(lowered).items():
+            for start in starts:
+                end = start + len(key)
+                if (start > 0 and content[start - 1].isalnum() and content[start].isalnum()) or \
+                        (end < len(content) and content[end - 1].isalnum() and content[end].isalnum()):
+                    continue
+                candidates.append((start, end, key))
+        candidates.sort(key=lambda c: (-(c[1] - c[0]), c[0]))
+
+        taken: List[Tuple[int, int]] = []
+        used_keys = set()
+        anchors = []
+        for start, end, key in candidates:
+            if key in used_keys or any(start < t_end and t_start < end for t_start, t_end in taken):
+                continue
+            entry = self.entries[key]
+            taken.append((start, end))
+            used_keys.add(key)
+            anchors.append({
+                "term": content[start:end],
+                "range": [start, end],
+                "translation": entry["translation"],
+                "nuance_note": entry["nuance_note"],
+                "trigger_threshold_ms": DEFAULT_TRIGGER_MS,
+            })
+            if len(anchors) >= limit:
+                break
+        anchors.sort(key=lambda anchor: anchor["range"][0])
+        return anchors
+
+
+class Glossary:
+    """
+    persistent cross-document terminology index (SQLite), learned from validated LLM anchors
+    key: (lowercased term, document domain); the first translation / nuance note is kept
+    bounded to max_entries, evicting the least used entries (oldest first among equals)
+    """
+
+    def __init__(self, db_path: Path, max_entries: int = 20000, min_seen: int = GLOSSARY_MIN_SEEN):
+        self.db_path = Path(db_path)
+        self.max_entries = max_entries
+        self.min_seen = min_seen
+        self._lock = threading.Lock()
+        self._version = 0
+        self._matchers: Dict[str, Tuple[int, GlossaryMatcher]] = {}
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # one connection shared by the enrichment threads, serialized by _lock
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS terms ("
+            " key TEXT NOT NULL,"
+            " domain TEXT NOT NULL,"
+            " term TEXT NOT NULL,"
+            " translation TEXT NOT NULL,"
+            " nuance_note TEXT,"
+            " seen INTEGER NOT NULL,"
+            " uses INTEGER NOT NULL DEFAULT 0,"
+            " last_used REAL NOT NULL,"
+            " PRIMARY KEY (key, domain))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_terms_usage ON terms(seen, uses, last_used)")
+        self._conn.commit()
+
+    def matcher(self, domain: Optional[str]) -> GlossaryMatcher:
+        """matcher over the known terms of domain (rebuilt only after the glossary changed)"""
+        domain = domain or ""
+        with self._lock:
+            cached = self._matchers.get(domain)
+            if cached is not None and cached[0] == self._version:
+                return cached[1]
+            version = self._version
+            rows = self._conn.execute(
+                "SELECT key, term, translation, nuance_note FROM terms WHERE domain = ? AND seen >= ?",
+                (domain, self.min_seen)
+            ).fetchall()
+        matcher = GlossaryMatcher({
+            key: {"term": term, "translation": translation, "nuance_note": nuance_note}
+            for key, term, translation, nuance_note in rows
+        })
+        with self._lock:
+            self._matchers[domain] = (version, matcher)
+        return matcher
+
+    def observe(self, anchors: Iterable[Dict[str, Any]], domain: Optional[str]):
+        """learn from validated LLM anchors (dicts with term / translation / nuance_note)"""
+        rows = {}
+        for anchor in anchors:
+            key = term_key(anchor.get("term") or "")
+            if _usable_term(key) and anchor.get("translation"):
+                entry = rows.setdefault(key, [anchor["term"], anchor["translation"], anchor.get("nuance_note"), 0])
+                entry[3] += 1
+        if not rows:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "INSERT INTO terms (key, domain, term, translation, nuance_note, seen, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?)"
+                " ON CONFLICT(key, domain) DO UPDATE SET seen = seen + excluded.seen, last_used = excluded.last_used",
+                [(key, domain or "", term, translation, note, seen, now)
+                 for key, (term, translation, note, seen) in rows.items()]
+            )
+            self._evict()
+            self._conn.commit()
+            self._version += 1
+
+    def record_uses(self, keys: Dict[str, int], domain: Optional[str]):
+        """count local pre-annotations, so used entries survive eviction"""
+        if not keys:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE terms SET uses = uses + ?, last_used = ? WHERE key = ? AND domain = ?",
+                [(count, now, key, domain or "") for key, count in keys.items()]
+            )
+            self._conn.commit()
+
+    def _evict(self):
+        count = self._conn.execute("SELECT COUNT(*) FROM terms").fetchone()[0]
+        if count > self.max_entries:
+            self._conn.execute(
+                "DELETE FROM terms WHERE rowid IN ("
+                " SELECT rowid FROM terms ORDER BY seen + uses ASC, last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            entries, known = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(seen >= ?), 0) FROM terms", (self.min_seen,)
+            ).fetchone()
+            uses = self._conn.execute("SELECT COALESCE(SUM(uses), 0) FROM terms").fetchone()[0]
+        return {"entries": entries, "known": known, "uses": uses}
@@ -0,0 +1,153 @@
+import html as html_lib
+import re
+from array import array
+from functools import lru_cache
+from typing import Iterable, List, NamedTuple, Tuple
+
+# tags that separate words when rendered (inline tags like <b>, <a>, <math> do not)
+BLOCK_TAGS = frozenset({
+    "p", "div", "br", "hr", "li", "ul", "ol", "dl", "dt", "dd", "tr", "td", "th", "table",
+    "thead", "tbody", "caption", "blockquote", "pre", "section", "h1", "h2", "h3", "h4", "h5", "h6",
+})
+
+_TOKEN = re.compile(r"""
+    (?P<text>\ ?[^<&\s]+(?:\ [^<&\s]+)*)                    # words joined by single spaces (and one
+                                                            # leading space): copied as is
+  | (?P<space>\s+)
+  | (?P<tag><(?P<name>/?[A-Za-z][A-Za-z0-9]*)[^>]*>|<!--.*?-->|<[!?][^>]*>)
+  | (?P<entity>&(?:\#[0-9]+|\#[xX][0-9a-fA-F]+|[A-Za-z][A-Za-z0-9]*);?)
+  | (?P<other>[<&])                                          # stray < or &, kept as text
+""", re.VERBOSE | re.DOTALL)
+# dispatch on m.lastindex (the outermost group that matched): cheaper than m.lastgroup
+_TEXT, _SPACE, _TAG, _NAME, _ENTITY = (_TOKEN.groupindex[name] for name in ("text", "space", "tag", "name", "entity"))
+# tag names as written, with and without the closing slash, so most lookups skip lower()
+_BLOCK_NAMES = frozenset(prefix + name for name in BLOCK_TAGS for prefix in ("", "/")) | \
+    frozenset(prefix + name.upper() for name in BLOCK_TAGS for prefix in ("", "/"))
+
+
+class ExtractedText(NamedTuple):
+    """
+    plain text of an HTML fragment plus its offset map
+
+    offsets is a flat array of (text_start, html_start, html_end) triples, one per segment.
+    A segment whose html span is as long as its text was copied 1:1; any other segment is a
+    single decoded entity or collapsed whitespace run. Adjacent 1:1 segments are merged, so
+    plain text costs one triple and only tags/entities/whitespace runs add more.
+    """
+    text: str
+    offsets: array
+
+
+@lru_cache(maxsize=4096)
+def _unescape(entity: str) -> str:
+    return html_lib.unescape(entity)
+
+
+def html_to_text(source: str) -> ExtractedText:
+    """
+    single pass over the HTML: drop tags, decode entities, collapse whitespace to single
+    spaces (block-level tags count as whitespace), strip both ends
+    the per-token work is inlined: this runs on every block of every document
+    """
+    offsets = array("i")
+    if not source:
+        return ExtractedText("", offsets)
+
+    parts: List[str] = []
+    t = 0
+    pending_start = pending_end = -1  # html span of whitespace not yet emitted
+    # text and html end of the last segment when it was copied 1:1 (-1 otherwise), so the next
+    # 1:1 piece starting right there extends it instead of adding a triple
+    copied_t = copied_h = -1
+
+    for m in _TOKEN.finditer(source):
+        kind = m.lastindex
+        if kind == _TAG:
+            name = m.group(_NAME)
+            if pending_start < 0 and name and (name in _BLOCK_NAMES or name.lstrip("/").lower() in BLOCK_TAGS):
+                pending_start, pending_end = m.span()
+            continue
+        if kind == _SPACE:
+            if pending_start < 0:
+                pending_start, pending_end = m.span()
+            continue
+
+        piece = m.group()
+        start, end = m.span()
+        if kind == _ENTITY:
+            decoded = _unescape(piece)
+            if decoded != piece:
+                if decoded.isspace():
+                    if pending_start < 0:
+                        pending_start, pending_end = start, end
+                    continue
+                piece = decoded
+        elif kind == _TEXT and piece[0] == " " and (pending_start >= 0 or not t):
+            # the leading space joins the pending whitespace (or is stripped at the start)
+            if pending_start < 0:
+                pending_start, pending_end = start, start + 1
+            piece = piece[1:]
+            start += 1
+
+        if pending_start >= 0:
+            if t:
+                if pending_end - pending_start == 1 and copied_t == t and copied_h == pending_start:
+                    offsets[-1] = pending_end
+                else:
+                    offsets.extend((t, pending_start, pending_end))
+                parts.append(" ")
+                t += 1
+                copied_t, copied_h = (t, pending_end) if pending_end - pending_start == 1 else (-1, -1)
+            pending_start = -1
+
+        if end - start == len(piece):
+            if copied_t == t and copied_h == start:
+                offsets[-1] = end
+            else:
+                offsets.extend((t, start, end))
+            t += len(piece)
+            copied_t, copied_h = t, end
+        else:
+            offsets.extend((t, start, end))
+            t += len(piece)
+            copied_t = copied_h = -1
+        parts.append(piece)
+
+    return ExtractedText("".join(parts), offsets)
+
+
+def html_to_text_many(sources: Iterable[str]) -> List[ExtractedText]:
+    """html_to_text over all blocks of a document"""
+    return [html_to_text(source) for source in sources]
+
+
+def _segment(offsets: array, pos: int) -> int:
+    """index of the last triple whose text_start <= pos"""
+    lo, hi = 0, len(offsets) // 3
+    while lo < hi:
+        mid = (lo + hi) // 2
+        if offsets[mid * 3] <= pos:
+            lo = mid + 1
+        else:
+            hi = mid
+    return max(lo - 1, 0)
+
+
+def html_range(extracted: ExtractedText, start: int, end: int) -> Tuple[int, int]:
+    """map a [start, end) text range to the [start, end) html range it came from"""
+    offsets = extracted.offsets
+    if not offsets or end <= start:
+        return 0, 0
+    text_len = len(extracted.text)
+
+    def seg_len(k: int) -> int:
+        return (offsets[k * 3 + 3] if (k + 1) * 3 < len(offsets) else text_len) - offsets[k * 3]
+
+    k = _segment(offsets, start)
+    t0, h0, h1 = offsets[k * 3:k * 3 + 3]
+    html_start = h0 + (start - t0) if h1 - h0 == seg_len(k) else h0
+
+    k = _segment(offsets, end - 1)
+    t0, h0, h1 = offsets[k * 3:k * 3 + 3]
+    html_end = h0 + (end - t0) if h1 - h0 == seg_len(k) else h1
+    return html_start, html_end
@@ -0,0 +1,114 @@
+import base64
+import io
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+# derivatives are bounded to the reader column (times device pixel ratio)
+IMAGE_MAX_WIDTH = int(os.getenv("IMAGE_MAX_WIDTH", "1440"))
+IMAGE_WEBP_QUALITY = int(os.getenv("IMAGE_WEBP_QUALITY", "80"))
+IMAGE_PLACEHOLDER_WIDTH = int(os.getenv("IMAGE_PLACEHOLDER_WIDTH", "16"))
+# processes encoding derivatives (0 = encode in the pipeline thread)
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+DERIVED_DIR = "derived"
+IMAGE_SUFFIXES = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff"}
+
+
+def make_derivative(source: str, output: str) -> Dict[str, Any]:
+    """
+    width-bounded WebP of one image plus a tiny blurred-up placeholder (data URI)
+    runs in a worker process; returns the derivative's size and dimensions
+    """
+    with Image.open(source) as image:
+        image.load()
+        original_size = image.size
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+        if image.width > IMAGE_MAX_WIDTH:
+            height = max(1, round(image.height * IMAGE_MAX_WIDTH / image.width))
+            image = image.resize((IMAGE_MAX_WIDTH, height), Image.LANCZOS)
+        image.save(output, "WEBP", quality=IMAGE_WEBP_QUALITY, method=4)
+
+        placeholder = image.copy()
+        placeholder.thumbnail((IMAGE_PLACEHOLDER_WIDTH, IMAGE_PLACEHOLDER_WIDTH * 4))
+        buffer = io.BytesIO()
+        placeholder.save(buffer, "WEBP", quality=30)
+
+    return {
+        "width": image.width,
+        "height": image.height,
+        "bytes": os.path.getsize(output),
+        "original_width": original_size[0],
+        "original_height": original_size[1],
+        "original_bytes": os.path.getsize(source),
+        "placeholder": "data:image/webp;base64," + base64.b64encode(buffer.getvalue()).decode("ascii"),
+    }
+
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    global _executor
+    if IMAGE_WORKERS <= 0:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            # spawn, like the Marker pool: the API process holds threads that must not be forked
+            _executor = ProcessPoolExecutor(max_workers=IMAGE_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def stop_pool():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True)
+            _executor = None
+
+
+def build_derivatives(images_dir: Path) -> Dict[str, Dict[str, Any]]:
+    """
+    derivatives for every image in images_dir, written to images_dir/derived/<name>.webp
+    (the full name: fig1.png and fig1.jpg must not share one derivative)
+    returns {original file name: info with "src" relative to the artifact dir}
+    images that fail (or everything, when Pillow is not installed) keep their original
+    """
+    if Image is None or not images_dir.is_dir():
+        return {}
+    sources = [p for p in sorted(images_dir.iterdir()) if p.is_file() and p.suffix.lower() in IMAGE_SUFFIXES]
+    if not sources:
+        return {}
+    derived_dir = images_dir / DERIVED_DIR
+    derived_dir.mkdir(exist_ok=True)
+
+    executor = _get_executor() if len(sources) > 1 else None
+    jobs = {}
+    for source in sources:
+        output = derived_dir / f"{source.name}.webp"
+        args = (str(source), str(output))
+        jobs[source.name] = (output, executor.submit(make_derivative, *args) if executor else args)
+
+    derivatives: Dict[str, Dict[str, Any]] = {}
+    for name, (output, job) in jobs.items():
+        try:
+            info = job.result() if executor else make_derivative(*job)
+        except Exception as e:
+            print(f"[Images] Could not derive {name}: {e}")
+            continue
+        info["src"] = f"images/{DERIVED_DIR}/{output.name}"
+        derivatives[name] = info
+
+    saved = sum(i["original_bytes"] - i["bytes"] for i in derivatives.values())
+    print(f"[Images] {len(derivatives)}/{len(sources)} derivatives, {saved / 1e6:.1f} MB saved")
+    return derivatives
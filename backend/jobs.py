@@ -0,0 +1,319 @@
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Any, Tuple
+
+# pipeline stages reported by the job-status API
+QUEUED = "queued"
+WAITING = "waiting"  # picked up, waiting for a free slot of its next stage
+CONVERTING = "converting"
+ENRICHING = "enriching"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINAL_STAGES = {DONE, FAILED, CANCELLED}
+
+# per-stage concurrency: Marker is CPU-bound, the LLM stage is I/O-bound
+JOB_MARKER_CONCURRENCY = int(os.getenv("JOB_MARKER_CONCURRENCY", "1"))
+JOB_LLM_CONCURRENCY = int(os.getenv("JOB_LLM_CONCURRENCY", "4"))
+# finished jobs kept in memory for the status API
+JOB_HISTORY_SIZE = int(os.getenv("JOB_HISTORY_SIZE", "1000"))
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    """one queued pdf; mutated by its worker thread, read by the status API"""
+
+    def __init__(self, doc_id: str, input_pdf: Path, priority: int,
+                 on_finish: Optional[Callable[["Job"], None]], limits: Dict[str, "StageLimit"],
+                 options: Optional[Dict[str, Any]] = None):
+        self.doc_id = doc_id
+        self.input_pdf = Path(input_pdf)
+        self.priority = priority
+        # keyword arguments for the pipeline (e.g. the enrichment mode)
+        self.options = options or {}
+        self.on_finish = on_finish
+        self.limits = limits
+        self.stage = QUEUED
+        self.error: Optional[str] = None
+        self.batches_done = 0
+        self.batches_total = 0
+        self.submitted_at = time.time()
+        self.stage_times: Dict[str, float] = {}
+        self._stage_started = time.perf_counter()
+        self.cancel_event = threading.Event()
+        # stage whose slot the worker took before dequeuing this job (see JobScheduler._worker)
+        self.reserved: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def set_stage(self, stage: str):
+        with self._lock:
+            now = time.perf_counter()
+            self.stage_times[self.stage] = self.stage_times.get(self.stage, 0.0) + now - self._stage_started
+            self.stage = stage
+            self._stage_started = now
+
+    def set_progress(self, done: int, total: int):
+        with self._lock:
+            self.batches_done = done
+            self.batches_total = total
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled(f"Job {self.doc_id} was cancelled")
+
+    def release_reserved(self):
+        if self.reserved is not None:
+            self.limits[self.reserved].release()
+            self.reserved = None
+
+    def acquire(self, stage: str):
+        """take a slot of stage, as WAITING; gives up (JobCancelled) when the job is cancelled meanwhile"""
+        if self.reserved == stage:
+            self.reserved = None
+            return
+        self.release_reserved()
+        self.set_stage(WAITING)
+        limit = self.limits[stage]
+        while not limit.acquire(timeout=0.5):
+            self.check_cancelled()
+
+    def borrow(self, stage: str, count: int) -> int:
+        """take up to count more slots of stage that are free right now (work split within a stage); returns how many"""
+        limit = self.limits.get(stage)
+        taken = 0
+        while limit is not None and taken < count and limit.try_acquire():
+            taken += 1
+        return taken
+
+    def give_back(self, stage: str, count: int):
+        for _ in range(count):
+            self.limits[stage].release()
+
+    @property
+    def finished(self) -> bool:
+        return self.stage in FINAL_STAGES
+
+    def status(self) -> Dict[str, Any]:
+        with self._lock:
+            stage_times = dict(self.stage_times)
+            if not self.finished:
+                stage_times[self.stage] = stage_times.get(self.stage, 0.0) + time.perf_counter() - self._stage_started
+            return {
+                "doc_id": self.doc_id,
+                "stage": self.stage,
+                "options": self.options,
+                "error": self.error,
+                "progress": {"batches_done": self.batches_done, "batches_total": self.batches_total},
+                "stage_times": {k: round(v, 3) for k, v in stage_times.items()},
+                "submitted_at": self.submitted_at,
+            }
+
+
+@contextmanager
+def job_stage(job: Optional[Job], stage: str):
+    """
+    run a pipeline stage under the scheduler's limit for that stage
+    the job is WAITING until it has a slot, then records the stage; no-op when the pipeline runs without a job
+    """
+    if job is None:
+        yield
+        return
+    job.check_cancelled()
+    limited = stage in job.limits
+    if limited:
+        job.acquire(stage)
+    job.set_stage(stage)
+    try:
+        yield
+    finally:
+        if limited:
+            job.limits[stage].release()
+    job.check_cancelled()
+
+
+class StageLimit:
+    """
+    counting semaphore of one stage's slots; shares the scheduler's condition so that
+    workers waiting for a free Marker slot wake up when one is released
+    """
+
+    def __init__(self, slots: int, condition: threading.Condition):
+        self.slots = slots
+        self.free = slots
+        self._condition = condition
+
+    def acquire(self, timeout: Optional[float] = None) -> bool:
+        with self._condition:
+            if not self._condition.wait_for(lambda: self.free > 0, timeout):
+                return False
+            self.free -= 1
+            return True
+
+    def try_acquire(self) -> bool:
+        with self._condition:
+            if self.free <= 0:
+                return False
+            self.free -= 1
+            return True
+
+    def release(self):
+        with self._condition:
+            if self.free >= self.slots:
+                raise ValueError("stage slot released too many times")
+            self.free += 1
+            self._condition.notify_all()
+
+
+class JobScheduler:
+    """
+    bounded pipeline scheduler replacing FastAPI BackgroundTasks
+    jobs are taken from a priority queue (lower number first, FIFO within a priority)
+    by worker threads; each stage runs under its own concurrency limit
+    a worker only dequeues once a Marker slot is free, so jobs wait in the priority queue (where a
+    later high-priority job can pass them) rather than in a worker blocked on the limit
+    """
+
+    def __init__(self, run: Callable[[Job], None],
+                 marker_concurrency: int = JOB_MARKER_CONCURRENCY,
+                 llm_concurrency: int = JOB_LLM_CONCURRENCY,
+                 history_size: int = JOB_HISTORY_SIZE):
+        self._run = run
+        self._lock = threading.Lock()
+        # signalled on submit, shutdown and every released stage slot
+        self._condition = threading.Condition(self._lock)
+        self._limits = {
+            CONVERTING: StageLimit(max(1, marker_concurrency), self._condition),
+            ENRICHING: StageLimit(max(1, llm_concurrency), self._condition),
+        }
+        self._pending: List[Tuple[int, int, Job]] = []  # heap of (priority, seq, job)
+        self._seq = itertools.count()
+        self._stopping = False
+        self._jobs: "OrderedDict[str, Job]" = OrderedDict()
+        self._history_size = history_size
+        # enough workers for every stage slot to be busy at once
+        self._workers = [
+            threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+            for i in range(max(1, marker_concurrency) + max(1, llm_concurrency))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, doc_id: str, input_pdf: Path, priority: int = 0,
+               on_finish: Optional[Callable[[Job], None]] = None,
+               options: Optional[Dict[str, Any]] = None) -> Job:
+        job = Job(doc_id, input_pdf, priority, on_finish, self._limits, options)
+        with self._condition:
+            self._jobs[doc_id] = job
+            self._jobs.move_to_end(doc_id)
+            heapq.heappush(self._pending, (priority, next(self._seq), job))
+            self._condition.notify_all()
+        return job
+
+    def get(self, doc_id: str) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(doc_id)
+
+    def cancel(self, doc_id: str) -> bool:
+        """
+        cancel a queued or running job; a running job stops at its next stage or batch boundary
+        returns False for unknown or finished jobs
+        """
+        job = self.get(doc_id)
+        if job is None or job.finished:
+            return False
+        job.cancel_event.set()
+        with self._condition:
+            # checked and set under the lock the worker takes a job with
+            if job.stage == QUEUED:
+                # no worker owns it yet; the worker that dequeues it only runs on_finish
+                job.set_stage(CANCELLED)
+                self._condition.notify_all()
+        return True
+
+    def active(self) -> List[str]:
+        """doc ids of queued and running jobs"""
+        with self._lock:
+            return [doc_id for doc_id, job in self._jobs.items() if not job.finished]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            counts: Dict[str, int] = {}
+            for job in self._jobs.values():
+                counts[job.stage] = counts.get(job.stage, 0) + 1
+        return counts
+
+    def shutdown(self):
+        """workers exit once the queued jobs are taken"""
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+
+    def _next_job(self) -> Optional[Job]:
+        """
+        wait for a queued job and a free Marker slot (new jobs start with Marker), take both;
+        the slot is handed to the job. Cancelled jobs are taken without a slot. None on shutdown
+        """
+        marker = self._limits[CONVERTING]
+
+        def ready() -> bool:
+            if not self._pending:
+                return self._stopping
+            return marker.free > 0 or self._pending[0][2].finished
+
+        with self._condition:
+            self._condition.wait_for(ready)
+            if not self._pending:
+                return None
+            _, _, job = heapq.heappop(self._pending)
+            if not job.finished:
+                marker.free -= 1
+                job.reserved = CONVERTING
+                job.set_stage(WAITING)
+            return job
+
+    def _worker(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.finished:
+                # cancelled while queued: nothing ran
+                self._finish(job)
+                continue
+            try:
+                self._run(job)
+                job.set_stage(DONE)
+            except JobCancelled:
+                job.set_stage(CANCELLED)
+                print(f"[Jobs] {job.doc_id} cancelled")
+            except Exception as e:
+                job.error = str(e) or type(e).__name__
+                job.set_stage(FAILED)
+                print(f"[Jobs] {job.doc_id} failed: {job.error}")
+            finally:
+                # a resumed job past Marker, or one that failed first, did not use its slot
+                job.release_reserved()
+                self._finish(job)
+
+    def _finish(self, job: Job):
+        if job.on_finish:
+            try:
+                job.on_finish(job)
+            except Exception as e:
+                print(f"[Jobs] on_finish for {job.doc_id} raised: {e}")
+        self._trim_history()
+
+    def _trim_history(self):
+        with self._lock:
+            finished = [doc_id for doc_id, job in self._jobs.items() if job.finished]
+            for doc_id in finished[:max(0, len(finished) - self._history_size)]:
+                del self._jobs[doc_id]
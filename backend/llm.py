@@ -1,42 +1,115 @@
+import hashlib
 import json
 import os
-import re
-from typing import List, Dict, Any
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Dict, Any, Optional, Callable, Iterator, Tuple
+from pydantic import ValidationError
 from schemas import DocumentResponse, Block, BlockAnnotations, BilingualAnchor, DocumentMeta
+from ratelimit import RateLimiter
+from enrich_cache import EnrichmentCache
+from glossary import Glossary, merge_local_anchors, term_key
+from htmltext import html_to_text
+from align import AlignStats, align_batch
+from resilience import CallStats, CircuitBreaker, MalformedReply, call_with_salvage
+from metrics import Trace, span, record_llm_batch, glossary_saved_tokens
+from batching import (estimate_tokens, estimate_block_output_tokens, split_oversized_block,
+                      pack_batches, merge_part_annotations)
+
+# concurrency / rate limits for enrichment batches (0 = unlimited)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "4"))
+LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+
+# per-block annotation cache under repo-root data/ (0 entries = disabled)
+ENRICH_CACHE_PATH = Path(os.getenv(
+    "ENRICH_CACHE_PATH", Path(__file__).resolve().parent.parent / "data" / "enrich_cache.sqlite3"))
+ENRICH_CACHE_MAX_ENTRIES = int(os.getenv("ENRICH_CACHE_MAX_ENTRIES", "50000"))
+
+# cross-document terminology index, pre-fills anchors of known terms (0 entries = disabled)
+GLOSSARY_PATH = Path(os.getenv(
+    "GLOSSARY_PATH", Path(__file__).resolve().parent.parent / "data" / "glossary.sqlite3"))
+GLOSSARY_MAX_ENTRIES = int(os.getenv("GLOSSARY_MAX_ENTRIES", "20000"))
+
+_rate_limiter: Optional[RateLimiter] = None
+_rate_limiter_lock = threading.Lock()
+_enrichment_cache: Optional[EnrichmentCache] = None
+_enrichment_cache_lock = threading.Lock()
+_glossary: Optional[Glossary] = None
+_glossary_lock = threading.Lock()
+_circuit_breaker: Optional[CircuitBreaker] = None
+_circuit_breaker_lock = threading.Lock()
+# LLM call counters summed over all documents since startup
+llm_call_totals = CallStats()
 
 
 def extract_text_from_html(html: str) -> str:
-    """从 HTML 中提取纯文本"""
-    if not html:
-        return ""
-    text = re.sub(r'<[^>]+>', '', html)
-    text = re.sub(r'\s+', ' ', text).strip()
-    return text
+    """从 HTML 中提取纯文本 (entities decoded, whitespace collapsed)"""
+    return html_to_text(html).text
 
 
-def parse_marker_children(children: List[Dict], blocks: List[Dict], block_counter: List[int]):
-    """recursively parse marker children to blocks """
-    TEXT_TYPES = {"Text", "SectionHeader", "Title", "ListItem", "Caption", "Footnote"}
+TEXT_TYPES = {"Text", "SectionHeader", "Title", "ListItem", "Caption", "Footnote"}
+
 
-    for child in children:
+def iter_marker_blocks(children: List[Dict], block_counter: Optional[List[int]] = None,
+                       visit: Optional[Callable[[Dict], None]] = None) -> Iterator[Dict[str, Any]]:
+    """
+    walk marker children in document (pre-)order with an explicit stack and yield text blocks
+    no recursion, so arbitrarily deep trees are fine; visit(node) is called on every node on the way
+    """
+    block_counter = block_counter if block_counter is not None else [0]
+    stack = [iter(children)]
+    while stack:
+        child = next(stack[-1], None)
+        if child is None:
+            stack.pop()
+            continue
         if not isinstance(child, dict):
             continue
+        if visit:
+            visit(child)
         block_type = child.get("block_type", "")
         html = child.get("html", "")
         nested = child.get("children")
 
         if block_type in TEXT_TYPES and html:
-            text = extract_text_from_html(html)
+            extracted = html_to_text(html)
+            text = extracted.text
             if text and len(text) > 10:
-                blocks.append({
+                yield {
                     "id": child.get("id", f"blk_{block_counter[0]:03d}"),
                     "type": "heading" if "Header" in block_type else "paragraph",
-                    "content": text
-                })
+                    "content": text,
+                    "html": html,
+                    "offset_map": extracted.offsets.tolist(),
+                }
                 block_counter[0] += 1
+        elif isinstance(child.get("image"), str):
+            info = child.get("image_info") or {}
+            yield {
+                "id": child.get("id", f"blk_{block_counter[0]:03d}"),
+                "type": "image",
+                "content": "",
+                "image": {
+                    "src": child["image"],
+                    "width": info.get("width"),
+                    "height": info.get("height"),
+                    "bytes": info.get("bytes"),
+                    "placeholder": info.get("placeholder"),
+                    "original": child.get("image_original"),
+                },
+            }
+            block_counter[0] += 1
 
         if nested and isinstance(nested, list):
-            parse_marker_children(nested, blocks, block_counter)
+            stack.append(iter(nested))
+
+
+def parse_marker_children(children: List[Dict], blocks: List[Dict], block_counter: List[int]):
+    """parse marker children to blocks """
+    blocks.extend(iter_marker_blocks(children, block_counter))
 
 
 def get_llm_client():
@@ -71,6 +144,7 @@ def get_system_prompt() -> str:
     - `id`: unique block identifier
     - `type`: block type (paragraph, heading, table, etc.)
     - `content`: the text content of the block
+    - `known_terms` (optional): terms already annotated for this block; do not return anchors for them
 
     ## Output Format
     You must return a JSON object with enriched blocks. For each block, you should add an `annotations` object containing:
@@ -125,6 +199,7 @@ def get_system_prompt() -> str:
         - Any subtle distinctions or common misconceptions
     - Character ranges are relative to the entire block content
     - Avoid over-annotating common words
+    - Skip terms listed in the block's `known_terms`, they are annotated already
 
     ## Processing Guidelines
 
@@ -240,26 +315,102 @@ def get_system_prompt() -> str:
     Now process the input blocks and return the enriched JSON structure."""
 
 
-def call_llm_for_enrichment(blocks: List[Dict[str, Any]], client, client_type: str) -> Dict[str, Any]:
+def get_model_name() -> str:
+    return os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+
+
+def get_prompt_hash() -> str:
+    """short hash of the system prompt; part of the cache key so prompt edits invalidate cached annotations"""
+    return hashlib.sha256(get_system_prompt().encode("utf-8")).hexdigest()[:16]
+
+
+def get_enrichment_cache() -> Optional[EnrichmentCache]:
     """
-    Call LLM to enrich document blocks with annotations
+    process-wide per-block annotation cache (None when disabled)
     """
-    system_prompt = get_system_prompt()
+    global _enrichment_cache
+    if ENRICH_CACHE_MAX_ENTRIES <= 0:
+        return None
+    with _enrichment_cache_lock:
+        if _enrichment_cache is None:
+            _enrichment_cache = EnrichmentCache(ENRICH_CACHE_PATH, ENRICH_CACHE_MAX_ENTRIES)
+        return _enrichment_cache
 
-    # Prepare input blocks (simplified structure for LLM)
-    input_blocks = [
-        {
+
+def get_glossary() -> Optional[Glossary]:
+    """
+    process-wide terminology index (None when disabled)
+    """
+    global _glossary
+    if GLOSSARY_MAX_ENTRIES <= 0:
+        return None
+    with _glossary_lock:
+        if _glossary is None:
+            _glossary = Glossary(GLOSSARY_PATH, GLOSSARY_MAX_ENTRIES)
+        return _glossary
+
+
+def get_rate_limiter() -> RateLimiter:
+    """
+    process-wide limiter shared by all documents (API quotas are per key, not per document)
+    """
+    global _rate_limiter
+    with _rate_limiter_lock:
+        if _rate_limiter is None:
+            _rate_limiter = RateLimiter(LLM_REQUESTS_PER_MINUTE, LLM_TOKENS_PER_MINUTE)
+        return _rate_limiter
+
+
+def get_circuit_breaker() -> CircuitBreaker:
+    """
+    process-wide breaker: when the API is down it is down for every document
+    """
+    global _circuit_breaker
+    with _circuit_breaker_lock:
+        if _circuit_breaker is None:
+            _circuit_breaker = CircuitBreaker()
+        return _circuit_breaker
+
+
+def build_input_payload(blocks: List[Dict[str, Any]]) -> str:
+    """compact JSON of the blocks sent to the LLM (no indentation: whitespace costs tokens)"""
+    input_blocks = []
+    for i, block in enumerate(blocks):
+        input_block = {
             "id": block.get("id", f"blk_{i}"),
             "type": block.get("type", "paragraph"),
             "content": block.get("content", "")
         }
-        for i, block in enumerate(blocks)
-    ]
+        if block.get("known_terms"):
+            input_block["known_terms"] = block["known_terms"]
+        input_blocks.append(input_block)
+    return json.dumps(input_blocks, ensure_ascii=False, separators=(",", ":"))
+
+
+def estimate_batch_tokens(blocks: List[Dict[str, Any]]) -> int:
+    """estimated prompt tokens of one call, used for tokens/minute accounting"""
+    return estimate_tokens(get_system_prompt()) + estimate_tokens(build_input_payload(blocks))
+
+
+def _usage_from_response(response) -> Dict[str, Optional[int]]:
+    usage = getattr(response, "usage_metadata", None)
+    return {
+        "input_tokens": getattr(usage, "prompt_token_count", None),
+        "output_tokens": getattr(usage, "candidates_token_count", None),
+    }
+
+
+def call_llm_for_enrichment(blocks: List[Dict[str, Any]], client, client_type: str) -> Dict[str, Any]:
+    """
+    Call LLM to enrich document blocks with annotations
+    Returns the parsed JSON reply plus a "usage" entry with the API's token counts (None when unreported)
+    """
+    system_prompt = get_system_prompt()
 
     user_prompt = f"""Please analyze and enrich the following document blocks with annotations.
 
 Input blocks:
-{json.dumps(input_blocks, ensure_ascii=False, indent=2)}
+{build_input_payload(blocks)}
 
 Return the enriched blocks in the exact JSON format specified in the system prompt."""
 
@@ -273,7 +424,7 @@ Return the enriched blocks in the exact JSON format specified in the system prom
 
 IMPORTANT: You must return ONLY valid JSON in the exact format specified above. Do not include any markdown code blocks, explanations, or additional text outside the JSON."""
 
-            model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+            model_name = get_model_name()
             model = client.GenerativeModel(
                 model_name=model_name,
                 generation_config={
@@ -283,7 +434,14 @@ IMPORTANT: You must return ONLY valid JSON in the exact format specified above.
             )
 
             response = model.generate_content(full_prompt)
-            result = json.loads(response.text)
+            usage = _usage_from_response(response)
+            try:
+                result = json.loads(response.text)
+            except ValueError as e:
+                raise MalformedReply(f"reply is not valid JSON: {e}", usage)
+            if not isinstance(result, dict) or not isinstance(result.get("blocks"), list):
+                raise MalformedReply("reply has no blocks list", usage)
+            result["usage"] = usage
         else:
             raise ValueError(f"Unknown client type: {client_type}")
 
@@ -293,17 +451,191 @@ IMPORTANT: You must return ONLY valid JSON in the exact format specified above.
         raise
 
 
-def enrich_with_llm(data: dict, doc_id: str, title: str) -> DocumentResponse:
+def run_enrichment_batches(batches: List[List[Dict[str, Any]]], client, client_type: str,
+                           max_in_flight: Optional[int] = None,
+                           limiter: Optional[RateLimiter] = None,
+                           on_result: Optional[Callable[[int, Optional[Dict[str, Any]]], None]] = None,
+                           cancel_event: Optional[threading.Event] = None,
+                           breaker: Optional[CircuitBreaker] = None,
+                           stats: Optional[CallStats] = None,
+                           trace: Optional[Trace] = None
+                           ) -> List[Optional[Dict[str, Any]]]:
     """
-    Enrich marker output data with LLM-generated annotations
+    Send enrichment batches concurrently through a bounded thread pool
 
     Args:
-        data: Raw marker output JSON data
-        doc_id: Document ID
-        title: Document title
+        batches: Lists of normalized blocks, one LLM call each
+        client: LLM client (anything with the genai `GenerativeModel` interface, so a fake can be injected)
+        client_type: Client type passed to call_llm_for_enrichment
+        max_in_flight: Max concurrent calls (default LLM_MAX_IN_FLIGHT)
+        limiter: Requests/tokens per minute limiter (default: process-wide limiter)
+        on_result: Called as on_result(batch_index, result) in the calling thread as each batch finishes
+        cancel_event: When set, batches that have not started yet are skipped (result None)
+        breaker: Circuit breaker (default: process-wide breaker)
+        stats: Call / retry / wasted-token counters (default: only the process-wide totals)
+        trace: Per-document timing breakdown to record each batch in (metrics are recorded regardless)
 
     Returns:
-        DocumentResponse with enriched blocks
+        One result per batch in the original order; None where the batch failed
+        Transient errors are retried with backoff; a batch that keeps failing is bisected, and its
+        result then holds only the blocks of the parts that succeeded
+    """
+    max_in_flight = max(1, max_in_flight or LLM_MAX_IN_FLIGHT)
+    limiter = limiter or get_rate_limiter()
+    breaker = breaker or get_circuit_breaker()
+    stats = stats or CallStats(parent=llm_call_totals)
+    total_batches = len(batches)
+
+    def send(blocks: List[Dict[str, Any]]) -> Dict[str, Any]:
+        # every attempt (retries and bisected halves too) goes through the limiter
+        input_estimate = estimate_batch_tokens(blocks)
+        limiter.acquire(input_estimate)
+        result = call_llm_for_enrichment(blocks, client, client_type)
+        # fall back to local estimates when the API does not report usage
+        usage = result.get("usage") or {}
+        result["usage"] = {
+            "input_tokens": usage.get("input_tokens") or input_estimate,
+            "output_tokens": usage.get("output_tokens")
+                or estimate_tokens(json.dumps(result.get("blocks", []), ensure_ascii=False)),
+        }
+        return result
+
+    def run_one(index: int) -> Optional[Dict[str, Any]]:
+        batch = batches[index]
+        if cancel_event is not None and cancel_event.is_set():
+            return None
+        output_estimate = sum(estimate_block_output_tokens(block) for block in batch)
+        print(f"[LLM] Processing batch {index + 1}/{total_batches} "
+              f"({len(batch)} blocks, ~{estimate_batch_tokens(batch)} in / ~{output_estimate} out tokens)...")
+        batch_stats = CallStats(parent=stats)
+        start = time.perf_counter()
+        parts = call_with_salvage(batch, send, estimate_batch_tokens, breaker, batch_stats, cancel_event)
+        result = None
+        if parts:
+            result = parts[0][1] if len(parts) == 1 and parts[0][0] is batch else merge_salvaged_results(parts)
+        usage = result["usage"] if result else {}
+        record_llm_batch(trace, index, len(batch), time.perf_counter() - start,
+                         usage.get("input_tokens", 0), usage.get("output_tokens", 0), batch_stats.snapshot())
+        if result is None:
+            print(f"[LLM] Batch {index + 1} failed, using original blocks without annotations")
+            return None
+        print(f"[LLM] Batch {index + 1}/{total_batches} done: "
+              f"{result['usage']['input_tokens']} in / {result['usage']['output_tokens']} out tokens")
+        return result
+
+    if total_batches == 0:
+        return []
+    results: List[Optional[Dict[str, Any]]] = [None] * total_batches
+    with ThreadPoolExecutor(max_workers=min(max_in_flight, total_batches)) as executor:
+        futures = {executor.submit(run_one, index): index for index in range(total_batches)}
+        for future in as_completed(futures):
+            # store by index so results line up with batches regardless of completion order
+            index = futures[future]
+            results[index] = future.result()
+            if on_result:
+                on_result(index, results[index])
+    return results
+
+
+def merge_salvaged_results(parts: List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]) -> Dict[str, Any]:
+    """
+    one batch result from the results of its bisected parts
+    annotations are matched within each part, so the merged blocks carry the input ids
+    """
+    blocks = []
+    usage = {"input_tokens": 0, "output_tokens": 0}
+    for sub_batch, result in parts:
+        for position, annotations in sorted(match_batch_annotations(sub_batch, result).items()):
+            blocks.append({"id": sub_batch[position]["id"], "annotations": annotations})
+        for key in usage:
+            usage[key] += (result.get("usage") or {}).get(key) or 0
+    return {"blocks": blocks, "usage": usage}
+
+
+def match_batch_annotations(batch: List[Dict[str, Any]], batch_result: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """
+    map LLM output blocks back to positions in the input batch
+    by id, falling back to position when the model rewrote the id
+    """
+    position_by_id = {block["id"]: i for i, block in enumerate(batch)}
+    matched: Dict[int, Dict[str, Any]] = {}
+    for position, block_data in enumerate(batch_result.get("blocks", [])):
+        if not isinstance(block_data, dict) or not block_data.get("annotations"):
+            continue
+        i = position_by_id.get(block_data.get("id"), position)
+        if i < len(batch) and i not in matched:
+            matched[i] = block_data["annotations"]
+    return matched
+
+
+def build_block_annotations(annotations_data: Dict[str, Any],
+                            stats: Optional[CallStats] = None) -> Optional[BlockAnnotations]:
+    """
+    convert raw LLM annotations into a validated BlockAnnotations
+    every anchor and range is validated on its own: an invalid one is dropped (and counted), not the block
+    """
+    if not annotations_data or not isinstance(annotations_data, dict):
+        return None
+    invalid = 0
+
+    # Parse bilingual anchors
+    bilingual_anchors = None
+    if annotations_data.get("bilingual_anchors"):
+        bilingual_anchors = []
+        for anchor in annotations_data["bilingual_anchors"]:
+            try:
+                bilingual_anchors.append(BilingualAnchor.model_validate(anchor))
+            except ValidationError:
+                invalid += 1
+        bilingual_anchors = bilingual_anchors or None
+
+    # Parse SVO structure (convert list to dict if needed)
+    svo_structure = annotations_data.get("svo_structure")
+    if svo_structure and isinstance(svo_structure, list):
+        # Convert old format [[0,18], [19,21], [22,42]] to dict
+        if len(svo_structure) == 3:
+            svo_structure = {
+                "subject": tuple(svo_structure[0]),
+                "verb": tuple(svo_structure[1]),
+                "object": tuple(svo_structure[2])
+            }
+        else:
+            svo_structure = None
+    elif svo_structure and isinstance(svo_structure, dict):
+        # Ensure tuples
+        svo_structure = {k: tuple(v) if isinstance(v, list) else v
+                       for k, v in svo_structure.items()}
+    else:
+        svo_structure = None
+
+    fields = {
+        "topic_sentence_range": annotations_data.get("topic_sentence_range") or None,
+        "svo_structure": svo_structure or None,
+    }
+    for name, value in list(fields.items()):
+        try:
+            BlockAnnotations.model_validate({name: value})
+        except ValidationError:
+            fields[name] = None
+            invalid += 1
+
+    if invalid:
+        print(f"[LLM] Dropped {invalid} invalid annotation(s)")
+        if stats is not None:
+            stats.incr(invalid_annotations=invalid)
+    annotations = BlockAnnotations(bilingual_anchors=bilingual_anchors, **fields)
+    # nothing valid left: the block stays unannotated (not cached, not checkpointed, skim fallback applies)
+    return None if is_empty_annotations(annotations) else annotations
+
+
+def is_empty_annotations(annotations: BlockAnnotations) -> bool:
+    return (annotations.topic_sentence_range is None and annotations.svo_structure is None
+            and not annotations.bilingual_anchors)
+
+
+def extract_blocks(data: Any) -> List[Dict[str, Any]]:
+    """
+    Extract normalized blocks from marker output
     """
     # Extract blocks from marker output
     # Marker output structure may vary, try common patterns
@@ -312,7 +644,7 @@ def enrich_with_llm(data: dict, doc_id: str, title: str) -> DocumentResponse:
     if isinstance(data, dict):
         # Try different possible structures
         if "children" in data and isinstance(data["children"], list):
-            # Marker tree structure - recursively parse children
+            # Marker tree structure - walk children
             block_counter = [0]
             parse_marker_children(data["children"], blocks, block_counter)
         elif "blocks" in data:
@@ -337,100 +669,277 @@ def enrich_with_llm(data: dict, doc_id: str, title: str) -> DocumentResponse:
         content = json.dumps(data, ensure_ascii=False) if not isinstance(data, str) else data
         blocks = [{"id": "blk_01", "type": "paragraph", "content": content[:1000]}]
 
-    # Normalize block structure
+    return normalize_blocks(blocks)
+
+
+def normalize_blocks(blocks: List[Any]) -> List[Dict[str, Any]]:
+    """
+    Normalize block structure to {"id", "type", "content"} (+ "html", "offset_map" when known)
+    """
     normalized_blocks = []
     for i, block in enumerate(blocks):
         if isinstance(block, dict):
-            normalized_blocks.append({
+            normalized = {
                 "id": block.get("id", f"blk_{i:03d}"),
                 "type": block.get("type", block.get("block_type", "paragraph")),
                 "content": block.get("content", block.get("text", block.get("markdown", "")))
-            })
+            }
+            if block.get("offset_map") is not None:
+                normalized["html"] = block.get("html")
+                normalized["offset_map"] = block["offset_map"]
+            if isinstance(block.get("image"), dict):
+                normalized["image"] = block["image"]
+            normalized_blocks.append(normalized)
         elif isinstance(block, str):
             normalized_blocks.append({
                 "id": f"blk_{i:03d}",
                 "type": "paragraph",
                 "content": block
             })
+    return normalized_blocks
 
-    # Call LLM for enrichment
-    try:
-        client, client_type = get_llm_client()
-        print(f"[LLM] Enriching {len(normalized_blocks)} blocks using {client_type}...")
 
-        # Process in batches if too many blocks (to avoid token limits)
-        batch_size = 10
-        enriched_blocks = []
+def extract_meta(data: Any) -> Optional[DocumentMeta]:
+    """
+    Extract metadata if available
+    """
+    if isinstance(data, dict):
+        if "meta" in data or "metadata" in data:
+            meta_data = data.get("meta") or data.get("metadata", {})
+            return DocumentMeta(
+                difficulty=meta_data.get("difficulty"),
+                domain=meta_data.get("domain"),
+                language=meta_data.get("language", "en-US")
+            )
+    return None
 
-        for i in range(0, len(normalized_blocks), batch_size):
-            batch = normalized_blocks[i:i + batch_size]
-            batch_num = i // batch_size + 1
-            total_batches = (len(normalized_blocks) + batch_size - 1) // batch_size
-            print(f"[LLM] Processing batch {batch_num}/{total_batches}...")
 
-            try:
-                batch_result = call_llm_for_enrichment(batch, client, client_type)
-                enriched_blocks.extend(batch_result.get("blocks", []))
-            except Exception as batch_error:
-                print(f"[LLM] Batch {batch_num} failed: {batch_error}, using original blocks without annotations")
-                # Use original blocks without annotations for this batch
-                enriched_blocks.extend(batch)
-
-        # Convert enriched blocks to Pydantic models
-        pydantic_blocks = []
-        for block_data in enriched_blocks:
-            annotations_data = block_data.get("annotations")
-            annotations = None
-
-            if annotations_data:
-                # Parse bilingual anchors
-                bilingual_anchors = None
-                if annotations_data.get("bilingual_anchors"):
-                    bilingual_anchors = [
-                        BilingualAnchor(**anchor) for anchor in annotations_data["bilingual_anchors"]
-                    ]
-
-                # Parse SVO structure (convert list to dict if needed)
-                svo_structure = annotations_data.get("svo_structure")
-                if svo_structure and isinstance(svo_structure, list):
-                    # Convert old format [[0,18], [19,21], [22,42]] to dict
-                    if len(svo_structure) == 3:
-                        svo_structure = {
-                            "subject": tuple(svo_structure[0]),
-                            "verb": tuple(svo_structure[1]),
-                            "object": tuple(svo_structure[2])
-                        }
-                    else:
-                        svo_structure = None
-                elif svo_structure and isinstance(svo_structure, dict):
-                    # Ensure tuples
-                    svo_structure = {k: tuple(v) if isinstance(v, list) else v
-                                   for k, v in svo_structure.items()}
-
-                annotations = BlockAnnotations(
-                    topic_sentence_range=tuple(annotations_data["topic_sentence_range"])
-                        if annotations_data.get("topic_sentence_range") else None,
-                    svo_structure=svo_structure,
-                    bilingual_anchors=bilingual_anchors
-                )
-
-            pydantic_blocks.append(Block(
-                id=block_data.get("id", "unknown"),
-                type=block_data.get("type", "paragraph"),
-                content=block_data.get("content", ""),
-                annotations=annotations
-            ))
-
-        # Extract metadata if available
-        meta = None
-        if isinstance(data, dict):
-            if "meta" in data or "metadata" in data:
-                meta_data = data.get("meta") or data.get("metadata", {})
-                meta = DocumentMeta(
-                    difficulty=meta_data.get("difficulty"),
-                    domain=meta_data.get("domain"),
-                    language=meta_data.get("language", "en-US")
-                )
+def enrich_with_llm(data: dict, doc_id: str, title: str, **kwargs) -> DocumentResponse:
+    """
+    Enrich marker output data with LLM-generated annotations
+
+    Args:
+        data: Raw marker output JSON data
+        doc_id: Document ID
+        title: Document title
+        **kwargs: Passed to enrich_blocks
+
+    Returns:
+        DocumentResponse with enriched blocks
+    """
+    return enrich_blocks(extract_blocks(data), doc_id, title, meta=extract_meta(data), **kwargs)
+
+
+def enrich_blocks(normalized_blocks: List[Dict[str, Any]], doc_id: str, title: str,
+                  meta: Optional[DocumentMeta] = None, client=None, client_type: Optional[str] = None,
+                  use_cache: bool = True,
+                  on_blocks: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+                  on_batch: Optional[Callable[[List[Block], int, int], None]] = None,
+                  cancel_event: Optional[threading.Event] = None,
+                  known_annotations: Optional[Dict[str, Any]] = None,
+                  report: Optional[Dict[str, Any]] = None,
+                  trace: Optional[Trace] = None) -> DocumentResponse:
+    """
+    Enrich normalized blocks with LLM-generated annotations
+
+    Args:
+        normalized_blocks: Blocks as returned by extract_blocks / normalize_blocks
+        doc_id: Document ID
+        title: Document title
+        meta: Document metadata
+        client: Optional LLM client override (e.g. a fake client in benchmarks); default Gemini
+        client_type: Client type of the override client
+        use_cache: Look up / store per-block annotations in the enrichment cache, and pre-fill / learn
+            bilingual anchors with the glossary
+        on_blocks: Called with the normalized (unannotated) blocks before any LLM call
+        on_batch: Called as on_batch(blocks, completed_batches, total_batches) for the cached blocks
+            (completed_batches=0) and then for every finished LLM batch, in completion order
+        cancel_event: Stop sending new batches once set (the caller discards the result)
+        known_annotations: Annotations by block id that need no LLM call (checkpointed before a restart);
+            reported through on_batch together with the cached blocks
+        report: Filled with batch, token and range-alignment counts
+        trace: Per-document timing breakdown (LLM batches, validation)
+
+    Returns:
+        DocumentResponse with enriched blocks
+    """
+    if on_blocks:
+        on_blocks(normalized_blocks)
+
+    # Call LLM for enrichment
+    try:
+        if client is None:
+            client, client_type = get_llm_client()
+
+        # Reuse annotations of blocks seen before (same content, model and prompt)
+        cache = get_enrichment_cache() if use_cache else None
+        model_name, prompt_hash = get_model_name(), get_prompt_hash()
+        cache_keys = [
+            EnrichmentCache.make_key(block["content"], block["type"], model_name, prompt_hash)
+            for block in normalized_blocks
+        ]
+        cached = cache.get_many(cache_keys) if cache else {}
+
+        annotations_by_index: Dict[int, BlockAnnotations] = {}
+        resumed = 0
+        for i, key in enumerate(cache_keys):
+            known = (known_annotations or {}).get(normalized_blocks[i]["id"])
+            if known is not None:
+                try:
+                    annotations = BlockAnnotations.model_validate(known)
+                    if not is_empty_annotations(annotations):
+                        annotations_by_index[i] = annotations
+                        resumed += 1
+                        continue
+                except ValidationError:
+                    pass
+            if key in cached:
+                try:
+                    annotations = BlockAnnotations.model_validate(cached[key])
+                    # empty entries were written by older versions; re-enrich the block
+                    if not is_empty_annotations(annotations):
+                        annotations_by_index[i] = annotations
+                except ValidationError:
+                    # written by an older schema; re-enrich the block
+                    pass
+        from_cache = len(annotations_by_index) - resumed
+
+        # image blocks have no text to annotate
+        miss_indices = [i for i, block in enumerate(normalized_blocks)
+                        if i not in annotations_by_index and block["type"] != "image"]
+        print(f"[LLM] Enriching {len(miss_indices)}/{len(normalized_blocks)} blocks using {client_type} "
+              f"({from_cache} from cache, {resumed} from checkpoint)...")
+
+        def to_block(i: int) -> Block:
+            block = normalized_blocks[i]
+            return Block(
+                id=block["id"],
+                type=block["type"],
+                content=block["content"],
+                image=block.get("image"),
+                annotations=annotations_by_index.get(i)
+            )
+
+        # Split oversized blocks at sentence boundaries, then pack work items
+        # (block_index, char_offset, payload_block) against the token budgets
+        items = []
+        part_counts: Dict[int, int] = {}
+        for i in miss_indices:
+            parts = split_oversized_block(normalized_blocks[i])
+            part_counts[i] = len(parts)
+            items.extend((i, offset, part) for offset, part in parts)
+
+        # Anchors of terms the glossary knows are filled in locally; the LLM is told to skip them
+        glossary = get_glossary() if use_cache else None
+        domain = meta.domain if meta else None
+        local_anchors: Dict[Tuple[int, int], List[Dict[str, Any]]] = {}
+        if glossary:
+            matcher = glossary.matcher(domain)
+            for n, (i, offset, part) in enumerate(items):
+                anchors = matcher.annotate(part["content"])
+                if anchors:
+                    local_anchors[(i, offset)] = anchors
+                    items[n] = (i, offset, dict(part, known_terms=[anchor["term"] for anchor in anchors]))
+        glossary_totals = {"pre_annotated": 0, "saved_output_tokens": 0, "learned": 0}
+        glossary_uses: Dict[str, int] = {}
+        local_keys: Dict[int, set] = {}
+        to_learn = []
+        item_batches = pack_batches(items, block_of=lambda item: item[2])
+        batches = [[payload for _, _, payload in item_batch] for item_batch in item_batches]
+        part_results: Dict[int, List] = {}
+        incomplete_blocks = [0]
+        completed = [0]
+        token_totals = {"input_tokens": 0, "output_tokens": 0}
+        align_totals = AlignStats()
+        call_stats = CallStats(parent=llm_call_totals)
+        to_cache = {}
+
+        if on_batch and annotations_by_index:
+            on_batch([to_block(i) for i in sorted(annotations_by_index)], 0, len(batches))
+
+        def handle_result(k: int, batch_result: Optional[Dict[str, Any]]):
+            with span("validation", trace):
+                finished_blocks = collect_result(k, batch_result)
+            completed[0] += 1
+            if on_batch:
+                on_batch([to_block(i) for i in finished_blocks], completed[0], len(batches))
+
+        def collect_result(k: int, batch_result: Optional[Dict[str, Any]]) -> List[int]:
+            """align, merge and validate one batch's annotations; returns the blocks it finished"""
+            item_batch = item_batches[k]
+            # Blocks of failed batches stay without annotations (and are not cached)
+            matched = match_batch_annotations(batches[k], batch_result) if batch_result is not None else {}
+            # re-anchor LLM ranges to the text locally instead of re-querying
+            align_totals.add(align_batch(batches[k], matched))
+            for position, (i, offset, _) in enumerate(item_batch):
+                local = local_anchors.get((i, offset))
+                # only next to a real LLM answer: a failed block stays unannotated and retryable
+                if local and position in matched:
+                    matched[position], saved = merge_local_anchors(matched[position], local)
+                    glossary_totals["pre_annotated"] += len(local)
+                    glossary_totals["saved_output_tokens"] += saved
+                    for anchor in local:
+                        key = term_key(anchor["term"])
+                        glossary_uses[key] = glossary_uses.get(key, 0) + 1
+                        local_keys.setdefault(i, set()).add(key)
+            if batch_result is not None:
+                for key, value in (batch_result.get("usage") or {}).items():
+                    token_totals[key] += value or 0
+
+            finished_blocks = []
+            for position, (i, offset, _) in enumerate(item_batch):
+                part_results.setdefault(i, []).append((offset, matched.get(position)))
+                if len(part_results[i]) < part_counts[i]:
+                    continue
+                parts = sorted(part_results.pop(i), key=lambda part: part[0])
+                if len(parts) > 1 and any(part_annotations is None for _, part_annotations in parts):
+                    # a split block is only as good as all of its parts: one failed part leaves the
+                    # whole block unannotated (retryable, never cached or checkpointed half-done)
+                    incomplete_blocks[0] += 1
+                    finished_blocks.append(i)
+                    continue
+                annotations_data = parts[0][1] if len(parts) == 1 else merge_part_annotations(parts)
+                annotations = build_block_annotations(annotations_data, call_stats)
+                if annotations is not None:
+                    annotations_by_index[i] = annotations
+                    to_cache[cache_keys[i]] = annotations.model_dump()
+                    if glossary and annotations.bilingual_anchors:
+                        to_learn.extend(anchor.model_dump() for anchor in annotations.bilingual_anchors
+                                        if term_key(anchor.term) not in local_keys.get(i, ()))
+                finished_blocks.append(i)
+            return finished_blocks
+
+        run_enrichment_batches(batches, client, client_type, on_result=handle_result, cancel_event=cancel_event,
+                               stats=call_stats, trace=trace)
+        print(f"[LLM] {doc_id}: {len(batches)} batches, "
+              f"{token_totals['input_tokens']} input / {token_totals['output_tokens']} output tokens")
+        print(f"[LLM] {doc_id}: ranges checked {align_totals['checked']}, "
+              f"repaired {align_totals['repaired']}, dropped {align_totals['dropped']}")
+        calls = call_stats.snapshot()
+        if calls["retries"] or calls["bisections"] or calls["failed_blocks"]:
+            print(f"[LLM] {doc_id}: {calls['calls']} calls, {calls['retries']} retries, "
+                  f"{calls['bisections']} bisections, {calls['failed_blocks']} blocks failed, "
+                  f"~{calls['wasted_input_tokens']} input / {calls['wasted_output_tokens']} output tokens wasted")
+        if incomplete_blocks[0]:
+            print(f"[LLM] {doc_id}: {incomplete_blocks[0]} split blocks left unannotated (a part failed)")
+        if glossary:
+            glossary_totals["learned"] = len(to_learn)
+            glossary.observe(to_learn, domain)
+            glossary.record_uses(glossary_uses, domain)
+            glossary_saved_tokens.inc(glossary_totals["saved_output_tokens"])
+            if glossary_totals["pre_annotated"]:
+                print(f"[LLM] {doc_id}: {glossary_totals['pre_annotated']} anchors from the glossary, "
+                      f"~{glossary_totals['saved_output_tokens']} output tokens saved")
+        if report is not None:
+            report.update(batches=len(batches), cached_blocks=from_cache,
+                          resumed_blocks=resumed, incomplete_blocks=incomplete_blocks[0], **token_totals,
+                          alignment=dict(align_totals), calls=calls, glossary=glossary_totals)
+
+        if cache:
+            cache.put_many(to_cache)
+
+        # Convert blocks to Pydantic models (original id/type/content, LLM or cached annotations)
+        pydantic_blocks = [to_block(i) for i in range(len(normalized_blocks))]
 
         return DocumentResponse(
             doc_id=doc_id,
@@ -446,7 +955,8 @@ def enrich_with_llm(data: dict, doc_id: str, title: str) -> DocumentResponse:
             Block(
                 id=block.get("id", f"blk_{i:03d}"),
                 type=block.get("type", "paragraph"),
-                content=block.get("content", "")
+                content=block.get("content", ""),
+                image=block.get("image")
             )
             for i, block in enumerate(normalized_blocks)
         ]
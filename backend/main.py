@@ -1,13 +1,48 @@
-from fastapi import FastAPI, UploadFile, BackgroundTasks, HTTPException
+from fastapi import FastAPI, UploadFile, HTTPException, Request, Query
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, Response, PlainTextResponse, JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from starlette.concurrency import run_in_threadpool
+from contextlib import asynccontextmanager
 from pathlib import Path
+from typing import Optional, Tuple
+import hashlib
 import os
 import uuid
 import json
-from pipeline import process_pdf
+from pipeline import process_pdf, ENRICHMENT_MODES, ENRICHMENT_MODE
+from content_index import ContentIndex, index_key
+from events import bus
+from doc_cache import hot_documents, etag_matches
+from artifacts import envelope, ensure_block_index, remove_content_artifacts
+from block_index import read_blocks, read_block, load_meta, has_sources, read_sources, read_source
+from jobs import JobScheduler, Job, QUEUED, WAITING, CONVERTING, DONE, FAILED, CANCELLED
+import marker_pool
+import images
+import llm
+from analytics import gaze_store, parse_beacon, BeaconError
+from checkpoint import Checkpoints, find_unfinished
+from storage import StorageManager
+import metrics
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # load Marker models once in warm workers (MARKER_POOL_SIZE=0 keeps the CLI path)
+    marker_pool.start_pool()
+    gaze_store.start()
+    resume_unfinished_jobs()
+    await run_in_threadpool(storage.scan)
+    await run_in_threadpool(enforce_quota)
+    yield
+    gaze_store.stop()
+    storage.flush()
+    scheduler.shutdown()
+    marker_pool.stop_pool()
+    images.stop_pool()
+
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -24,33 +59,525 @@ ARTIFACT_DIR = BASE_DIR / "artifacts"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(ARTIFACT_DIR, exist_ok=True)
 
-app.mount("/files", StaticFiles(directory=str(ARTIFACT_DIR)), name="files")
+# uploads are copied to disk in fixed-size chunks and capped in size
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(256 * 1024 * 1024)))
+# room for the multipart boundaries and part headers around the file in the request body
+UPLOAD_FORM_OVERHEAD = 64 * 1024
+# keep uploads/<doc_id>.pdf after its job ended (the pipeline only needs it until then)
+KEEP_UPLOADS = os.getenv("KEEP_UPLOADS", "0") == "1"
+PDF_MAGIC = b"%PDF-"
+# ?priority= of uploads is clamped to 0..UPLOAD_MAX_PRIORITY: 0 (the default) runs first, so a client
+# can only defer its own job, never jump ahead of other uploads
+UPLOAD_MAX_PRIORITY = int(os.getenv("UPLOAD_MAX_PRIORITY", "10"))
+# largest page of blocks served by /api/get_pdf/{doc_id}/blocks
+MAX_BLOCKS_PAGE = int(os.getenv("MAX_BLOCKS_PAGE", "500"))
+
+class UploadSizeLimit:
+    """
+    ASGI middleware rejecting upload bodies over MAX_UPLOAD_BYTES before FastAPI parses the multipart
+    form (which spools the whole body): at once from Content-Length, else as soon as a chunked body
+    crosses the cap. save_upload still enforces the exact limit on the file itself
+    """
+
+    def __init__(self, app, path: str):
+        self.app = app
+        self.path = path
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+        limit = MAX_UPLOAD_BYTES + UPLOAD_FORM_OVERHEAD
+        detail = f"File exceeds {MAX_UPLOAD_BYTES} bytes"
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > limit:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimit, path="/api/upload_pdf")
+
+
+class ArtifactFiles(StaticFiles):
+    """
+    /files with cache headers for artifacts: images (originals and derivatives) are written once
+    per document and never change, so browsers keep them for a year without revalidating;
+    other files (content.json, ...) can be rewritten and are revalidated with the ETag /
+    Last-Modified StaticFiles already sends
+    """
+
+    def file_response(self, full_path, stat_result, scope, status_code=200):
+        response = super().file_response(full_path, stat_result, scope, status_code)
+        # only the artifact-relative part counts (ARTIFACT_DIR itself may sit under a directory named images)
+        try:
+            relative = Path(full_path).resolve().relative_to(Path(self.directory).resolve())
+        except ValueError:
+            relative = Path()
+        if "images" in relative.parts:
+            response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["Cache-Control"] = "no-cache"
+        return response
+
+
+app.mount("/files", ArtifactFiles(directory=str(ARTIFACT_DIR)), name="files")
+
+# sha256 of upload bytes -> doc_id, so identical PDFs are processed once
+content_index = ContentIndex(BASE_DIR / "content_index.json", ARTIFACT_DIR)
+# disk quota over artifacts + uploads, evicting the least recently read documents
+storage = StorageManager(ARTIFACT_DIR, UPLOAD_DIR, BASE_DIR / "storage.json")
+
+
+def run_job(job: Job):
+    process_pdf(job.input_pdf, job.doc_id, job=job, **job.options)
+
+
+# bounded per-stage concurrency instead of one unbounded BackgroundTask per upload
+scheduler = JobScheduler(run_job)
+
+
+def finish_job(job: Job, digest: Optional[str]):
+    """
+    release the in-flight entry for digest (entries of failed jobs are dropped so the next upload retries)
+    and end SSE streams of jobs that did not finish normally
+    """
+    if job.stage in (FAILED, CANCELLED):
+        # only jobs interrupted by a crash are resumed; the skim-tier document of the job goes too
+        Checkpoints(ARTIFACT_DIR / job.doc_id).clear()
+        remove_content_artifacts(ARTIFACT_DIR / job.doc_id)
+        hot_documents.invalidate(job.doc_id)
+    if digest:
+        content_index.complete(digest, job.doc_id)
+    metrics.documents.inc(status=job.stage)
+    if not KEEP_UPLOADS and job.input_pdf.parent.resolve() == UPLOAD_DIR.resolve():
+        job.input_pdf.unlink(missing_ok=True)
+    storage.document_finished(job.doc_id)
+    enforce_quota()
+    if job.stage == FAILED:
+        bus.publish(job.doc_id, "failed", {"doc_id": job.doc_id, "error": job.error})
+    elif job.stage == CANCELLED:
+        bus.publish(job.doc_id, "failed", {"doc_id": job.doc_id, "error": "cancelled"})
+
+
+def forget_document(doc_id: str):
+    content_index.forget(doc_id)
+    hot_documents.invalidate(doc_id)
+
+
+def enforce_quota():
+    storage.enforce(busy=scheduler.active(), on_evict=forget_document)
+
+
+def submit_job(doc_id: str, file_path: Path, digest: Optional[str], priority: int = 0,
+               mode: Optional[str] = None):
+    scheduler.submit(doc_id, file_path, priority=priority,
+                     on_finish=lambda job: finish_job(job, digest), options={"mode": mode or ENRICHMENT_MODE})
+
+
+def resume_unfinished_jobs():
+    """requeue jobs a previous process did not finish; they continue from their last checkpoint"""
+    for entry in find_unfinished(ARTIFACT_DIR):
+        if entry.get("digest"):
+            content_index.resume(entry["digest"], entry["doc_id"])
+        submit_job(entry["doc_id"], Path(entry["input_pdf"]), entry.get("digest"), entry.get("priority", 0),
+                   entry.get("mode"))
+        print(f"[Jobs] Resuming unfinished job {entry['doc_id']}")
+
+
+async def save_upload(file: UploadFile, dest_path: Path) -> Tuple[str, int]:
+    """
+    copy the upload to dest_path chunk by chunk, hashing in the same pass
+    rejects non-PDFs on the first chunk and uploads over MAX_UPLOAD_BYTES as soon as the cap is crossed
+    returns (sha256 hex digest, size in bytes)
+    """
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES} bytes")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        with open(dest_path, "wb") as f:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                if size == 0 and not chunk.startswith(PDF_MAGIC):
+                    raise HTTPException(status_code=400, detail="File is not a PDF")
+                size += len(chunk)
+                if size > MAX_UPLOAD_BYTES:
+                    raise HTTPException(status_code=413, detail=f"File exceeds {MAX_UPLOAD_BYTES} bytes")
+                hasher.update(chunk)
+                await run_in_threadpool(f.write, chunk)
+        if size == 0:
+            raise HTTPException(status_code=400, detail="Empty upload")
+    except BaseException:
+        dest_path.unlink(missing_ok=True)
+        raise
+    return hasher.hexdigest(), size
+
 
 @app.post("/api/upload_pdf")
-async def upload_pdf(file: UploadFile, background_tasks: BackgroundTasks):
-    doc_id = str(uuid.uuid4())
+async def upload_pdf(file: UploadFile, priority: int = 0, mode: Optional[str] = None):
+    mode = mode or ENRICHMENT_MODE
+    if mode not in ENRICHMENT_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of {', '.join(ENRICHMENT_MODES)}")
+    priority = min(max(priority, 0), UPLOAD_MAX_PRIORITY)
+    # Save uploaded file under a provisional id; it becomes the doc_id unless the content is known
+    provisional_id = str(uuid.uuid4())
+    part_path = UPLOAD_DIR / f"{provisional_id}.part"
+    with metrics.span("upload_write"):
+        digest, size = await save_upload(file, part_path)
+    metrics.upload_bytes.inc(size)
+
+    # Same bytes already processed or being processed: reuse that doc_id
+    digest = index_key(digest, mode)
+    doc_id, hit = await run_in_threadpool(content_index.lookup_or_reserve, digest, provisional_id)
+    if hit:
+        part_path.unlink(missing_ok=True)
+        return {"message": "PDF uploaded successfully", "doc_id": doc_id, "deduplicated": True}
+
     file_path = UPLOAD_DIR / f"{doc_id}.pdf"
+    os.replace(part_path, file_path)
 
-    # Save uploaded file
-    with open(file_path, "wb") as f:
-        f.write(await file.read())
+    # Queue PDF for processing (lower priority number runs first); the job checkpoint lets a
+    # restarted server pick it up again
+    await run_in_threadpool(Checkpoints(ARTIFACT_DIR / doc_id).save_job, file_path, digest, priority, mode)
+    submit_job(doc_id, file_path, digest, priority, mode)
 
-    # Process PDF in background
-    background_tasks.add_task(process_pdf, file_path, doc_id)
+    return {"message": "PDF uploaded successfully", "doc_id": doc_id, "deduplicated": False}
 
-    return {"message": "PDF uploaded successfully", "doc_id": doc_id}
 
-@app.get("/api/get_pdf/{doc_id}")
-async def get_pdf(doc_id: str):
-    # Check for final processed content
-    content_path = ARTIFACT_DIR / doc_id / "content.json"
+@app.get("/api/content_index/stats")
+async def content_index_stats():
+    return content_index.stats()
 
-    if not content_path.exists():
-        return {"status": "processing"}
 
+@app.get("/api/jobs/{doc_id}")
+async def get_job(doc_id: str):
+    """stage (queued/waiting/converting/enriching/done/failed/cancelled), batch progress and per-stage times"""
+    job = scheduler.get(doc_id)
+    if job is not None:
+        return job.status()
+    if (ARTIFACT_DIR / doc_id / "content.json").exists():
+        return {"doc_id": doc_id, "stage": "done"}
+    raise HTTPException(status_code=404, detail="Unknown job")
+
+
+@app.delete("/api/jobs/{doc_id}")
+async def cancel_job(doc_id: str):
+    if not scheduler.cancel(doc_id):
+        raise HTTPException(status_code=409, detail="Job is not queued or running")
+    return scheduler.get(doc_id).status()
+
+@app.get("/api/get_pdf/{doc_id}")
+async def get_pdf(doc_id: str, request: Request):
+    """
+    the processed document as {"status": "success", "data": ...}
+    the stored bytes are sent as they are: the precompressed variant matching Accept-Encoding
+    (br, gzip), else content.json spliced into the envelope; with a strong ETag (304 on If-None-Match)
+    hot documents are served from memory; while the LLM runs this is the skim-tier document
+    """
+    job = scheduler.get(doc_id)
+    if before_document(job):
+        # answered from job state, without touching the filesystem on every poll
+        return {"status": "processing"}
     try:
-        with open(content_path, "r", encoding="utf-8") as f:
-            data = json.load(f)
-        return {"status": "success", "data": data}
+        representation = await run_in_threadpool(
+            hot_documents.representation, doc_id, ARTIFACT_DIR / doc_id, request.headers.get("accept-encoding"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error reading file: {str(e)}")
+
+    if representation is None:
+        if job is not None and job.stage in (FAILED, CANCELLED):
+            return {"status": "failed", "error": job.error or job.stage}
+        if storage.is_evicted(doc_id):
+            return {"status": "evicted"}
+        return {"status": "processing"}
+    if storage.touch(doc_id):
+        await run_in_threadpool(storage.flush)
+
+    # no-cache: clients may store the document but must revalidate (cheap with the ETag)
+    headers = {"ETag": representation.etag, "Vary": "Accept-Encoding", "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), representation.etag):
+        return Response(status_code=304, headers=headers)
+    if representation.encoding:
+        headers["Content-Encoding"] = representation.encoding
+    return Response(representation.body, media_type="application/json", headers=headers)
+
+
+@app.get("/api/hot_documents/stats")
+async def hot_documents_stats():
+    return hot_documents.stats()
+
+
+@app.get("/api/llm/stats")
+async def llm_stats():
+    return {"breaker": llm.get_circuit_breaker().stats(), "calls": llm.llm_call_totals.snapshot()}
+
+
+@app.get("/api/storage/stats")
+async def storage_stats():
+    return await run_in_threadpool(storage.stats)
+
+
+@app.get("/api/glossary/stats")
+async def glossary_stats():
+    glossary = llm.get_glossary()
+    if glossary is None:
+        return {"enabled": False}
+    return {"enabled": True, **await run_in_threadpool(glossary.stats)}
+
+
+def before_document(job: Optional[Job]) -> bool:
+    """
+    the job has not written content.json yet: no skim-tier document exists before Marker is done,
+    and other modes only write the finished document
+    """
+    if job is None or job.finished:
+        return False
+    return job.stage in (QUEUED, WAITING, CONVERTING) or job.options.get("mode") != "full"
+
+
+def pending_status(doc_id: str):
+    """
+    processing/failed response for a document that is not ready, None once content.json exists
+    (the skim-tier document while the LLM runs, then the enriched one)
+    """
+    job = scheduler.get(doc_id)
+    if before_document(job):
+        return {"status": "processing"}
+    if (ARTIFACT_DIR / doc_id / "content.json").exists():
+        return None
+    if job is not None and job.stage not in (DONE, FAILED, CANCELLED):
+        return {"status": "processing"}
+    if job is not None and job.stage in (FAILED, CANCELLED):
+        return {"status": "failed", "error": job.error or job.stage}
+    if storage.is_evicted(doc_id):
+        return {"status": "evicted"}
+    return {"status": "processing"}
+
+
+async def indexed_doc_dir(doc_id: str) -> Path:
+    """
+    artifact dir of a finished document, adding the block index to documents written before it existed
+    counts as a read for storage eviction
+    """
+    doc_dir = ARTIFACT_DIR / doc_id
+    if storage.touch(doc_id):
+        await run_in_threadpool(storage.flush)
+    if await run_in_threadpool(ensure_block_index, doc_dir):
+        hot_documents.invalidate(doc_id)
+    return doc_dir
+
+
+def success_response(data: bytes) -> Response:
+    return Response(envelope(data), media_type="application/json")
+
+
+@app.get("/api/get_pdf/{doc_id}/blocks")
+async def get_blocks(doc_id: str, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_BLOCKS_PAGE)):
+    """
+    a page of blocks: {"status": "success", "data": {"doc_id", "total", "offset", "limit", "blocks"}}
+    read from the block offset index with a seek, without parsing content.json
+    """
+    pending = pending_status(doc_id)
+    if pending is not None:
+        return pending
+    doc_dir = await indexed_doc_dir(doc_id)
+    total, blocks = await run_in_threadpool(read_blocks, doc_dir, offset, limit)
+    head = json.dumps({"doc_id": doc_id, "total": total, "offset": offset, "limit": limit})
+    return success_response(head[:-1].encode("utf-8") + b',"blocks":' + blocks + b'}')
+
+
+@app.get("/api/get_pdf/{doc_id}/blocks/{block_id:path}")
+async def get_block(doc_id: str, block_id: str):
+    """
+    one block by id; Marker ids contain slashes (/page/0/Text/1) and may be sent URL-encoded
+    or as a plain path (/blocks/page/0/Text/1)
+    """
+    pending = pending_status(doc_id)
+    if pending is not None:
+        return pending
+    doc_dir = await indexed_doc_dir(doc_id)
+    block = await run_in_threadpool(read_block, doc_dir, block_id)
+    if block is None and not block_id.startswith("/"):
+        block = await run_in_threadpool(read_block, doc_dir, "/" + block_id)
+    if block is None:
+        raise HTTPException(status_code=404, detail="Block not found")
+    return success_response(block)
+
+
+@app.get("/api/get_pdf/{doc_id}/sources")
+async def get_sources(doc_id: str, offset: int = Query(0, ge=0), limit: int = Query(50, ge=1, le=MAX_BLOCKS_PAGE)):
+    """
+    source html and offset maps of a page of blocks (kept out of content.json):
+    {"status": "success", "data": {"doc_id", "total", "offset", "limit", "sources": [{id, html, offset_map}]}}
+    """
+    pending = pending_status(doc_id)
+    if pending is not None:
+        return pending
+    doc_dir = await indexed_doc_dir(doc_id)
+    if not has_sources(doc_dir):
+        raise HTTPException(status_code=404, detail="No block sources for this document")
+    total, sources = await run_in_threadpool(read_sources, doc_dir, offset, limit)
+    head = json.dumps({"doc_id": doc_id, "total": total, "offset": offset, "limit": limit})
+    return success_response(head[:-1].encode("utf-8") + b',"sources":' + sources + b'}')
+
+
+@app.get("/api/get_pdf/{doc_id}/sources/{block_id:path}")
+async def get_source(doc_id: str, block_id: str):
+    """one block's {id, html, offset_map}; block id as in /blocks/{block_id}"""
+    pending = pending_status(doc_id)
+    if pending is not None:
+        return pending
+    doc_dir = await indexed_doc_dir(doc_id)
+    if not has_sources(doc_dir):
+        raise HTTPException(status_code=404, detail="No block sources for this document")
+    source = await run_in_threadpool(read_source, doc_dir, block_id)
+    if source is None and not block_id.startswith("/"):
+        source = await run_in_threadpool(read_source, doc_dir, "/" + block_id)
+    if source is None:
+        raise HTTPException(status_code=404, detail="Block not found")
+    return success_response(source)
+
+
+@app.get("/api/get_pdf/{doc_id}/toc")
+async def get_toc(doc_id: str):
+    """headings only: {"status": "success", "data": {"doc_id", "title", "total", "headings": [{index, id, content}]}}"""
+    pending = pending_status(doc_id)
+    if pending is not None:
+        return pending
+    doc_dir = await indexed_doc_dir(doc_id)
+    meta = await run_in_threadpool(load_meta, doc_dir)
+    return {"status": "success", "data": {
+        "doc_id": meta["doc_id"], "title": meta["title"], "total": meta["count"], "headings": meta["toc"],
+    }}
+
+
+@app.post("/api/analytics/gaze", status_code=202)
+async def ingest_gaze(request: Request, doc_id: Optional[str] = None, session_id: Optional[str] = None):
+    """
+    dwell beacons (navigator.sendBeacon posts text/plain, so the body is parsed by hand)
+    acknowledged as soon as they are queued; the background writer appends them
+    """
+    try:
+        beacons = parse_beacon(await request.body(), doc_id, session_id)
+    except BeaconError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # only documents this server knows get a gaze directory
+    for beacon in beacons:
+        if scheduler.get(beacon.doc_id) is None and not (ARTIFACT_DIR / beacon.doc_id / "content.json").exists():
+            raise HTTPException(status_code=404, detail=f"Document not found: {beacon.doc_id}")
+    if not gaze_store.submit(beacons):
+        raise HTTPException(status_code=503, detail="Gaze ingestion queue is full")
+    return {"status": "accepted", "events": sum(len(beacon.dwell) for beacon in beacons)}
+
+
+@app.get("/api/analytics/gaze/{doc_id}")
+async def gaze_percentiles(doc_id: str, percentiles: str = "50,90,99"):
+    try:
+        qs = [float(q) for q in percentiles.split(",") if q.strip()]
+    except ValueError:
+        raise HTTPException(status_code=400, detail="percentiles must be comma-separated numbers")
+    if not qs or any(not 0 < q <= 100 for q in qs):
+        raise HTTPException(status_code=400, detail="percentiles must be in (0, 100]")
+    result = await run_in_threadpool(gaze_store.dwell_percentiles, doc_id, qs)
+    if result is None:
+        raise HTTPException(status_code=404, detail="No gaze data for this document")
+    return result
+
+
+@app.get("/api/analytics/stats")
+async def analytics_stats():
+    return gaze_store.stats()
+
+
+# values kept elsewhere, read at scrape time
+metrics.register_callback("jobs", "Jobs known to the scheduler by stage", scheduler.stats, label="stage")
+metrics.register_callback("llm_calls_total", "LLM call counters since startup",
+                          llm.llm_call_totals.snapshot, kind="counter", label="counter")
+metrics.register_callback("llm_circuit_open", "1 while the LLM circuit breaker refuses calls",
+                          lambda: float(llm.get_circuit_breaker().stats()["state"] == "open"))
+metrics.register_callback("hot_documents", "Hot document cache", hot_documents.stats, label="field")
+metrics.register_callback("gaze_store", "Gaze ingestion writer", gaze_store.stats, label="field")
+metrics.register_callback("storage", "Artifact storage usage and evictions",
+                          lambda: {k: v for k, v in storage.stats().items() if v is not None}, label="field")
+
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text format"""
+    return PlainTextResponse(metrics.REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def read_json(path: Path):
+    """parsed JSON file, None when missing or unreadable"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def format_sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+@app.get("/api/get_pdf/{doc_id}/events")
+async def get_pdf_events(doc_id: str):
+    """
+    server-sent events for a document:
+    `blocks` (raw blocks after Marker), `batch` (each enriched batch), then `done` or `failed`
+    a document that is already finished is sent as one `document` event followed by `done`;
+    while the LLM runs, the skim-tier document is sent as `document` and the batches follow
+    a document with no job and no content.json (unknown, evicted, or failed before a restart) gets `failed` at once
+    """
+    content_path = ARTIFACT_DIR / doc_id / "content.json"
+
+    async def stream():
+        # subscribe before checking content.json so a job finishing in between is not missed
+        subscription = bus.subscribe(doc_id)
+        try:
+            job = scheduler.get(doc_id)
+            running = job is not None and not job.finished
+            document = await run_in_threadpool(read_json, content_path)
+            if document is not None:
+                yield format_sse("document", document)
+            if not running:
+                if document is not None:
+                    yield format_sse("done", {"doc_id": doc_id})
+                else:
+                    # nothing will be published for this document
+                    if job is not None:
+                        error = job.error or job.stage
+                    elif storage.is_evicted(doc_id):
+                        error = "evicted"
+                    else:
+                        error = "unknown document"
+                    yield format_sse("failed", {"doc_id": doc_id, "error": error})
+                return
+
+            async for event, data in subscription:
+                if event == "keepalive":
+                    yield ": keepalive\n\n"
+                else:
+                    yield format_sse(event, data)
+        finally:
+            subscription.close()
+
+    return StreamingResponse(stream(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
@@ -0,0 +1,203 @@
+import importlib.util
+import itertools
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Any, Optional, Tuple
+
+# number of warm Marker worker processes (0 = always use the marker_single CLI)
+MARKER_POOL_SIZE = int(os.getenv("MARKER_POOL_SIZE", "0"))
+# recycle a worker after this many conversions to cap memory growth
+MARKER_POOL_MAX_JOBS = int(os.getenv("MARKER_POOL_MAX_JOBS", "20"))
+# seconds to wait for a pooled conversion before falling back to the CLI
+MARKER_POOL_TIMEOUT_S = float(os.getenv("MARKER_POOL_TIMEOUT_S", "1800"))
+
+# --- worker process state ---------------------------------------------------
+_converter = None
+_model_load_s = 0.0
+_worker_jobs = 0
+_init_error: Optional[str] = None
+_started = None  # queue of (task_id, pid) put when a job starts, read by the parent to stop it on timeout
+
+
+def _init_worker(started=None):
+    """load Marker's models once per worker process"""
+    global _converter, _model_load_s, _init_error, _started
+    _started = started
+    start = time.perf_counter()
+    try:
+        from marker.converters.pdf import PdfConverter
+        from marker.models import create_model_dict
+        _converter = PdfConverter(
+            artifact_dict=create_model_dict(),
+            renderer="marker.renderers.json.JSONRenderer",
+        )
+    except Exception as e:
+        # keep the worker alive; jobs report the error and the caller falls back to the CLI
+        _init_error = f"{type(e).__name__}: {e}"
+    _model_load_s = time.perf_counter() - start
+
+
+def _job_started(task_id: int, output_folder: str):
+    """report this worker as running the job, unless the caller already gave up on it"""
+    if _started is not None:
+        _started.put((task_id, os.getpid()))
+    if not Path(output_folder).is_dir():
+        # the caller timed out while the job was still queued and removed its output folder
+        raise RuntimeError("job abandoned before it started")
+
+
+def _convert(input_pdf: str, output_folder: str, submitted_at: float,
+             page_range: Optional[Tuple[int, int]] = None, task_id: int = 0) -> Dict[str, Any]:
+    """
+    convert one PDF (or an inclusive 0-based page range of it) with the warm converter
+    writes output_folder/<stem>/<stem>.json (+ _meta.json, images) like marker_single
+    """
+    global _worker_jobs
+    started_at = time.time()
+    _job_started(task_id, output_folder)
+    if _converter is None:
+        raise RuntimeError(f"Marker models failed to load: {_init_error}")
+
+    from marker.output import save_output
+
+    _worker_jobs += 1
+    start = time.perf_counter()
+    if _converter.config is None:
+        _converter.config = {}
+    previous_range = _converter.config.get("page_range")
+    if page_range is not None:
+        _converter.config["page_range"] = list(range(page_range[0], page_range[1] + 1))
+    try:
+        rendered = _converter(input_pdf)
+    finally:
+        _converter.config["page_range"] = previous_range
+    stem = Path(input_pdf).stem
+    out_dir = Path(output_folder) / stem
+    # no parents: output_folder is gone when the caller gave up waiting (timeout), so nothing is written
+    out_dir.mkdir(exist_ok=True)
+    save_output(rendered, str(out_dir), stem)
+
+    return {
+        "backend": "pool",
+        "pid": os.getpid(),
+        "worker_job": _worker_jobs,
+        # model load cost is paid by the first job of each worker only
+        "model_load_s": round(_model_load_s, 3) if _worker_jobs == 1 else 0.0,
+        "queue_wait_s": round(max(started_at - submitted_at, 0.0), 3),
+        "convert_s": round(time.perf_counter() - start, 3),
+    }
+
+
+# --- parent process ---------------------------------------------------------
+class MarkerPool:
+    """
+    long-lived pool of Marker worker processes with models loaded at startup
+    jobs are queued to whichever worker is free; a job that times out has its worker terminated
+    (the pool starts a fresh one) instead of leaving it converting in the background
+    """
+
+    # runs in the worker: (input_pdf, output_folder, submitted_at, page_range, task_id) -> timings
+    job = staticmethod(_convert)
+
+    def __init__(self, size: int, max_jobs_per_worker: int):
+        self.size = size
+        # spawn, not fork: forking a process that holds torch state is unsafe
+        ctx = multiprocessing.get_context("spawn")
+        self._started = ctx.Queue()
+        self._pool = ctx.Pool(
+            processes=size,
+            initializer=_init_worker,
+            initargs=(self._started,),
+            maxtasksperchild=max_jobs_per_worker or None,
+        )
+        self._task_ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._pending = set()  # task ids submitted and not yet returned or given up on
+        self._workers: Dict[int, int] = {}  # task id -> pid of the worker running it
+        self.terminated_workers = 0
+
+    def _collect_started(self):
+        """move (task_id, pid) reports from the queue into _workers; called under _lock"""
+        while True:
+            try:
+                task_id, pid = self._started.get_nowait()
+            except queue.Empty:
+                break
+            if task_id in self._pending:
+                self._workers[task_id] = pid
+        for task_id in [task_id for task_id in self._workers if task_id not in self._pending]:
+            del self._workers[task_id]
+
+    def convert(self, input_pdf: Path, output_folder: Path, timeout: Optional[float] = None,
+                page_range: Optional[Tuple[int, int]] = None) -> Dict[str, Any]:
+        task_id = next(self._task_ids)
+        with self._lock:
+            self._pending.add(task_id)
+        result = self._pool.apply_async(
+            self.job,
+            (str(Path(input_pdf).absolute()), str(Path(output_folder).absolute()), time.time(), page_range, task_id)
+        )
+        try:
+            return result.get(timeout)
+        except multiprocessing.TimeoutError:
+            self._terminate(task_id, result)
+            raise
+        finally:
+            with self._lock:
+                self._pending.discard(task_id)
+                self._workers.pop(task_id, None)
+
+    def _terminate(self, task_id: int, result):
+        """stop the worker still running a timed-out job; a job not started yet skips itself"""
+        with self._lock:
+            self._collect_started()
+            pid = self._workers.pop(task_id, None)
+            # the job may have finished since the timeout; then its worker has moved on
+            if pid is None or result.ready():
+                return
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                return
+            self.terminated_workers += 1
+        print(f"[MarkerPool] Terminated worker {pid} after a timed-out job")
+
+    def close(self):
+        if self.terminated_workers:
+            # the terminated workers' jobs never report back, so close() + join() would wait for them forever
+            self._pool.terminate()
+        else:
+            self._pool.close()
+        self._pool.join()
+
+
+_pool: Optional[MarkerPool] = None
+
+
+def start_pool(size: int = MARKER_POOL_SIZE, max_jobs_per_worker: int = MARKER_POOL_MAX_JOBS) -> Optional[MarkerPool]:
+    """start the warm pool (no-op when size is 0 or marker is not installed)"""
+    global _pool
+    if _pool is not None or size <= 0:
+        return _pool
+    if importlib.util.find_spec("marker") is None:
+        print("[MarkerPool] marker-pdf not installed, using marker_single CLI")
+        return None
+    _pool = MarkerPool(size, max_jobs_per_worker)
+    print(f"[MarkerPool] Started {size} warm workers (recycled every {max_jobs_per_worker} jobs)")
+    return _pool
+
+
+def get_pool() -> Optional[MarkerPool]:
+    return _pool
+
+
+def stop_pool():
+    global _pool
+    if _pool is not None:
+        _pool.close()
+        _pool = None
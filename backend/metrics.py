@@ -0,0 +1,223 @@
+import os
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+# per-stage / per-batch breakdown in each document's timings.json (0 = stage totals only)
+METRICS_DOC_BREAKDOWN = os.getenv("METRICS_DOC_BREAKDOWN", "1") != "0"
+
+PREFIX = "creative_reading_"
+# seconds; spans range from a millisecond of validation to many minutes of Marker
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+TOKEN_BUCKETS = (1000, 2500, 5000, 10000, 25000, 50000, 100000, 250000, 500000, 1000000)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        self.name = PREFIX + name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        return self.header() + [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                                for key, value in values]
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # per label set: [count per bucket (last = +Inf)], sum, count
+        self._values: Dict[Tuple[str, ...], List[Any]] = {}
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items())
+        lines = self.header()
+        for key, (counts, total, count) in values:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(total)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+
+class Callback(_Metric):
+    """a value read from elsewhere at scrape time: fn() returns a number or {label value: number}"""
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]],
+                 kind: str = "gauge", label: Optional[str] = None):
+        super().__init__(name, help, (label,) if label else ())
+        self.kind = kind
+        self.fn = fn
+
+    def render(self) -> List[str]:
+        try:
+            value = self.fn()
+        except Exception as e:
+            print(f"[Metrics] {self.name} failed: {e}")
+            return []
+        if isinstance(value, dict):
+            return self.header() + [f"{self.name}{_format_labels(self.labelnames, (key,))} {_format_value(v)}"
+                                    for key, v in sorted(value.items())]
+        return self.header() + [f"{self.name} {_format_value(value)}"]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+        self._lock = threading.Lock()
+
+    def register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        """Prometheus text exposition format 0.0.4"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+stage_seconds = REGISTRY.register(Histogram(
+    "stage_seconds", "Wall time of pipeline stages", ("stage",)))
+llm_batch_seconds = REGISTRY.register(Histogram(
+    "llm_batch_seconds", "Wall time of one enrichment batch, retries and bisection included"))
+llm_tokens = REGISTRY.register(Counter(
+    "llm_tokens_total", "LLM tokens of successful calls", ("direction",)))
+document_tokens = REGISTRY.register(Histogram(
+    "document_llm_tokens", "LLM tokens (input + output) spent per document", buckets=TOKEN_BUCKETS))
+documents = REGISTRY.register(Counter(
+    "documents_total", "Finished pipeline jobs", ("status",)))
+upload_bytes = REGISTRY.register(Counter(
+    "upload_bytes_total", "Bytes of accepted uploads"))
+glossary_saved_tokens = REGISTRY.register(Counter(
+    "glossary_saved_output_tokens_total", "Estimated LLM output tokens saved by glossary anchors"))
+
+
+def register_callback(name: str, help: str, fn: Callable[[], Union[float, Dict[str, float]]],
+                      kind: str = "gauge", label: Optional[str] = None):
+    REGISTRY.register(Callback(name, help, fn, kind, label))
+
+
+class Trace:
+    """
+    timing breakdown of one document: seconds per stage, and one entry per LLM batch
+    thread-safe (batches finish on pool threads)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stages: Dict[str, float] = {}
+        self.batches: List[Dict[str, Any]] = []
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def add_batch(self, entry: Dict[str, Any]):
+        with self._lock:
+            self.batches.append(entry)
+
+    def to_dict(self, breakdown: bool = METRICS_DOC_BREAKDOWN) -> Dict[str, Any]:
+        with self._lock:
+            result: Dict[str, Any] = {"stages": {k: round(v, 4) for k, v in self.stages.items()}}
+            if breakdown:
+                result["batches"] = sorted(self.batches, key=lambda entry: entry["batch"])
+            return result
+
+
+@contextmanager
+def span(stage: str, trace: Optional[Trace] = None):
+    """time a block into the stage histogram (and the document's trace)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stage_seconds.observe(seconds, stage=stage)
+        if trace is not None:
+            trace.add(stage, seconds)
+
+
+def record_llm_batch(trace: Optional[Trace], batch: int, blocks: int, seconds: float,
+                     input_tokens: int, output_tokens: int, calls: Dict[str, int]):
+    """one finished enrichment batch; calls: its CallStats snapshot (retries, bisections, failures)"""
+    llm_batch_seconds.observe(seconds)
+    stage_seconds.observe(seconds, stage="llm_batch")
+    llm_tokens.inc(input_tokens, direction="input")
+    llm_tokens.inc(output_tokens, direction="output")
+    if trace is not None:
+        trace.add("llm_batches", seconds)
+        trace.add_batch({
+            "batch": batch, "blocks": blocks, "seconds": round(seconds, 4),
+            "input_tokens": input_tokens, "output_tokens": output_tokens,
+            "calls": calls["calls"], "retries": calls["retries"],
+            "bisections": calls["bisections"], "failed_blocks": calls["failed_blocks"],
+        })
@@ -0,0 +1,146 @@
+import json
+import os
+import re
+import shutil
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+# split PDFs with at least this many pages into ranges converted in parallel (0 = never split)
+MARKER_SPLIT_MIN_PAGES = int(os.getenv("MARKER_SPLIT_MIN_PAGES", "80"))
+MARKER_SPLIT_PAGES = int(os.getenv("MARKER_SPLIT_PAGES", "25"))
+MARKER_SPLIT_WORKERS = int(os.getenv("MARKER_SPLIT_WORKERS", "4"))
+MARKER_SPLIT_RETRIES = int(os.getenv("MARKER_SPLIT_RETRIES", "1"))
+
+_PAGE_REF = re.compile(r'^/page/(\d+)/')
+_PAGE_IMAGE = re.compile(r'_page_(\d+)_')
+# src attributes in a block's html: child block refs (<content-ref src='/page/0/Text/1'>) and images
+_SRC_ATTR = re.compile(r"""(\bsrc=)(["'])(.*?)\2""")
+
+
+def count_pages(pdf_path: Path) -> Optional[int]:
+    """page count via pypdfium2 (installed with marker-pdf); None when unavailable"""
+    try:
+        import pypdfium2
+    except ImportError:
+        return None
+    try:
+        pdf = pypdfium2.PdfDocument(str(pdf_path))
+        try:
+            return len(pdf)
+        finally:
+            pdf.close()
+    except Exception as e:
+        print(f"[Ranges] Could not count pages of {pdf_path}: {e}")
+        return None
+
+
+def plan_ranges(page_count: int, pages_per_range: int = MARKER_SPLIT_PAGES) -> List[Tuple[int, int]]:
+    """inclusive 0-based (first, last) page ranges"""
+    pages_per_range = max(1, pages_per_range)
+    return [(start, min(start + pages_per_range, page_count) - 1)
+            for start in range(0, page_count, pages_per_range)]
+
+
+def range_dir(ranges_root: Path, page_range: Tuple[int, int]) -> Path:
+    return ranges_root / f"{page_range[0]:05d}-{page_range[1]:05d}"
+
+
+def find_marker_json(output_dir: Path) -> Optional[Path]:
+    """the main Marker JSON (not _meta.json) anywhere under output_dir"""
+    if not output_dir.exists():
+        return None
+    json_files = [f for f in output_dir.rglob("*.json") if not f.name.endswith("_meta.json")]
+    return json_files[0] if json_files else None
+
+
+def _iter_nodes(data: Any):
+    """every dict in a Marker tree (iterative)"""
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            yield item
+            stack.extend(value for value in item.values() if isinstance(value, (dict, list)))
+        elif isinstance(item, list):
+            stack.extend(item)
+
+
+def _page_numbers(data: Any) -> List[int]:
+    pages = []
+    for node in _iter_nodes(data):
+        match = _PAGE_REF.match(node.get("id") or "") if isinstance(node.get("id"), str) else None
+        if match:
+            pages.append(int(match.group(1)))
+    return pages
+
+
+def _rewrite_refs(data: Any, shift: int, renames: Dict[str, str]):
+    """
+    shift page numbers of block ids and rename images, touching only the fields that hold them:
+    "id", "section_hierarchy" values, "image"/"src" values, "images" keys and src attributes in "html"
+    (so text that happens to contain "/page/3/" or "_page_3_" is left alone)
+    """
+    def ref(value: str) -> str:
+        if shift and _PAGE_REF.match(value):
+            return _PAGE_REF.sub(lambda m: f"/page/{int(m.group(1)) + shift}/", value)
+        name = value.rsplit("/", 1)[-1]
+        return value[:len(value) - len(name)] + renames[name] if name in renames else value
+
+    for node in list(_iter_nodes(data)):
+        for key, value in node.items():
+            if isinstance(value, str) and key in ("id", "image", "src"):
+                node[key] = ref(value)
+            elif isinstance(value, str) and key == "html":
+                node[key] = _SRC_ATTR.sub(lambda m: m.group(1) + m.group(2) + ref(m.group(3)) + m.group(2), value)
+            elif isinstance(value, dict) and key == "section_hierarchy":
+                node[key] = {k: ref(v) if isinstance(v, str) else v for k, v in value.items()}
+            elif isinstance(value, dict) and key == "images":
+                node[key] = {renames.get(k, k): v for k, v in value.items()}
+
+
+def merge_range_outputs(ranges: List[Tuple[int, int]], ranges_root: Path,
+                        merged_json: Path, merged_images: Path) -> Dict[str, Any]:
+    """
+    merge per-range Marker outputs into one tree at merged_json, images into merged_images
+
+    Marker may number pages of a range from 0; such ranges get their "/page/N/" ids and
+    "_page_N_" image names shifted by the range start so ids and image paths stay unique
+    (in the id and image fields only, see _rewrite_refs).
+    """
+    merged: Dict[str, Any] = {}
+    children: List[Any] = []
+    merged_images.mkdir(parents=True, exist_ok=True)
+
+    for page_range in ranges:
+        json_path = find_marker_json(range_dir(ranges_root, page_range))
+        with open(json_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+
+        pages = _page_numbers(data)
+        shift = page_range[0] if pages and min(pages) < page_range[0] else 0
+
+        # copy images, renaming page-numbered files and any remaining name collisions
+        renames: Dict[str, str] = {}
+        for image in json_path.parent.rglob("*"):
+            if not image.is_file() or image.suffix.lower() == ".json":
+                continue
+            name = image.name
+            if shift:
+                name = _PAGE_IMAGE.sub(lambda m: f"_page_{int(m.group(1)) + shift}_", name)
+            if (merged_images / name).exists():
+                name = f"r{page_range[0]}_{name}"
+            if name != image.name:
+                renames[image.name] = name
+            shutil.copy2(image, merged_images / name)
+        if shift or renames:
+            _rewrite_refs(data, shift, renames)
+
+        if not merged:
+            merged = {k: v for k, v in data.items() if k != "children"}
+        children.extend(data.get("children") or [])
+
+    merged["children"] = children
+    merged_json.parent.mkdir(parents=True, exist_ok=True)
+    with open(merged_json, "w", encoding="utf-8") as f:
+        json.dump(merged, f, ensure_ascii=False)
+    return merged
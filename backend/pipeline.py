@@ -1,24 +1,65 @@
 import json
 import subprocess
 import os
+import time
+import shutil
+import uuid
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Dict, List, Optional, Any
+from functools import partial
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from dotenv import load_dotenv
-from llm import enrich_with_llm
-# Load environment variables
+
+# Load environment variables (before the imports below read their settings)
 load_dotenv()
 
+from llm import enrich_blocks, iter_marker_blocks, normalize_blocks, extract_blocks, extract_meta
+from marker_pool import get_pool, MARKER_POOL_TIMEOUT_S
+from events import bus
+from artifacts import write_content_artifacts, write_atomic, CONTENT_FILE
+from checkpoint import Checkpoints, MARKER_STAGE, BLOCKS_STAGE
+from metrics import Trace, span, document_tokens, stage_seconds
+from doc_cache import hot_documents
+from images import build_derivatives
+from skim import skim_blocks, merge_skim
+from jobs import Job, job_stage, CONVERTING, ENRICHING
+from page_ranges import (count_pages, plan_ranges, range_dir, find_marker_json, merge_range_outputs,
+                         MARKER_SPLIT_MIN_PAGES, MARKER_SPLIT_PAGES, MARKER_SPLIT_WORKERS, MARKER_SPLIT_RETRIES)
+
+try:
+    import ijson
+    from ijson.common import ObjectBuilder
+except ImportError:
+    ijson = None
+
+# parse marker JSON incrementally when ijson is installed (0 = always json.load)
+MARKER_JSON_STREAMING = os.getenv("MARKER_JSON_STREAMING", "1") != "0"
+
+# enrichment tiers: "full" = local skim annotations published first, then upgraded by the LLM;
+# "skim" = local skim annotations only (no LLM calls); "llm" = LLM only
+ENRICHMENT_MODES = ("full", "skim", "llm")
+ENRICHMENT_MODE = os.getenv("ENRICHMENT_MODE", "full")
+if ENRICHMENT_MODE not in ENRICHMENT_MODES:
+    raise ValueError(f"ENRICHMENT_MODE must be one of {', '.join(ENRICHMENT_MODES)}, got {ENRICHMENT_MODE!r}")
+
 # Always write to repo-root data/ (not backend/data/, and not dependent on cwd)
 BASE_DIR = Path(__file__).resolve().parent.parent / "data"
 UPLOAD_DIR = BASE_DIR / "uploads"
 ARTIFACT_DIR = BASE_DIR / "artifacts"
+# Marker output of a document is written to artifacts/<doc_id>/marker/ and moved out of it
+MARKER_SCRATCH_DIR = "marker"
+
+from schemas import DocumentResponse, Block, BlockAnnotations, BilingualAnchor, DocumentMeta, BlockSource
 
-from schemas import DocumentResponse, Block, BlockAnnotations, BilingualAnchor, DocumentMeta
 
+class PipelineError(Exception):
+    """a pipeline stage failed; the message is reported by the job-status API"""
 
-def run_marker_cli(input_pdf: Path, output_folder: Path):
+
+def run_marker_cli(input_pdf: Path, output_folder: Path, page_range: Optional[Tuple[int, int]] = None):
     """
     use marker cli to convert pdf to json
+    page_range: inclusive 0-based (first, last) pages to convert
     """
     output_folder.mkdir(parents=True, exist_ok=True)
 
@@ -28,6 +69,8 @@ def run_marker_cli(input_pdf: Path, output_folder: Path):
         "--output_dir", str(output_folder.absolute()),
         "--output_format", "json",
     ]
+    if page_range is not None:
+        cmd += ["--page_range", f"{page_range[0]}-{page_range[1]}"]
 
     try:
         subprocess.run(cmd, check=True, capture_output=True, text=True)
@@ -37,39 +80,225 @@ def run_marker_cli(input_pdf: Path, output_folder: Path):
     except Exception:
         return False
 
-def fix_image_paths(data):
+def run_marker(input_pdf: Path, output_folder: Path,
+               page_range: Optional[Tuple[int, int]] = None) -> Tuple[bool, Dict[str, Any]]:
+    """
+    convert pdf with the warm worker pool when it is running, else (or on failure) with the CLI
+    returns (success, timings)
+    """
+    start = time.perf_counter()
+    pool = get_pool()
+    if pool is not None:
+        # the pool writes to a private directory that is moved into place on success: a worker that
+        # timed out may still be converting, and must not write into the CLI fallback's output
+        # (the directory is removed, so such a worker fails when it saves)
+        pool_dir = output_folder.with_name(f"{output_folder.name}.pool-{uuid.uuid4().hex[:8]}")
+        pool_dir.mkdir(parents=True)
+        try:
+            timings = pool.convert(input_pdf, pool_dir, timeout=MARKER_POOL_TIMEOUT_S, page_range=page_range)
+            output_folder.mkdir(parents=True, exist_ok=True)
+            for entry in pool_dir.iterdir():
+                destination = output_folder / entry.name
+                if destination.is_dir():
+                    shutil.rmtree(destination)
+                os.replace(entry, destination)
+            timings["wall_s"] = round(time.perf_counter() - start, 3)
+            return True, timings
+        except Exception as e:
+            print(f"[Pipeline] Marker pool failed ({e}), falling back to marker_single")
+        finally:
+            shutil.rmtree(pool_dir, ignore_errors=True)
+
+    cli_start = time.perf_counter()
+    success = run_marker_cli(input_pdf, output_folder, page_range=page_range)
+    return success, {
+        "backend": "cli",
+        "convert_s": round(time.perf_counter() - cli_start, 3),
+        "wall_s": round(time.perf_counter() - start, 3),
+    }
+
+
+def run_marker_ranges(input_pdf: Path, output_folder: Path, page_count: int, doc_id: str,
+                      job: Optional[Job] = None) -> Tuple[bool, Dict[str, Any]]:
+    """
+    convert a large pdf as page ranges in parallel and merge them into
+    output_folder/<stem>/<stem>.json (+ images/), the layout a single marker run produces
+
+    each range's output is kept under artifacts/<doc_id>/ranges/ and reused if present,
+    so a retry only converts the ranges that failed
+    with a job, ranges run on its Marker slot plus the slots that are free when it starts (at most
+    MARKER_SPLIT_WORKERS), so split pdfs stay within JOB_MARKER_CONCURRENCY conversions overall
+    """
+    start = time.perf_counter()
+    ranges = plan_ranges(page_count, MARKER_SPLIT_PAGES)
+    ranges_root = ARTIFACT_DIR / doc_id / "ranges"
+    range_timings: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+    def convert_range(page_range: Tuple[int, int]) -> bool:
+        out_dir = range_dir(ranges_root, page_range)
+        if find_marker_json(out_dir):
+            range_timings[page_range] = {"cached": True}
+            return True
+        for attempt in range(MARKER_SPLIT_RETRIES + 1):
+            success, timings = run_marker(input_pdf, out_dir, page_range=page_range)
+            range_timings[page_range] = dict(timings, attempts=attempt + 1)
+            if success and find_marker_json(out_dir):
+                return True
+            print(f"[Pipeline] Pages {page_range[0]}-{page_range[1]} failed (attempt {attempt + 1})")
+        return False
+
+    workers = max(1, min(MARKER_SPLIT_WORKERS, len(ranges)))
+    borrowed = job.borrow(CONVERTING, workers - 1) if job is not None else workers - 1
+    print(f"[Pipeline] Converting {page_count} pages as {len(ranges)} ranges, {borrowed + 1} at a time")
+    try:
+        with ThreadPoolExecutor(max_workers=borrowed + 1) as executor:
+            results = list(executor.map(convert_range, ranges))
+    finally:
+        if job is not None:
+            job.give_back(CONVERTING, borrowed)
+
+    timings = {
+        "backend": "ranges",
+        "pages": page_count,
+        "ranges": [dict(range_timings.get(r, {}), pages=f"{r[0]}-{r[1]}") for r in ranges],
+    }
+    if not all(results):
+        timings["wall_s"] = round(time.perf_counter() - start, 3)
+        return False, timings
+
+    stem = input_pdf.stem
+    merge_range_outputs(ranges, ranges_root, output_folder / stem / f"{stem}.json", output_folder / stem / "images")
+    shutil.rmtree(ranges_root, ignore_errors=True)
+    timings["wall_s"] = round(time.perf_counter() - start, 3)
+    return True, timings
+
+
+def fix_image_path(node: Dict[str, Any], derivatives: Optional[Dict[str, Dict[str, Any]]] = None):
     """
-    recursively fix image paths in json
+    fix the image path of one json node
     marker output image paths are usually "image.png"
     we need to change them to "images/image.png"
+    with derivatives (build_derivatives output), point the node at its web derivative instead,
+    keeping the original in "image_original" and the derivative's sizes in "image_info"
+    """
+    if "image" in node and isinstance(node["image"], str):
+        # if path does not contain directory prefix, manually add images/
+        if not node["image"].startswith("images/"):
+            node["image"] = f"images/{node['image']}"
+        info = derivatives.get(Path(node["image"]).name) if derivatives else None
+        if info is not None:
+            node["image_original"] = node["image"]
+            node["image"] = info["src"]
+            node["image_info"] = info
+
+
+def fix_image_paths(data, derivatives: Optional[Dict[str, Dict[str, Any]]] = None):
     """
-    if isinstance(data, dict):
-        if "image" in data and isinstance(data["image"], str):
-            # if path does not contain directory prefix, manually add images/
-            if not data["image"].startswith("images/"):
-                data["image"] = f"images/{data['image']}"
-        for k, v in data.items():
-            fix_image_paths(v)
-    elif isinstance(data, list):
-        for item in data:
-            fix_image_paths(item)
+    fix image paths everywhere in json (iterative, so deep trees cannot hit the recursion limit)
+    """
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, dict):
+            fix_image_path(item, derivatives)
+            stack.extend(item.values())
+        elif isinstance(item, list):
+            stack.extend(item)
     return data
 
 
+def _iter_prefixed(events, prefixes):
+    """
+    like ijson.items for several prefixes in one pass: yield (prefix, value) for every
+    complete value found at one of prefixes; everything else is skipped without being built
+    """
+    builder = None
+    current = None
+    for prefix, event, value in events:
+        if builder is not None:
+            builder.event(event, value)
+            if prefix == current and event in ("end_map", "end_array"):
+                yield current, builder.value
+                builder = None
+            continue
+        if prefix in prefixes:
+            if event in ("start_map", "start_array"):
+                builder = ObjectBuilder()
+                builder.event(event, value)
+                current = prefix
+            elif event not in ("map_key", "end_map", "end_array"):
+                yield prefix, value
+
 
-def process_pdf(input_pdf: Path, doc_id: str):
+def _stream_marker_blocks(json_path: Path, visit: Callable[[Dict[str, Any]], None]) -> Optional[Tuple[List[Dict[str, Any]], Optional[DocumentMeta]]]:
     """
-    process pdf and return document response
+    incremental parse of a marker tree: only one page is materialized at a time
+    returns None when the file is not a marker tree with text blocks
     """
-    import shutil
+    blocks: List[Dict[str, Any]] = []
+    meta_data: Dict[str, Any] = {}
+    block_counter = [0]
+    with open(json_path, "rb") as f:
+        events = ijson.parse(f, use_float=True)
+        for prefix, value in _iter_prefixed(events, {"children.item", "meta", "metadata"}):
+            if prefix == "children.item":
+                blocks.extend(iter_marker_blocks([value], block_counter, visit=visit))
+            else:
+                meta_data[prefix] = value
+    if not blocks:
+        return None
+    return normalize_blocks(blocks), extract_meta(meta_data)
 
-    input_path = Path(input_pdf)
-    output_root = ARTIFACT_DIR
 
-    success = run_marker_cli(input_path, output_root)
+def load_marker_blocks(json_path: Path, streaming: Optional[bool] = None,
+                       derivatives: Optional[Dict[str, Dict[str, Any]]] = None) -> Tuple[List[Dict[str, Any]], Optional[DocumentMeta]]:
+    """
+    read marker output and return (normalized blocks, meta), fixing image paths in the same pass
+    streams the file with ijson when available (default: MARKER_JSON_STREAMING), so peak memory
+    follows the extracted blocks rather than the raw tree with all its HTML and geometry
+    derivatives: image derivatives to point image blocks at (see images.build_derivatives)
+    """
+    if streaming is None:
+        streaming = MARKER_JSON_STREAMING
+    visit = partial(fix_image_path, derivatives=derivatives)
+    if streaming and ijson is not None:
+        result = _stream_marker_blocks(json_path, visit)
+        if result is not None:
+            return result
+
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+
+    blocks = []
+    if isinstance(data, dict) and isinstance(data.get("children"), list):
+        blocks = normalize_blocks(iter_marker_blocks(data["children"], visit=visit))
+    if not blocks:
+        # other output shapes (and the empty fallback) go through the generic extractor
+        blocks = extract_blocks(fix_image_paths(data, derivatives))
+    return blocks, extract_meta(data)
+
+
+def convert_pdf(input_path: Path, doc_id: str, target_dir: Path, job: Optional[Job] = None,
+                trace: Optional[Trace] = None) -> Dict[str, Any]:
+    """
+    run Marker and move its output to target_dir/<doc_id>.json (+ images/)
+    returns the Marker timings; raises PipelineError when the conversion fails
+    """
+    # Marker writes <input stem>/ below a scratch directory of this document, so inputs sharing a
+    # file name (bulk runs keep the original names) never share an output directory
+    output_root = target_dir / MARKER_SCRATCH_DIR
+    shutil.rmtree(output_root, ignore_errors=True)
+    with job_stage(job, CONVERTING), span("marker", trace):
+        # large pdfs are converted as page ranges in parallel
+        page_count = count_pages(input_path) if MARKER_SPLIT_MIN_PAGES > 0 else None
+        if page_count and page_count >= MARKER_SPLIT_MIN_PAGES:
+            success, marker_timings = run_marker_ranges(input_path, output_root, page_count, doc_id, job)
+        else:
+            success, marker_timings = run_marker(input_path, output_root)
+    print(f"[Pipeline] Marker ({marker_timings['backend']}) took {marker_timings['wall_s']}s")
 
     if not success:
-        return
+        raise PipelineError("Marker conversion failed")
 
     # Marker creates a directory with input filename (without extension)
     input_stem = input_path.stem
@@ -84,16 +313,20 @@ def process_pdf(input_pdf: Path, doc_id: str):
 
     if not json_file or not json_file.exists():
         print(f"[Pipeline] Expected JSON not found in {marker_output_dir}")
-        return
+        raise PipelineError("Marker produced no JSON output")
 
-    # Create target directory for UUID
-    target_dir = ARTIFACT_DIR / doc_id
     target_dir.mkdir(parents=True, exist_ok=True)
 
-    # Move JSON file to UUID directory and rename (skip if same path)
+    # Move (rename, no copy) the JSON and its _meta.json to the UUID directory; both live under
+    # ARTIFACT_DIR, so the rename is atomic and the raw JSON is never half-written
     raw_json_path = target_dir / f"{doc_id}.json"
     if json_file.resolve() != raw_json_path.resolve():
-        shutil.copy2(json_file, raw_json_path)
+        with open(json_file, "rb") as f:
+            os.fsync(f.fileno())
+        os.replace(json_file, raw_json_path)
+    meta_file = json_file.with_name(json_file.stem + "_meta.json")
+    if meta_file.exists() and meta_file.resolve() != (target_dir / f"{doc_id}_meta.json").resolve():
+        os.replace(meta_file, target_dir / f"{doc_id}_meta.json")
 
     # Move images directory if it exists (skip if same directory)
     images_dir = marker_output_dir / "images"
@@ -103,21 +336,158 @@ def process_pdf(input_pdf: Path, doc_id: str):
             shutil.rmtree(target_images_dir)
         shutil.move(str(images_dir), str(target_images_dir))
 
-    # read and clean data
-    with open(raw_json_path, "r", encoding="utf-8") as f:
-        raw_data = json.load(f)
+    # the scratch directory is empty now; drop what is left
+    shutil.rmtree(output_root, ignore_errors=True)
+    return marker_timings
+
+
+def build_document(doc_id: str, title: str, meta: Optional[DocumentMeta], blocks: List[Dict[str, Any]],
+                   annotations: Dict[str, BlockAnnotations]) -> DocumentResponse:
+    """document of normalized blocks with the given annotations by block id"""
+    return DocumentResponse(doc_id=doc_id, title=title, meta=meta, blocks=[
+        Block(id=block["id"], type=block["type"], content=block["content"], image=block.get("image"),
+              annotations=annotations.get(block["id"]))
+        for block in blocks
+    ])
+
+
+def build_sources(blocks: List[Dict[str, Any]]) -> List[BlockSource]:
+    """source html and offset map of every normalized block, in block order (the sources sidecar)"""
+    return [BlockSource(id=block["id"], html=block.get("html"), offset_map=block.get("offset_map"))
+            for block in blocks]
+
+
+def without_source(block: Dict[str, Any]) -> Dict[str, Any]:
+    """a normalized block as streamed to SSE clients: no html / offset_map (served by /sources)"""
+    return {key: value for key, value in block.items() if key not in ("html", "offset_map")}
+
+
+def process_pdf(input_pdf: Path, doc_id: str, job: Optional[Job] = None, mode: Optional[str] = None):
+    """
+    process pdf and return document response
+    job: scheduler job to report stage/progress on and to check for cancellation (optional)
+    mode: enrichment tier, one of ENRICHMENT_MODES (default ENRICHMENT_MODE)
+    raises PipelineError when a stage fails
+
+    every stage is checkpointed under artifacts/<id>/checkpoints/ (see checkpoint.py): a job
+    restarted after a crash skips the Marker conversion and block extraction it already did
+    and only sends the batches whose annotations were not checkpointed yet
+    """
+    input_path = Path(input_pdf)
+    pipeline_start = time.perf_counter()
+    target_dir = ARTIFACT_DIR / doc_id
+    raw_json_path = target_dir / f"{doc_id}.json"
+    checkpoints = Checkpoints(target_dir)
+    # stage seconds for the Prometheus histograms and this document's timings.json
+    trace = Trace()
+
+    marker_checkpoint = checkpoints.load_stage(MARKER_STAGE)
+    if marker_checkpoint is not None and raw_json_path.exists():
+        marker_timings = dict(marker_checkpoint["timings"], resumed=True)
+        print(f"[Pipeline] Resuming {doc_id} after the Marker conversion")
+    else:
+        marker_timings = convert_pdf(input_path, doc_id, target_dir, job, trace)
+        checkpoints.save_stage(MARKER_STAGE, {"timings": marker_timings})
+
+    blocks_checkpoint = checkpoints.load_stage(BLOCKS_STAGE)
+    if blocks_checkpoint is not None:
+        blocks = blocks_checkpoint["blocks"]
+        meta = DocumentMeta.model_validate(blocks_checkpoint["meta"]) if blocks_checkpoint.get("meta") else None
+    else:
+        # web derivatives of the figures (width-bounded WebP + placeholder), encoded in a process pool
+        with span("derivatives", trace):
+            derivatives = build_derivatives(target_dir / "images")
+
+        # read and clean data in one pass: extract blocks and fix image paths
+        # (Marker CLI automatically decompresses images to target_dir/images/ but the JSON may not have the prefix)
+        with span("parse", trace):
+            blocks, meta = load_marker_blocks(raw_json_path, derivatives=derivatives)
+        checkpoints.save_stage(BLOCKS_STAGE, {"blocks": blocks, "meta": meta.model_dump() if meta else None})
+
+    # annotations of batches finished before a restart
+    known_annotations = checkpoints.load_batches()
+    if known_annotations:
+        print(f"[Pipeline] Resuming {doc_id} with {len(known_annotations)} annotated blocks")
+
+    mode = mode or ENRICHMENT_MODE
+    # local skim tier: topic sentences (and SVO) in milliseconds, shown before any LLM batch returns
+    skim: Dict[str, BlockAnnotations] = {}
+    if mode != "llm":
+        with span("skim", trace):
+            skim = skim_blocks(blocks)
+
+    # stream progress to SSE subscribers: blocks (with skim annotations) first, then each enriched batch
+    bus.publish(doc_id, "blocks", {"doc_id": doc_id, "title": input_path.stem, "blocks": [
+        dict(without_source(block), annotations=skim[block["id"]].model_dump()) if block["id"] in skim
+        else without_source(block)
+        for block in blocks
+    ]})
+    sources = build_sources(blocks)
+    if mode == "full":
+        # the skim-tier document is readable (get_pdf, /blocks, /toc) while the LLM runs,
+        # and replaced by the enriched one when it finishes
+        with span("skim_write", trace):
+            write_content_artifacts(target_dir, build_document(doc_id, input_path.stem, meta, blocks, skim), sources)
+        hot_documents.invalidate(doc_id)
+
+    def publish_batch(blocks, completed, total):
+        if completed:
+            checkpoints.append_batch({block.id: block.annotations.model_dump()
+                                      for block in blocks if block.annotations is not None})
+        if job is not None:
+            job.set_progress(completed, total)
+        bus.publish(doc_id, "batch", {
+            "completed": completed,
+            "total": total,
+            "blocks": [block.model_dump() for block in blocks],
+        })
 
-    # fix image paths (Marker CLI automatically decompresses images to target_dir/images/ but the JSON may not have the prefix)
-    final_data = fix_image_paths(raw_data)
+    enrich_start = time.perf_counter()
+    enrich_report: Dict[str, Any] = {"mode": mode}
+    if mode == "skim":
+        ai_processed_data = build_document(doc_id, input_path.stem, meta, blocks, {})
+    else:
+        with job_stage(job, ENRICHING), span("enrich", trace):
+            ai_processed_data = enrich_blocks(blocks, doc_id, input_path.stem, meta=meta,
+                                              on_batch=publish_batch,
+                                              cancel_event=job.cancel_event if job else None,
+                                              known_annotations=known_annotations, report=enrich_report,
+                                              trace=trace)
+    # blocks the LLM did not annotate (skim mode, failed batches, open circuit) keep the skim tier,
+    # and fields the LLM left empty are filled from it
+    skim_only = skim_filled = 0
+    for block in ai_processed_data.blocks:
+        if block.id in skim:
+            was_empty = block.annotations is None
+            block.annotations, filled = merge_skim(block.annotations, skim[block.id])
+            if was_empty:
+                skim_only += 1
+            elif filled:
+                skim_filled += 1
+    enrich_report["skim_only_blocks"] = skim_only
+    enrich_report["skim_filled_blocks"] = skim_filled
+    enrich_s = time.perf_counter() - enrich_start
+    document_tokens.observe(enrich_report.get("input_tokens", 0) + enrich_report.get("output_tokens", 0))
 
-    # (optional) insert LLM Enrich logic
-    ai_processed_data = enrich_with_llm(final_data, doc_id, input_path.stem)
+    # save final data for frontend use (compact, plus precompressed get_pdf responses)
+    with span("artifact_write", trace):
+        artifact_stats = write_content_artifacts(target_dir, ai_processed_data, sources)
+    hot_documents.invalidate(doc_id)
+    print(f"[Pipeline] Pipeline finished. Ready at: {target_dir / CONTENT_FILE} "
+          + ", ".join(f"{fmt} {stat['bytes']}B" for fmt, stat in artifact_stats.items()))
 
-    # save final data for frontend use
-    final_json_path = target_dir / "content.json"
-    with open(final_json_path, "w", encoding="utf-8") as f:
-        # Convert Pydantic model to dict for JSON serialization
-        json.dump(ai_processed_data.model_dump(), f, ensure_ascii=False, indent=2)
-    print(f"[Pipeline] Pipeline finished. Ready at: {final_json_path}")
+    # per-job timings, to compare warm pool vs CLI conversions
+    timings = {
+        "marker": marker_timings,
+        "enrich_s": round(enrich_s, 3),
+        "enrich": enrich_report,
+        "artifacts": artifact_stats,
+        "total_s": round(time.perf_counter() - pipeline_start, 3),
+        **trace.to_dict(),
+    }
+    stage_seconds.observe(timings["total_s"], stage="pipeline")
+    write_atomic(target_dir / "timings.json", json.dumps(timings, indent=2).encode("utf-8"))
+    checkpoints.clear()
 
+    bus.publish(doc_id, "done", {"doc_id": doc_id})
     return
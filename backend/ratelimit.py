@@ -0,0 +1,53 @@
+import threading
+import time
+from collections import deque
+from typing import Callable
+
+
+class RateLimiter:
+    """
+    sliding one-minute window limiter for requests/minute and tokens/minute
+    a limit of 0 disables that dimension; acquire() blocks until the call fits
+    """
+
+    WINDOW_S = 60.0
+
+    def __init__(self, requests_per_minute: int = 0, tokens_per_minute: int = 0,
+                 clock: Callable[[], float] = time.monotonic,
+                 sleep: Callable[[float], None] = time.sleep):
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._window = deque()  # (timestamp, tokens)
+        self._window_tokens = 0
+
+    def _purge(self, now: float):
+        while self._window and now - self._window[0][0] >= self.WINDOW_S:
+            _, tokens = self._window.popleft()
+            self._window_tokens -= tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if self.requests_per_minute and len(self._window) >= self.requests_per_minute:
+            return False
+        # an oversized request is let through on an empty window instead of blocking forever
+        if self.tokens_per_minute and self._window and self._window_tokens + tokens > self.tokens_per_minute:
+            return False
+        return True
+
+    def acquire(self, tokens: int = 0) -> float:
+        """block until a request of `tokens` fits in the window; return seconds waited"""
+        waited = 0.0
+        while True:
+            with self._lock:
+                now = self._clock()
+                self._purge(now)
+                if self._fits(tokens):
+                    self._window.append((now, tokens))
+                    self._window_tokens += tokens
+                    return waited
+                delay = self.WINDOW_S - (now - self._window[0][0])
+            delay = max(delay, 0.01)
+            self._sleep(delay)
+            waited += delay
@@ -0,0 +1,216 @@
+import os
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# retries of transient LLM errors (timeouts, 429, 5xx) with exponential backoff and full jitter
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+LLM_RETRY_BASE_S = float(os.getenv("LLM_RETRY_BASE_S", "1.0"))
+LLM_RETRY_MAX_S = float(os.getenv("LLM_RETRY_MAX_S", "30"))
+# consecutive failed calls that open the circuit, and how long it stays open (0 failures = disabled)
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "8"))
+LLM_BREAKER_COOLDOWN_S = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "60"))
+
+TRANSIENT = "transient"  # retry the same call
+BATCH = "batch"          # the API answered, but something in this request or reply is bad: bisect
+FATAL = "fatal"          # the API cannot be used (auth, unknown model): stop calling it
+
+TRANSIENT_STATUS = {408, 429, 500, 502, 503, 504}
+FATAL_STATUS = {401, 403, 404}
+
+
+class MalformedReply(ValueError):
+    """the model answered, but not with the expected JSON; carries the call's token usage"""
+
+    def __init__(self, message: str, usage: Optional[Dict[str, Optional[int]]] = None):
+        super().__init__(message)
+        self.usage = usage or {}
+
+
+class CircuitOpenError(RuntimeError):
+    """a call refused because the circuit breaker is open"""
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    # google.api_core exceptions carry the HTTP status as .code, other clients as .status_code
+    for attr in ("code", "status_code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, MalformedReply):
+        return BATCH
+    status = _status_code(error)
+    if status in TRANSIENT_STATUS:
+        return TRANSIENT
+    if status in FATAL_STATUS:
+        return FATAL
+    if isinstance(error, (TimeoutError, ConnectionError)):
+        return TRANSIENT
+    name = type(error).__name__
+    if any(word in name for word in ("Timeout", "Connection", "Unavailable", "DeadlineExceeded")):
+        return TRANSIENT
+    if any(word in name for word in ("PermissionDenied", "Unauthenticated")):
+        return FATAL
+    return BATCH
+
+
+def backoff_delay(attempt: int, base_s: float = LLM_RETRY_BASE_S, max_s: float = LLM_RETRY_MAX_S) -> float:
+    """full jitter: uniform in [0, min(max_s, base_s * 2^attempt)], so retrying workers spread out"""
+    return random.uniform(0, min(max_s, base_s * 2 ** attempt))
+
+
+class CallStats:
+    """
+    thread-safe LLM call counters of one document; every increment is also applied to parent
+    (the process-wide totals)
+    """
+
+    FIELDS = ("calls", "retries", "bisections", "failed_blocks", "breaker_rejections",
+              "wasted_input_tokens", "wasted_output_tokens", "invalid_annotations")
+
+    def __init__(self, parent: Optional["CallStats"] = None):
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(self.FIELDS, 0)
+        self.parent = parent
+
+    def incr(self, **counts: int):
+        with self._lock:
+            for key, value in counts.items():
+                self._counts[key] += value
+        if self.parent is not None:
+            self.parent.incr(**counts)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return dict(self._counts)
+
+
+class CircuitBreaker:
+    """
+    closed -> open after `failures` consecutive failed calls (or one fatal error);
+    open refuses calls for cooldown_s, then lets a single probe through (half-open):
+    its success closes the circuit, its failure opens it again
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, failures: int = LLM_BREAKER_FAILURES, cooldown_s: float = LLM_BREAKER_COOLDOWN_S,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failures = failures
+        self.cooldown_s = cooldown_s
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._consecutive = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.times_opened = 0
+
+    def allow(self) -> bool:
+        if self.failures <= 0:
+            return True
+        with self._lock:
+            if self._state == self.OPEN and self._clock() - self._opened_at >= self.cooldown_s:
+                self._state = self.HALF_OPEN
+                self._probing = False
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._consecutive = 0
+            self._probing = False
+            if self._state != self.CLOSED:
+                print("[LLM] Circuit closed, API reachable again")
+            self._state = self.CLOSED
+
+    def record_failure(self, fatal: bool = False):
+        with self._lock:
+            self._consecutive += 1
+            self._probing = False
+            if self.failures <= 0 or self._state == self.OPEN:
+                return
+            if fatal or self._state == self.HALF_OPEN or self._consecutive >= self.failures:
+                self._state = self.OPEN
+                self._opened_at = self._clock()
+                self.times_opened += 1
+                print(f"[LLM] Circuit open after {self._consecutive} failed calls, "
+                      f"refusing calls for {self.cooldown_s:.0f}s")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"state": self._state, "consecutive_failures": self._consecutive,
+                    "times_opened": self.times_opened}
+
+
+def call_with_retries(call: Callable[[], Dict[str, Any]], input_estimate: int, breaker: CircuitBreaker,
+                      stats: CallStats, max_retries: int = LLM_MAX_RETRIES,
+                      cancel_event: Optional[threading.Event] = None,
+                      sleep: Callable[[float], None] = time.sleep) -> Dict[str, Any]:
+    """
+    call() until it succeeds, retrying transient errors with backoff
+    the last error is raised; tokens of failed attempts are counted as wasted
+    (the API's figures when the reply had them, else the local input estimate)
+    """
+    attempt = 0
+    while True:
+        if not breaker.allow():
+            stats.incr(breaker_rejections=1)
+            raise CircuitOpenError("circuit open, LLM call refused")
+        stats.incr(calls=1, retries=1 if attempt else 0)
+        try:
+            result = call()
+        except Exception as e:
+            kind = classify_error(e)
+            usage = getattr(e, "usage", None) or {}
+            stats.incr(wasted_input_tokens=usage.get("input_tokens") or input_estimate,
+                       wasted_output_tokens=usage.get("output_tokens") or 0)
+            if kind == BATCH:
+                # the API itself is fine
+                breaker.record_success()
+            else:
+                breaker.record_failure(fatal=kind == FATAL)
+            if kind != TRANSIENT or attempt >= max_retries or (cancel_event is not None and cancel_event.is_set()):
+                raise
+            delay = backoff_delay(attempt)
+            print(f"[LLM] {type(e).__name__}: {e}, retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+            sleep(delay)
+            attempt += 1
+            continue
+        breaker.record_success()
+        return result
+
+
+def call_with_salvage(items: List[Any], send: Callable[[List[Any]], Dict[str, Any]],
+                      input_estimate: Callable[[List[Any]], int], breaker: CircuitBreaker, stats: CallStats,
+                      cancel_event: Optional[threading.Event] = None) -> List[Tuple[List[Any], Dict[str, Any]]]:
+    """
+    send(items) with retries; a batch that still fails is bisected and the halves sent on their own,
+    down to single items, so only the items that really fail lose their result
+    returns [(sub_items, result)] for the parts that succeeded, in order
+    fatal errors and an open circuit stop the bisection: there is no point in more calls
+    """
+    try:
+        return [(items, call_with_retries(lambda: send(items), input_estimate(items), breaker, stats,
+                                          cancel_event=cancel_event))]
+    except Exception as e:
+        stop = isinstance(e, CircuitOpenError) or classify_error(e) == FATAL \
+            or (cancel_event is not None and cancel_event.is_set())
+        if stop or len(items) == 1:
+            stats.incr(failed_blocks=len(items))
+            print(f"[LLM] {len(items)} block(s) failed: {e}")
+            return []
+    stats.incr(bisections=1)
+    middle = len(items) // 2
+    print(f"[LLM] Batch of {len(items)} keeps failing, bisecting")
+    return (call_with_salvage(items[:middle], send, input_estimate, breaker, stats, cancel_event)
+            + call_with_salvage(items[middle:], send, input_estimate, breaker, stats, cancel_event))
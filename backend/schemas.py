@@ -33,14 +33,36 @@ class BlockAnnotations(BaseModel):
     bilingual_anchors: Optional[List[BilingualAnchor]] = Field(None, description="bilingual anchor list")
 
 
+class BlockImage(BaseModel):
+    """image of an image block - src points at the web derivative when one was generated"""
+    src: str = Field(..., description="path relative to /files/{doc_id}/")
+    width: Optional[int] = Field(None, description="width of src in pixels")
+    height: Optional[int] = Field(None, description="height of src in pixels")
+    bytes: Optional[int] = Field(None, description="file size of src")
+    placeholder: Optional[str] = Field(None, description="tiny WebP data URI to show while src loads")
+    original: Optional[str] = Field(None, description="full-resolution original, if src is a derivative")
+
+
 class Block(BaseModel):
     """document block"""
     id: str = Field(..., description="block ID")
-    type: str = Field(..., description="block type, e.g. 'paragraph', 'heading', 'table'")
+    type: str = Field(..., description="block type, e.g. 'paragraph', 'heading', 'table', 'image'")
     content: str = Field(..., description="block content")
+    image: Optional[BlockImage] = Field(None, description="image of an 'image' block")
     annotations: Optional[BlockAnnotations] = Field(None, description="block annotations")
 
 
+class BlockSource(BaseModel):
+    """source HTML of a block - kept out of the document, served on request"""
+    id: str = Field(..., description="block ID")
+    html: Optional[str] = Field(None, description="source HTML the content was extracted from")
+    offset_map: Optional[List[int]] = Field(
+        None,
+        description="flat (text_start, html_start, html_end) triples mapping content offsets to html offsets; "
+                    "a segment with equal text and html length maps 1:1, any other covers its whole html span"
+    )
+
+
 class DocumentResponse(BaseModel):
     """document response model"""
     doc_id: str = Field(..., description="document ID")
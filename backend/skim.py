@@ -0,0 +1,233 @@
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+from schemas import BlockAnnotations
+
+# local topic-sentence tier, published before the LLM pass; optional SVO tagging with spaCy
+# (SKIM_SPACY_MODEL="" = topic sentences only)
+SKIM_SPACY_MODEL = os.getenv("SKIM_SPACY_MODEL", "en_core_web_sm")
+
+try:
+    import spacy
+except ImportError:
+    spacy = None
+
+# sentence end: western punctuation followed by whitespace / end of text, or CJK punctuation
+_SENTENCE_END = re.compile(r'[.!?]["\')\]”’]*(?=\s|$)|[。！？][”’」』）]*')
+_WORD = re.compile(r"\w+")
+_NEXT_CHAR = re.compile(r"\s*(\S)")
+# a trailing "word." that does not end a sentence
+ABBREVIATIONS = {
+    "al", "approx", "cf", "ch", "co", "dr", "e.g", "eq", "eqs", "etc", "fig", "figs", "i.e", "inc", "jr",
+    "ltd", "mr", "mrs", "ms", "no", "nos", "pp", "prof", "ref", "refs", "resp", "sec", "sr", "st", "vol", "vs",
+}
+# openers of sentences that lean on the previous one (examples, contrasts, pronoun references)
+DEPENDENT_OPENERS = (
+    "also", "and", "as a result", "but", "e.g", "for example", "for instance", "furthermore", "hence",
+    "however", "i.e", "in addition", "in contrast", "it", "moreover", "on the other hand", "so", "such",
+    "that", "these", "they", "this", "those", "thus", "therefore",
+)
+_DEPENDENT_OPENER = re.compile(
+    r"[\"'(“]*(?:" + "|".join(re.escape(word) for word in DEPENDENT_OPENERS) + r")(?!\w)", re.IGNORECASE)
+STOPWORDS = {
+    "about", "above", "after", "again", "also", "among", "been", "before", "being", "between", "both",
+    "could", "does", "doing", "each", "from", "have", "having", "here", "into", "more", "most", "much",
+    "must", "only", "other", "over", "same", "should", "some", "such", "than", "that", "their", "them",
+    "then", "there", "these", "they", "this", "those", "through", "under", "until", "very", "were",
+    "what", "when", "where", "which", "while", "will", "with", "would", "your",
+}
+MIN_TOPIC_WORDS = 4
+MAX_TOPIC_WORDS = 60
+
+_nlp = None
+_nlp_lock = threading.Lock()
+_nlp_failed = False
+
+
+def sentence_spans(text: str) -> List[Tuple[int, int]]:
+    """[start, end) of each sentence, surrounding whitespace excluded"""
+    spans = []
+    start = 0
+    for match in _SENTENCE_END.finditer(text):
+        end = match.end()
+        if text[match.start()] == "." and not _ends_sentence(text, match.start(), end):
+            continue
+        spans.append((start, end))
+        start = end
+    spans.append((start, len(text)))
+    trimmed = []
+    for start, end in spans:
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            trimmed.append((start, end))
+    return trimmed
+
+
+def _ends_sentence(text: str, dot: int, end: int) -> bool:
+    word_start = dot
+    while word_start > 0 and (text[word_start - 1].isalpha() or text[word_start - 1] == "."):
+        word_start -= 1
+    word = text[word_start:dot].lower()
+    if word in ABBREVIATIONS or (len(word) == 1 and text[word_start].isupper()):
+        # "et al.", "Fig.", initials ("J. Smith")
+        return False
+    following = _NEXT_CHAR.match(text, end)
+    # the next sentence starts with something other than a lowercase letter
+    return following is None or not following.group(1).islower()
+
+
+def _content_words(text: str) -> List[str]:
+    return [word for word in _WORD.findall(text.lower()) if len(word) > 3 and word not in STOPWORDS]
+
+
+def pick_topic_sentence(content: str, spans: List[Tuple[int, int]]) -> Optional[Tuple[int, int]]:
+    """
+    heuristic topic sentence of a paragraph: position (first, then last), overlap with the
+    paragraph's recurring content words, and a penalty for very short / long sentences and for
+    sentences that depend on the one before ("However, ...", "This ...")
+    """
+    if not spans:
+        return None
+    if len(spans) == 1:
+        return spans[0]
+
+    frequency: Dict[str, int] = {}
+    sentence_words = []
+    for start, end in spans:
+        words = set(_content_words(content[start:end]))
+        sentence_words.append(words)
+        for word in words:
+            frequency[word] = frequency.get(word, 0) + 1
+    centrality = [
+        sum(frequency[word] - 1 for word in words) / math.sqrt(len(words)) if words else 0.0
+        for words in sentence_words
+    ]
+    top = max(centrality) or 1.0
+
+    best, best_score = spans[0], float("-inf")
+    for n, (start, end) in enumerate(spans):
+        sentence = content[start:end]
+        score = centrality[n] / top
+        if n == 0:
+            score += 1.0
+        elif n == 1:
+            score += 0.5
+        elif n == len(spans) - 1:
+            score += 0.3
+        word_count = len(sentence.split())
+        if word_count < MIN_TOPIC_WORDS:
+            score -= 1.0
+        elif word_count > MAX_TOPIC_WORDS:
+            score -= 0.5
+        if _DEPENDENT_OPENER.match(sentence):
+            score -= 0.6
+        if score > best_score:
+            best, best_score = (start, end), score
+    return best
+
+
+def get_nlp():
+    """spaCy pipeline for SVO tagging, None when spaCy or the model is not installed"""
+    global _nlp, _nlp_failed
+    if spacy is None or not SKIM_SPACY_MODEL:
+        return None
+    with _nlp_lock:
+        if _nlp is None and not _nlp_failed:
+            try:
+                _nlp = spacy.load(SKIM_SPACY_MODEL, exclude=["ner", "lemmatizer", "textcat"])
+            except OSError as e:
+                print(f"[Skim] SVO tagging disabled, cannot load {SKIM_SPACY_MODEL}: {e}")
+                _nlp_failed = True
+        return _nlp
+
+
+def _subtree_range(token) -> Tuple[int, int]:
+    right = token.right_edge
+    return token.left_edge.idx, right.idx + len(right.text)
+
+
+def svo_from_parse(doc) -> Optional[Dict[str, List[int]]]:
+    """subject / verb / object ranges (relative to the parsed sentence) from a dependency parse"""
+    root = next((token for token in doc if token.dep_ == "ROOT"), None)
+    if root is None or root.pos_ not in ("VERB", "AUX"):
+        return None
+    subject = next((child for child in root.children if child.dep_ in ("nsubj", "nsubjpass", "csubj")), None)
+    obj = None
+    for deps in (("dobj", "attr", "oprd", "dative"), ("acomp", "xcomp", "ccomp")):
+        obj = next((child for child in root.children if child.dep_ in deps), None)
+        if obj is not None:
+            break
+    if subject is None or obj is None:
+        return None
+    subject_range, object_range = _subtree_range(subject), _subtree_range(obj)
+    verb_tokens = [root] + [child for child in root.children
+                            if child.dep_ in ("aux", "auxpass", "neg") and child.i > subject.right_edge.i]
+    verb_range = (min(token.idx for token in verb_tokens), root.idx + len(root.text))
+    if not subject_range[1] <= verb_range[0] < verb_range[1] <= object_range[0]:
+        return None
+    return {"subject": list(subject_range), "verb": list(verb_range), "object": list(object_range)}
+
+
+def skim_blocks(blocks: List[Dict[str, Any]]) -> Dict[str, BlockAnnotations]:
+    """
+    local skim annotations (topic sentence, SVO when spaCy is available) by block id
+    headings are their own topic; image blocks get none
+    """
+    topics: Dict[str, Tuple[int, int]] = {}
+    for block in blocks:
+        content = block.get("content") or ""
+        if block.get("type") == "image" or not content.strip():
+            continue
+        spans = sentence_spans(content)
+        if block.get("type") == "heading":
+            topic = (spans[0][0], spans[-1][1]) if spans else None
+        else:
+            topic = pick_topic_sentence(content, spans)
+        if topic is not None:
+            topics[block["id"]] = topic
+
+    svo: Dict[str, Dict[str, List[int]]] = {}
+    nlp = get_nlp()
+    if nlp is not None:
+        ids, sentences = [], []
+        for block in blocks:
+            topic = topics.get(block["id"])
+            sentence = block["content"][topic[0]:topic[1]] if topic else ""
+            # the parser is English; skip headings and non-Latin text
+            if block.get("type") != "heading" and len(sentence.split()) >= MIN_TOPIC_WORDS and sentence.isascii():
+                ids.append(block["id"])
+                sentences.append(sentence)
+        for block_id, doc in zip(ids, nlp.pipe(sentences, batch_size=256)):
+            structure = svo_from_parse(doc)
+            if structure is not None:
+                svo[block_id] = structure
+
+    return {
+        block_id: BlockAnnotations(topic_sentence_range=topic, svo_structure=svo.get(block_id))
+        for block_id, topic in topics.items()
+    }
+
+
+def merge_skim(annotations: Optional[BlockAnnotations], skim: BlockAnnotations) -> Tuple[BlockAnnotations, bool]:
+    """
+    fill the fields the LLM left empty with the skim tier's; returns (annotations, whether anything was filled)
+    SVO ranges are relative to the topic sentence, so the skim SVO is only used with the skim topic sentence
+    """
+    if annotations is None:
+        return skim, True
+    update: Dict[str, Any] = {}
+    topic = annotations.topic_sentence_range
+    if topic is None and skim.topic_sentence_range is not None:
+        topic = update["topic_sentence_range"] = skim.topic_sentence_range
+    if (annotations.svo_structure is None and skim.svo_structure is not None
+            and topic is not None and tuple(topic) == tuple(skim.topic_sentence_range)):
+        update["svo_structure"] = skim.svo_structure
+    if not update:
+        return annotations, False
+    return annotations.model_copy(update=update), True
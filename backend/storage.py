@@ -0,0 +1,219 @@
+import json
+import os
+import shutil
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from artifacts import write_atomic
+from block_index import CONTENT_FILE
+from checkpoint import CHECKPOINT_DIR
+
+# byte quota for artifacts + uploads (0 = unlimited); eviction frees space down to the target fraction
+STORAGE_QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_BYTES", "0"))
+STORAGE_EVICT_TARGET = float(os.getenv("STORAGE_EVICT_TARGET", "0.9"))
+# read times are kept in memory and written at most this often
+STORAGE_ACCESS_FLUSH_S = float(os.getenv("STORAGE_ACCESS_FLUSH_S", "60"))
+# artifact dirs without content.json or checkpoints (e.g. leftovers of interrupted conversions)
+# are evicted first, once untouched for this long
+STORAGE_ORPHAN_AGE_S = float(os.getenv("STORAGE_ORPHAN_AGE_S", "3600"))
+# evicted doc ids remembered so readers get "evicted" instead of "processing"
+EVICTED_HISTORY = 10000
+
+
+def dir_bytes(path: Path) -> int:
+    """total size of the files below path (iterative, symlinks not followed)"""
+    total = 0
+    stack = [path]
+    while stack:
+        try:
+            entries = list(os.scandir(stack.pop()))
+        except FileNotFoundError:
+            continue
+        for entry in entries:
+            try:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    total += entry.stat(follow_symlinks=False).st_size
+            except FileNotFoundError:
+                pass
+    return total
+
+
+class StorageManager:
+    """
+    disk usage of processed documents (artifacts/<id>/ plus uploads/<id>.pdf) under a byte quota
+    least recently read documents are evicted first; read times are recorded by the API
+    (the filesystem's atime is unreliable with relatime/noatime mounts) and persisted as JSON
+    documents with an unfinished job or checkpoints are never evicted
+    """
+
+    def __init__(self, artifact_dir: Path, upload_dir: Path, state_path: Path,
+                 quota_bytes: int = STORAGE_QUOTA_BYTES, evict_target: float = STORAGE_EVICT_TARGET):
+        self.artifact_dir = Path(artifact_dir)
+        self.upload_dir = Path(upload_dir)
+        self.state_path = Path(state_path)
+        self.quota_bytes = quota_bytes
+        self.evict_target = evict_target
+        self._lock = threading.Lock()
+        # one eviction pass at a time; sizes are measured outside _lock
+        self._evict_lock = threading.Lock()
+        self._access: Dict[str, float] = {}
+        self._evicted: Dict[str, float] = {}
+        self._sizes: Dict[str, int] = {}
+        self._scanned = False
+        self._dirty = False
+        self._flushed_at = time.monotonic()
+        self.evictions = 0
+        self.evicted_bytes = 0
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                state = json.load(f)
+            self._access = {k: float(v) for k, v in state.get("access", {}).items()}
+            self._evicted = {k: float(v) for k, v in state.get("evicted", {}).items()}
+        except FileNotFoundError:
+            pass
+        except (ValueError, AttributeError) as e:
+            print(f"[Storage] Could not read {self.state_path}, starting without read times: {e}")
+
+    def touch(self, doc_id: str) -> bool:
+        """record a read; True when the read times are due to be written (call flush off the event loop)"""
+        with self._lock:
+            self._access[doc_id] = time.time()
+            self._dirty = True
+            return time.monotonic() - self._flushed_at >= STORAGE_ACCESS_FLUSH_S
+
+    def flush(self):
+        with self._lock:
+            if not self._dirty:
+                return
+            state = {"access": dict(self._access), "evicted": dict(self._evicted)}
+            self._dirty = False
+            self._flushed_at = time.monotonic()
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        write_atomic(self.state_path, json.dumps(state, separators=(",", ":")).encode("utf-8"))
+
+    def is_evicted(self, doc_id: str) -> bool:
+        with self._lock:
+            return doc_id in self._evicted
+
+    def _measure(self, doc_id: str) -> int:
+        size = dir_bytes(self.artifact_dir / doc_id)
+        upload = self.upload_dir / f"{doc_id}.pdf"
+        if upload.exists():
+            size += upload.stat().st_size
+        return size
+
+    def scan(self):
+        """measure every document once (at startup); later changes come through document_finished"""
+        sizes = {}
+        if self.artifact_dir.is_dir():
+            for entry in os.scandir(self.artifact_dir):
+                if entry.is_dir(follow_symlinks=False):
+                    sizes[entry.name] = self._measure(entry.name)
+        with self._lock:
+            self._sizes = sizes
+            self._scanned = True
+
+    def document_finished(self, doc_id: str):
+        """re-measure a document after its job ended; a new document counts as just read"""
+        size = self._measure(doc_id)
+        with self._lock:
+            self._sizes[doc_id] = size
+            self._evicted.pop(doc_id, None)
+            if doc_id not in self._access:
+                self._access[doc_id] = time.time()
+                self._dirty = True
+
+    def _last_access(self, doc_id: str) -> float:
+        if doc_id in self._access:
+            return self._access[doc_id]
+        # never read since read times are recorded: when it was written
+        for path in (self.artifact_dir / doc_id / CONTENT_FILE, self.artifact_dir / doc_id):
+            try:
+                return path.stat().st_mtime
+            except FileNotFoundError:
+                continue
+        return 0.0
+
+    def used_bytes(self) -> int:
+        if not self._scanned:
+            self.scan()
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def enforce(self, busy: Iterable[str] = (), on_evict: Optional[Callable[[str], None]] = None) -> int:
+        """
+        evict documents until usage is at quota * evict_target; returns the bytes freed
+        orphans go first, then finished documents in order of last read; busy doc ids are skipped
+        on_evict(doc_id) runs after each eviction (drop index / cache entries)
+        """
+        if self.quota_bytes <= 0:
+            return 0
+        with self._evict_lock:
+            used = self.used_bytes()
+            if used <= self.quota_bytes:
+                return 0
+            target = int(self.quota_bytes * self.evict_target)
+            busy = set(busy)
+            now = time.time()
+            with self._lock:
+                doc_ids = list(self._sizes)
+            candidates = []
+            for doc_id in doc_ids:
+                doc_dir = self.artifact_dir / doc_id
+                if doc_id in busy or (doc_dir / CHECKPOINT_DIR).exists():
+                    continue
+                if (doc_dir / CONTENT_FILE).exists():
+                    candidates.append((1, self._last_access(doc_id), doc_id))
+                elif now - self._last_access(doc_id) >= STORAGE_ORPHAN_AGE_S:
+                    candidates.append((0, 0.0, doc_id))
+            candidates.sort()
+
+            freed = 0
+            for _, _, doc_id in candidates:
+                if used - freed <= target:
+                    break
+                freed += self._evict(doc_id)
+                if on_evict is not None:
+                    on_evict(doc_id)
+            if used - freed > self.quota_bytes:
+                print(f"[Storage] Still over quota after eviction: {used - freed} of {self.quota_bytes} bytes "
+                      f"(the rest is in running or unfinished jobs)")
+        self.flush()
+        return freed
+
+    def _evict(self, doc_id: str) -> int:
+        with self._lock:
+            size = self._sizes.pop(doc_id, 0)
+            self._access.pop(doc_id, None)
+            self._evicted[doc_id] = time.time()
+            if len(self._evicted) > EVICTED_HISTORY:
+                for old in sorted(self._evicted, key=self._evicted.get)[:len(self._evicted) - EVICTED_HISTORY]:
+                    del self._evicted[old]
+            self._dirty = True
+            self.evictions += 1
+            self.evicted_bytes += size
+        shutil.rmtree(self.artifact_dir / doc_id, ignore_errors=True)
+        (self.upload_dir / f"{doc_id}.pdf").unlink(missing_ok=True)
+        print(f"[Storage] Evicted {doc_id} ({size} bytes)")
+        return size
+
+    def stats(self) -> Dict[str, Any]:
+        used = self.used_bytes()
+        with self._lock:
+            access = [self._access[doc_id] for doc_id in self._sizes if doc_id in self._access]
+            return {
+                "quota_bytes": self.quota_bytes,
+                "used_bytes": used,
+                "documents": len(self._sizes),
+                "largest_bytes": max(self._sizes.values(), default=0),
+                "oldest_read_at": min(access, default=None),
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+            }
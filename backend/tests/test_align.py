@@ -0,0 +1,87 @@
+from align import AhoCorasick, AlignStats, align_annotations, align_batch, _fuzzy_find, FUZZY_MIN_RATIO
+
+
+def align(content, annotations, terms=()):
+    occurrences = AhoCorasick(terms).find_all(content.lower())
+    stats = AlignStats()
+    return align_annotations(content, annotations, occurrences, stats), stats
+
+
+def test_automaton_finds_overlapping_patterns():
+    found = AhoCorasick(["he", "she", "hers"]).find_all("ushers")
+    assert found == {"she": [1], "he": [2], "hers": [2]}
+
+
+def test_correct_anchor_is_kept():
+    content = "The cat sat."
+    result, stats = align(content, {"bilingual_anchors": [{"term": "cat", "range": [4, 7]}]}, ["cat"])
+    assert result["bilingual_anchors"][0]["range"] == [4, 7]
+    assert stats == {"checked": 1, "repaired": 0, "dropped": 0}
+
+
+def test_anchor_prefers_whole_word_occurrence():
+    content = "We concatenate the cat list."
+    # the claimed range does cover "cat", but inside "concatenate"
+    result, stats = align(content, {"bilingual_anchors": [{"term": "cat", "range": [6, 9]}]}, ["cat"])
+    assert result["bilingual_anchors"][0]["range"] == [19, 22]
+    assert stats["repaired"] == 1
+
+
+def test_anchor_moves_to_nearest_exact_case_occurrence():
+    content = "Entropy here. Later, entropy again and Entropy once more."
+    result, _ = align(content, {"bilingual_anchors": [{"term": "Entropy", "range": [20, 27]}]}, ["entropy"])
+    # "entropy" at 21 is nearer but differs in case
+    assert result["bilingual_anchors"][0]["range"] == [39, 46]
+
+
+def test_missing_term_is_fuzzy_matched_or_dropped():
+    content = "A regularisation term is added."
+    result, stats = align(content, {"bilingual_anchors": [
+        {"term": "regularization", "range": [2, 16]},
+        {"term": "photosynthesis", "range": [0, 5]},
+    ]}, ["regularization", "photosynthesis"])
+    assert [anchor["range"] for anchor in result["bilingual_anchors"]] == [[2, 16]]
+    assert stats["dropped"] == 1
+
+
+def test_fuzzy_accepts_exactly_the_minimum_ratio():
+    # "abcdx" vs "abcde": 4 of 5 characters match, ratio 0.8
+    assert FUZZY_MIN_RATIO == 0.8
+    assert _fuzzy_find("zz abcdx zz", "abcde", 3) == 3
+    assert _fuzzy_find("zz abxyz zz", "abcde", 3) is None
+
+
+def test_topic_is_snapped_to_words():
+    content = "Neural networks learn features."
+    result, stats = align(content, {"topic_sentence_range": [2, 500]})
+    assert result["topic_sentence_range"] == [0, len(content)]
+    assert stats == {"checked": 1, "repaired": 1, "dropped": 0}
+
+
+def test_svo_is_snapped_within_the_topic_sentence():
+    content = "Intro here. The model learns weights."
+    result, stats = align(content, {"topic_sentence_range": [12, 37],
+                                    "svo_structure": {"subject": [0, 9], "verb": [10, 16],
+                                                      "object": [17, 23], "extra": [40, 50]}})
+    assert result["topic_sentence_range"] == [12, 37]
+    # relative to "The model learns weights.", not to the block
+    assert result["svo_structure"] == {"subject": [0, 9], "verb": [10, 16], "object": [17, 24]}
+    assert stats == {"checked": 5, "repaired": 1, "dropped": 1}
+
+
+def test_svo_is_dropped_with_its_topic_sentence():
+    result, stats = align("Some text.", {"topic_sentence_range": [40, 50],
+                                         "svo_structure": {"subject": [0, 4]}})
+    assert result["topic_sentence_range"] is None
+    assert result["svo_structure"] is None
+    assert stats == {"checked": 2, "repaired": 0, "dropped": 2}
+
+
+def test_align_batch_uses_one_automaton_for_the_batch():
+    batch = [{"content": "The cat sat."}, {"content": "A dog barked at the cat."}]
+    matched = {0: {"bilingual_anchors": [{"term": "cat", "range": [0, 3]}]},
+               1: {"bilingual_anchors": [{"term": "dog", "range": [10, 13]}]}}
+    stats = align_batch(batch, matched)
+    assert matched[0]["bilingual_anchors"][0]["range"] == [4, 7]
+    assert matched[1]["bilingual_anchors"][0]["range"] == [2, 5]
+    assert stats["repaired"] == 2
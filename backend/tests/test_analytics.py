@@ -0,0 +1,74 @@
+import pytest
+
+from analytics import GazeStore, BeaconError, parse_beacon, COLUMNS, BLOCKS_FILE
+
+
+def ingest(store, body, **query):
+    store.submit(parse_beacon(body, **query))
+    store.flush()
+
+
+def test_beacon_shapes_and_ids():
+    beacons = parse_beacon(b'[{"doc_id": "d1", "session_id": "s1", "dwell": {"b1": 120, "b2": -5, "b3": "x"}}]')
+    assert beacons[0].dwell == [("b1", 120)]
+    assert parse_beacon(b'{"b1": 50}', doc_id="d1")[0].doc_id == "d1"
+
+    for doc_id in ("..", ".", "a/b", ""):
+        with pytest.raises(BeaconError):
+            parse_beacon(b'{"b1": 50}', doc_id=doc_id)
+    with pytest.raises(BeaconError):
+        parse_beacon(b"not json", doc_id="d1")
+
+
+def test_percentiles_over_sessions(tmp_path):
+    store = GazeStore(root=tmp_path)
+    for n, ms in enumerate([100, 200, 300, 400]):
+        ingest(store, f'{{"doc_id": "d1", "session_id": "s{n}", "dwell": {{"b1": {ms}}}}}'.encode())
+    ingest(store, b'{"doc_id": "d1", "session_id": "s0", "dwell": {"b1": 50}}')
+
+    result = store.dwell_percentiles("d1", [50, 100])
+    assert result["events"] == 5 and result["sessions"] == 4
+    # per-session totals: 150, 200, 300, 400
+    assert result["blocks"]["b1"]["p100"] == 400
+    assert result["blocks"]["b1"]["total_ms"] == 1050
+    assert store.dwell_percentiles("unknown", [50]) is None
+
+
+def test_store_recovers_from_a_crash_mid_append(tmp_path):
+    store = GazeStore(root=tmp_path)
+    ingest(store, b'{"doc_id": "d1", "session_id": "s1", "dwell": {"b1": 100}}')
+    doc_dir = tmp_path / "d1"
+
+    # crash: the dictionary line and some columns of the next append were cut off midway
+    with open(doc_dir / BLOCKS_FILE, "a", encoding="utf-8") as f:
+        f.write("b2-partial")
+    for name in COLUMNS[:2]:
+        with open(doc_dir / f"{name}.u32", "ab") as f:
+            f.write(b"\x01\x00\x00\x00\x07")
+
+    restarted = GazeStore(root=tmp_path)
+    ingest(restarted, b'{"doc_id": "d1", "session_id": "s1", "dwell": {"b2": 300}}')
+    result = restarted.dwell_percentiles("d1", [50])
+    assert result["events"] == 2
+    assert {block: summary["total_ms"] for block, summary in result["blocks"].items()} == {"b1": 100, "b2": 300}
+    sizes = {(doc_dir / f"{name}.u32").stat().st_size for name in COLUMNS}
+    assert sizes == {8}
+
+    # and a third process reads the same thing back
+    assert GazeStore(root=tmp_path).dwell_percentiles("d1", [50])["blocks"] == result["blocks"]
+
+
+def test_ids_with_line_separators_do_not_shift_codes_after_a_restart(tmp_path):
+    body = '{"doc_id": "d1", "session_id": "s1", "dwell": {"a\\rb": 100, "c\\u2028d": 100, "e\\u0085": 100, "b1": 300}}'
+    assert [block for block, _ in parse_beacon(body.encode())[0].dwell] == ["b1"]
+
+    # a dictionary line holding a separator other than \n (written before ids were checked for them)
+    doc_dir = tmp_path / "d1"
+    doc_dir.mkdir()
+    (doc_dir / BLOCKS_FILE).write_bytes("x\ry\n".encode())
+    ingest(GazeStore(root=tmp_path), body.encode())
+
+    restarted = GazeStore(root=tmp_path)
+    ingest(restarted, b'{"doc_id": "d1", "session_id": "s2", "dwell": {"b1": 100}}')
+    blocks = restarted.dwell_percentiles("d1", [50])["blocks"]
+    assert {block: summary["total_ms"] for block, summary in blocks.items()} == {"b1": 400}
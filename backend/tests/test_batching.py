@@ -0,0 +1,69 @@
+from batching import (split_oversized_block, pack_batches, merge_part_annotations, estimate_tokens,
+                      estimate_block_input_tokens, PART_SEPARATOR)
+
+
+def test_block_that_fits_is_not_split():
+    block = {"id": "b1", "type": "paragraph", "content": "One short sentence."}
+    assert split_oversized_block(block, max_tokens=100) == [(0, block)]
+
+
+def test_split_parts_cover_the_content_at_sentence_ends():
+    content = " ".join(f"Sentence number {n} has a few words in it." for n in range(40))
+    block = {"id": "b1", "type": "paragraph", "content": content}
+    parts = split_oversized_block(block, max_tokens=50)
+
+    assert len(parts) > 1
+    assert "".join(part["content"] for _, part in parts) == content
+    for n, (offset, part) in enumerate(parts):
+        assert part["id"] == f"b1{PART_SEPARATOR}{n}"
+        assert content[offset:offset + len(part["content"])] == part["content"]
+        assert estimate_tokens(part["content"]) <= 50
+    # every cut but the hard ones falls after a sentence end
+    assert all(part["content"].rstrip().endswith(".") for _, part in parts[:-1])
+
+
+def test_sentence_longer_than_the_budget_is_hard_cut():
+    content = "x" * 2000
+    parts = split_oversized_block({"id": "b1", "content": content}, max_tokens=50)
+    assert "".join(part["content"] for _, part in parts) == content
+    assert all(estimate_tokens(part["content"]) <= 50 for _, part in parts)
+
+
+def test_pack_batches_keeps_order_and_budgets():
+    blocks = [{"id": f"b{n}", "type": "paragraph", "content": "word " * (20 + n)} for n in range(30)]
+    budget = 300
+    batches = pack_batches(blocks, input_budget=budget, output_budget=10 ** 6, max_blocks=25)
+
+    assert [block for batch in batches for block in batch] == blocks
+    for batch in batches:
+        assert len(batch) == 1 or sum(estimate_block_input_tokens(block) for block in batch) <= budget
+
+
+def test_pack_batches_max_blocks_and_oversized_item():
+    blocks = [{"id": f"b{n}", "type": "heading", "content": "Title"} for n in range(7)]
+    assert [len(batch) for batch in pack_batches(blocks, max_blocks=3)] == [3, 3, 1]
+
+    huge = {"id": "huge", "type": "paragraph", "content": "word " * 5000}
+    batches = pack_batches([blocks[0], huge, blocks[1]], input_budget=100)
+    assert batches == [[blocks[0]], [huge], [blocks[1]]]
+
+
+def test_merge_part_annotations_shifts_ranges():
+    parts = [
+        (0, {"topic_sentence_range": [0, 10], "svo_structure": {"subject": [0, 3]},
+             "bilingual_anchors": [{"term": "alpha", "range": [2, 7], "translation": "a"}]}),
+        (100, {"topic_sentence_range": [5, 20],
+               "bilingual_anchors": [{"term": "beta", "range": [1, 5], "translation": "b"}]}),
+    ]
+    merged = merge_part_annotations(parts)
+
+    assert merged["topic_sentence_range"] == [0, 10]
+    # SVO is relative to the topic sentence: unshifted
+    assert merged["svo_structure"] == {"subject": [0, 3]}
+    assert [anchor["range"] for anchor in merged["bilingual_anchors"]] == [[2, 7], [101, 105]]
+
+
+def test_merge_part_annotations_topic_from_first_part_that_has_one():
+    merged = merge_part_annotations([(0, None), (50, {"topic_sentence_range": [3, 9]})])
+    assert merged == {"topic_sentence_range": [53, 59]}
+    assert merge_part_annotations([(0, None), (50, {})]) is None
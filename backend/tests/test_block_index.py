@@ -0,0 +1,89 @@
+import json
+from array import array
+
+from artifacts import ensure_block_index, write_content_artifacts
+from bench.synthetic import make_marker_tree
+from block_index import (CONTENT_FILE, OFFSETS_FILE, BLOCKS_META_FILE, index_files, serialize_indexed,
+                         read_blocks, read_block, read_sources, read_source)
+from htmltext import ExtractedText, html_range
+from llm import iter_marker_blocks
+from pipeline import build_document, build_sources
+from schemas import Block, DocumentResponse
+from skim import skim_blocks
+
+
+def make_document(blocks, prefix="text"):
+    return DocumentResponse(doc_id="doc", title="Title", blocks=[
+        Block(id=f"/page/0/Text/{i}", type="text", content=f"{prefix} {i} é") for i in range(blocks)])
+
+
+def test_offsets_of_another_version_fall_back_to_parsing(tmp_path):
+    write_content_artifacts(tmp_path, make_document(4, "skim"))
+    # the rewrite has replaced the sidecars but not content.json yet
+    newer = make_document(6, "llm")
+    content, spans = serialize_indexed(newer)
+    for filename, data in index_files(newer, content, spans).items():
+        (tmp_path / filename).write_bytes(data)
+
+    old_blocks = json.loads((tmp_path / CONTENT_FILE).read_bytes())["blocks"]
+    total, data = read_blocks(tmp_path, 1, 2)
+    assert (total, json.loads(data)) == (4, old_blocks[1:3])
+    assert json.loads(read_block(tmp_path, "/page/0/Text/3")) == old_blocks[3]
+    assert read_block(tmp_path, "/page/0/Text/5") is None
+
+    (tmp_path / CONTENT_FILE).write_bytes(content)
+    total, data = read_blocks(tmp_path, 4, 10)
+    assert (total, [block["content"] for block in json.loads(data)]) == (6, ["llm 4 é", "llm 5 é"])
+
+
+def test_block_is_found_when_blocks_json_is_stale(tmp_path):
+    write_content_artifacts(tmp_path, make_document(3))
+    meta = json.loads((tmp_path / BLOCKS_META_FILE).read_bytes())
+    meta["ids"].reverse()
+    (tmp_path / BLOCKS_META_FILE).write_text(json.dumps(meta))
+    assert json.loads(read_block(tmp_path, "/page/0/Text/0"))["content"] == "text 0 é"
+    assert (tmp_path / OFFSETS_FILE).read_bytes()[:4] == b"BIDX"
+
+
+def test_block_sources_are_kept_out_of_the_document(tmp_path):
+    blocks = list(iter_marker_blocks(make_marker_tree(30, figure_every=0, seed=4)["children"]))
+    document = build_document("doc", "Title", None, blocks, {})
+    write_content_artifacts(tmp_path, document, build_sources(blocks))
+
+    content = (tmp_path / CONTENT_FILE).read_text(encoding="utf-8")
+    assert "offset_map" not in content and "<p>" not in content
+    total, data = read_sources(tmp_path, 0, 1000)
+    sources = json.loads(data)
+    assert total == len(blocks) and [source["id"] for source in sources] == [block["id"] for block in blocks]
+
+    block = blocks[-1]
+    source = json.loads(read_source(tmp_path, block["id"]))
+    extracted = ExtractedText(block["content"], array("i", source["offset_map"]))
+    word = block["content"].split()[-1]
+    start = block["content"].rindex(word)
+    html_start, html_end = html_range(extracted, start, start + len(word))
+    assert source["html"][html_start:html_end] == word
+
+
+def test_reads_match_slices_of_the_parsed_document(tmp_path):
+    blocks = list(iter_marker_blocks(make_marker_tree(40, seed=7)["children"]))
+    write_content_artifacts(tmp_path, build_document("doc", "Tïtle \"quoted\"", None, blocks, skim_blocks(blocks)))
+    parsed = json.loads((tmp_path / CONTENT_FILE).read_bytes())["blocks"]
+    assert len(parsed) == len(blocks)
+
+    for offset, limit in [(0, 1), (0, 50), (3, 7), (len(parsed) - 1, 5), (len(parsed), 5), (1000, 1)]:
+        total, data = read_blocks(tmp_path, offset, limit)
+        assert total == len(parsed)
+        assert json.loads(data) == parsed[offset:offset + limit]
+    for block in parsed:
+        assert json.loads(read_block(tmp_path, block["id"])) == block
+    assert read_block(tmp_path, "/page/99/Text/99") is None
+
+
+def test_legacy_document_gets_an_index_that_reads_back_the_same(tmp_path):
+    document = make_document(5)
+    (tmp_path / CONTENT_FILE).write_text(document.model_dump_json(indent=2), encoding="utf-8")
+    assert ensure_block_index(tmp_path)
+    assert not ensure_block_index(tmp_path)
+    total, data = read_blocks(tmp_path, 0, 10)
+    assert (total, json.loads(data)) == (5, json.loads(document.model_dump_json())["blocks"])
@@ -0,0 +1,104 @@
+import json
+from pathlib import Path
+
+import pytest
+
+import llm
+import pipeline
+from bench.fake_llm import FakeGeminiClient
+from bench.synthetic import make_marker_tree
+from checkpoint import Checkpoints, CHECKPOINT_DIR, find_unfinished
+from jobs import Job, JobCancelled
+
+
+class RecordingClient(FakeGeminiClient):
+    """fake Gemini that records the block ids it was asked about and can cancel a job after some calls"""
+
+    def __init__(self, cancel_job=None, cancel_after=0):
+        super().__init__(latency_s=0)
+        self.block_ids = []
+        self.cancel_job = cancel_job
+        self.cancel_after = cancel_after
+
+    def _generate(self, prompt):
+        payload = prompt.split("Input blocks:\n", 1)[1].split("\n\nReturn the enriched", 1)[0]
+        self.block_ids.extend(block["id"] for block in json.loads(payload))
+        reply = super()._generate(prompt)
+        if self.cancel_job is not None and self.calls >= self.cancel_after:
+            self.cancel_job.cancel_event.set()
+        return reply
+
+
+@pytest.fixture
+def fake_pipeline(tmp_path, monkeypatch):
+    """pipeline writing under tmp_path, with a synthetic Marker and no cache or glossary"""
+    marker_runs = []
+
+    def fake_marker(input_pdf, output_folder, page_range=None):
+        marker_runs.append(input_pdf)
+        out = Path(output_folder) / input_pdf.stem
+        out.mkdir(parents=True, exist_ok=True)
+        (out / f"{input_pdf.stem}.json").write_text(json.dumps(make_marker_tree(80, figure_every=0, seed=1)))
+        return True, {"backend": "fake", "wall_s": 0.0}
+
+    monkeypatch.setattr(pipeline, "ARTIFACT_DIR", tmp_path)
+    monkeypatch.setattr(pipeline, "run_marker", fake_marker)
+    monkeypatch.setattr(pipeline, "MARKER_SPLIT_MIN_PAGES", 0)
+    monkeypatch.setattr(llm, "get_enrichment_cache", lambda: None)
+    monkeypatch.setattr(llm, "get_glossary", lambda: None)
+    monkeypatch.setattr(llm, "LLM_MAX_IN_FLIGHT", 1)
+    return marker_runs
+
+
+def use_client(monkeypatch, client):
+    monkeypatch.setattr(llm, "get_llm_client", lambda: (client, "gemini"))
+
+
+def test_cancelled_job_resumes_from_its_checkpoints(tmp_path, monkeypatch, fake_pipeline):
+    pdf = tmp_path / "paper.pdf"
+    Checkpoints(tmp_path / "doc1").save_job(pdf, "digest", 0, "llm")
+    job = Job("doc1", pdf, 0, None, {}, {"mode": "llm"})
+    first = RecordingClient(cancel_job=job, cancel_after=2)
+    use_client(monkeypatch, first)
+    with pytest.raises(JobCancelled):
+        pipeline.process_pdf(pdf, "doc1", job=job, mode="llm")
+
+    checkpointed = Checkpoints(tmp_path / "doc1").load_batches()
+    assert checkpointed and not (tmp_path / "doc1" / "content.json").exists()
+    assert [entry["doc_id"] for entry in find_unfinished(tmp_path)] == ["doc1"]
+
+    second = RecordingClient()
+    use_client(monkeypatch, second)
+    pipeline.process_pdf(pdf, "doc1", mode="llm")
+
+    # Marker ran once; the second run only sent the blocks the first one had not finished
+    assert len(fake_pipeline) == 1
+    assert second.block_ids and not set(second.block_ids) & set(checkpointed)
+    document = json.loads((tmp_path / "doc1" / "content.json").read_text())
+    text_blocks = [block for block in document["blocks"] if block["type"] != "image"]
+    assert all(block["annotations"] for block in text_blocks)
+    assert {block["id"] for block in text_blocks} == set(checkpointed) | set(second.block_ids)
+    assert not (tmp_path / "doc1" / CHECKPOINT_DIR).exists()
+    assert find_unfinished(tmp_path) == []
+
+
+def test_find_unfinished_cleans_up(tmp_path):
+    # temp files of interrupted writes go; a job whose pdf is gone and never got past Marker is dropped
+    Checkpoints(tmp_path / "gone").save_job(tmp_path / "missing.pdf", None, 0)
+    (tmp_path / "kept").mkdir()
+    pdf = tmp_path / "kept.pdf"
+    pdf.write_bytes(b"%PDF-")
+    Checkpoints(tmp_path / "kept").save_job(pdf, None, 0)
+    (tmp_path / "kept" / "content.json.abc123.tmp").write_text("partial")
+
+    assert [entry["doc_id"] for entry in find_unfinished(tmp_path)] == ["kept"]
+    assert not (tmp_path / "gone" / CHECKPOINT_DIR).exists()
+    assert not list((tmp_path / "kept").glob("*.tmp"))
+
+
+def test_torn_batch_line_is_ignored(tmp_path):
+    checkpoints = Checkpoints(tmp_path / "doc1")
+    checkpoints.append_batch({"b1": {"topic_sentence_range": [0, 5]}})
+    with open(checkpoints.dir / "batches.jsonl", "a", encoding="utf-8") as f:
+        f.write('{"b2": {"topic_sen')
+    assert checkpoints.load_batches() == {"b1": {"topic_sentence_range": [0, 5]}}
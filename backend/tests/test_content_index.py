@@ -0,0 +1,48 @@
+from content_index import ContentIndex, index_key
+
+
+def make_ready(artifact_dir, doc_id):
+    (artifact_dir / doc_id).mkdir(parents=True)
+    (artifact_dir / doc_id / "content.json").write_text("{}")
+
+
+def test_same_bytes_are_processed_once(tmp_path):
+    index = ContentIndex(tmp_path / "content_index.json", tmp_path)
+    assert index.lookup_or_reserve("abc", "doc1") == ("doc1", False)
+    # still in flight: the second upload attaches to the running job
+    assert index.lookup_or_reserve("abc", "doc2") == ("doc1", True)
+
+    make_ready(tmp_path, "doc1")
+    index.complete("abc", "doc1")
+    assert index.lookup_or_reserve("abc", "doc3") == ("doc1", True)
+    assert index.stats() == {"hits": 2, "misses": 1, "entries": 1, "in_flight": 0}
+
+
+def test_failed_job_does_not_keep_its_entry(tmp_path):
+    index = ContentIndex(tmp_path / "content_index.json", tmp_path)
+    index.lookup_or_reserve("abc", "doc1")
+    index.complete("abc", "doc1")  # no content.json
+    assert index.lookup_or_reserve("abc", "doc2") == ("doc2", False)
+
+
+def test_entries_survive_a_restart(tmp_path):
+    path = tmp_path / "content_index.json"
+    index = ContentIndex(path, tmp_path)
+    index.lookup_or_reserve("abc", "doc1")
+    make_ready(tmp_path, "doc1")
+    index.complete("abc", "doc1")
+
+    reopened = ContentIndex(path, tmp_path)
+    assert reopened.lookup_or_reserve("abc", "doc2") == ("doc1", True)
+    assert not list(tmp_path.glob("*.tmp"))
+
+
+def test_forget_and_mode_keys(tmp_path):
+    index = ContentIndex(tmp_path / "content_index.json", tmp_path)
+    make_ready(tmp_path, "doc1")
+    index.lookup_or_reserve(index_key("abc", "full"), "doc1")
+    # a skim-only document does not satisfy a full upload of the same bytes, and the reverse
+    assert index.lookup_or_reserve(index_key("abc", "skim"), "doc2") == ("doc2", False)
+
+    index.forget("doc1")
+    assert index.lookup_or_reserve(index_key("abc", "full"), "doc3") == ("doc3", False)
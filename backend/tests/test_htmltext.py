@@ -0,0 +1,53 @@
+import html
+import re
+
+import pytest
+
+from htmltext import html_to_text, html_range
+
+SOURCES = [
+    "<p>Plain text only.</p>",
+    "<p><b>Bold <i>nested <a href=\"#r1\">link text</a></i></b> after.</p>",
+    "<p>x &lt; 0.05 &amp; y&nbsp;z &#955;&#x3bb; caf&eacute;</p>",
+    "<div><p>First</p><p>second</p></div>  trailing   spaces <br/>next",
+    "<p>a <!-- comment <p> --> b <math>x^2</math> c&unknown; d & e < f</p>",
+]
+
+
+def rendered(fragment):
+    """what a browser shows for a piece of html: no tags or comments, entities decoded"""
+    return html.unescape(re.sub(r"<!--.*?-->|<[!?/A-Za-z][^>]*>", "", fragment, flags=re.DOTALL))
+
+
+@pytest.mark.parametrize("source", SOURCES)
+def test_every_character_maps_back_to_the_html_it_came_from(source):
+    extracted = html_to_text(source)
+    for pos, char in enumerate(extracted.text):
+        start, end = html_range(extracted, pos, pos + 1)
+        shown = rendered(source[start:end])
+        if char == " ":
+            assert shown.isspace() or source[start:end].startswith("<"), (pos, source[start:end])
+        else:
+            assert shown == char, (pos, source[start:end])
+
+
+def test_entities_and_nested_markup():
+    extracted = html_to_text(SOURCES[2])
+    assert extracted.text == "x < 0.05 & y z λλ café"
+    start, end = html_range(extracted, 0, len(extracted.text))
+    assert SOURCES[2][start:end] == "x &lt; 0.05 &amp; y&nbsp;z &#955;&#x3bb; caf&eacute;"
+
+    extracted = html_to_text(SOURCES[1])
+    assert extracted.text == "Bold nested link text after."
+    word = extracted.text.index("link text")
+    start, end = html_range(extracted, word, word + len("link text"))
+    assert SOURCES[1][start:end] == "link text"
+    # a range across closing tags covers them
+    start, end = html_range(extracted, word, len(extracted.text))
+    assert SOURCES[1][start:end] == "link text</a></i></b> after."
+
+
+def test_block_tags_separate_words_and_ends_are_stripped():
+    assert html_to_text(SOURCES[3]).text == "First second trailing spaces next"
+    assert html_to_text("").text == ""
+    assert list(html_to_text("  <p> </p> ").offsets) == []
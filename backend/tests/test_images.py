@@ -0,0 +1,18 @@
+import pytest
+
+import images
+
+Image = pytest.importorskip("PIL.Image")
+
+
+def test_images_sharing_a_stem_get_their_own_derivative(tmp_path, monkeypatch):
+    monkeypatch.setattr(images, "IMAGE_WORKERS", 0)
+    Image.new("RGB", (40, 20), "red").save(tmp_path / "fig1.png")
+    Image.new("RGB", (30, 60), "blue").save(tmp_path / "fig1.jpg")
+
+    derivatives = images.build_derivatives(tmp_path)
+    assert derivatives["fig1.png"]["src"] == "images/derived/fig1.png.webp"
+    assert derivatives["fig1.jpg"]["src"] == "images/derived/fig1.jpg.webp"
+    for name, (width, height) in {"fig1.png": (40, 20), "fig1.jpg": (30, 60)}.items():
+        with Image.open(tmp_path / "derived" / f"{name}.webp") as derived:
+            assert derived.size == (width, height) == (derivatives[name]["width"], derivatives[name]["height"])
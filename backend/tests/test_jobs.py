@@ -0,0 +1,68 @@
+import threading
+import time
+
+from jobs import JobScheduler, CONVERTING, ENRICHING, DONE, CANCELLED, job_stage
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+def test_high_priority_job_passes_queued_ones_and_slots_are_returned():
+    order = []
+    release = threading.Event()
+
+    def run(job):
+        with job_stage(job, CONVERTING):
+            order.append(job.doc_id)
+            if job.doc_id == "first":
+                release.wait(5)
+        with job_stage(job, ENRICHING):
+            pass
+
+    scheduler = JobScheduler(run, marker_concurrency=1, llm_concurrency=1)
+    try:
+        scheduler.submit("first", "a.pdf")
+        wait_until(lambda: order == ["first"])
+        # the only Marker slot is busy: these wait in the queue, where priority decides
+        scheduler.submit("low", "b.pdf", priority=5)
+        scheduler.submit("high", "c.pdf", priority=0)
+        release.set()
+        wait_until(lambda: all(scheduler.get(doc_id).finished for doc_id in ("first", "low", "high")))
+
+        assert order == ["first", "high", "low"]
+        assert all(scheduler.get(doc_id).stage == DONE for doc_id in order)
+        assert [limit.free for limit in scheduler._limits.values()] == [1, 1]
+    finally:
+        release.set()
+        scheduler.shutdown()
+
+
+def test_queued_job_is_cancelled_without_running():
+    ran = []
+    finished = []
+    release = threading.Event()
+
+    def run(job):
+        ran.append(job.doc_id)
+        with job_stage(job, CONVERTING):
+            release.wait(5)
+
+    scheduler = JobScheduler(run, marker_concurrency=1, llm_concurrency=1)
+    try:
+        scheduler.submit("busy", "a.pdf")
+        wait_until(lambda: ran == ["busy"])
+        scheduler.submit("queued", "b.pdf", on_finish=finished.append)
+        assert scheduler.cancel("queued")
+        release.set()
+        wait_until(lambda: finished)
+
+        assert finished[0].stage == CANCELLED
+        assert ran == ["busy"]
+        assert not scheduler.cancel("queued")
+    finally:
+        release.set()
+        scheduler.shutdown()
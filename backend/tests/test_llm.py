@@ -0,0 +1,141 @@
+import json
+import threading
+import time
+
+import llm
+from bench.fake_llm import FakeGeminiClient
+from ratelimit import RateLimiter
+from resilience import MalformedReply
+
+
+def payload_ids(prompt):
+    payload = prompt.split("Input blocks:\n", 1)[1].split("\n\nReturn the enriched", 1)[0]
+    return [block["id"] for block in json.loads(payload)]
+
+
+class LatencyClient(FakeGeminiClient):
+    """fake Gemini with a latency per batch (by its first block id), counting calls in flight"""
+
+    def __init__(self, latency_by_id):
+        super().__init__(latency_s=0)
+        self.latency_by_id = latency_by_id
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.call_times = []
+        self._flight_lock = threading.Lock()
+
+    def _generate(self, prompt):
+        with self._flight_lock:
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            self.call_times.append(time.monotonic())
+        try:
+            time.sleep(self.latency_by_id.get(payload_ids(prompt)[0], 0.0))
+            return super()._generate(prompt)
+        finally:
+            with self._flight_lock:
+                self.in_flight -= 1
+
+
+def make_batches(count, size=3):
+    return [[{"id": f"b{n}_{k}", "type": "paragraph", "content": f"Batch {n} block {k} about regularization."}
+             for k in range(size)] for n in range(count)]
+
+
+class ShortWindow(RateLimiter):
+    WINDOW_S = 0.3
+
+
+def test_batches_run_concurrently_and_results_keep_batch_order():
+    batches = make_batches(6)
+    # earlier batches are slower, so they finish last
+    client = LatencyClient({batch[0]["id"]: 0.05 * (len(batches) - n) for n, batch in enumerate(batches)})
+    completed = []
+
+    start = time.monotonic()
+    results = llm.run_enrichment_batches(batches, client, "gemini", max_in_flight=3, limiter=RateLimiter(),
+                                         on_result=lambda index, result: completed.append(index))
+    elapsed = time.monotonic() - start
+
+    assert [[block["id"] for block in result["blocks"]] for result in results] == \
+           [[block["id"] for block in batch] for batch in batches]
+    assert sorted(completed) == list(range(6)) and completed != sorted(completed)
+    assert client.peak_in_flight == 3
+    # 1.05s of latency in total, overlapped three at a time
+    assert elapsed < 0.8
+
+
+def test_rate_limiter_blocks_until_the_window_has_room():
+    now = [0.0]
+    sleeps = []
+
+    def sleep(seconds):
+        sleeps.append(seconds)
+        now[0] += seconds
+
+    limiter = RateLimiter(requests_per_minute=2, tokens_per_minute=1000, clock=lambda: now[0], sleep=sleep)
+    assert limiter.acquire(100) == 0
+    now[0] = 10
+    assert limiter.acquire(100) == 0
+    # third request: waits for the first to leave the window
+    assert limiter.acquire(100) == 50
+    # tokens: 200 in the window, 900 more does not fit until both older requests expire
+    assert limiter.acquire(900) == 10
+    assert now[0] == 70
+    # a request over the whole budget still goes through on an empty window
+    now[0] = 200
+    assert limiter.acquire(5000) == 0
+
+
+def test_concurrent_batches_respect_the_rate_limit():
+    batches = make_batches(6, size=1)
+    client = LatencyClient({})
+    limiter = ShortWindow(requests_per_minute=2)
+
+    results = llm.run_enrichment_batches(batches, client, "gemini", max_in_flight=4, limiter=limiter)
+
+    assert all(result is not None for result in results)
+    times = sorted(client.call_times)
+    assert len(times) == 6
+    # never more than 2 calls in any window (small slack for the time between grant and call)
+    assert all(times[i + 2] - times[i] >= ShortWindow.WINDOW_S - 0.02 for i in range(len(times) - 2))
+
+
+class PoisonClient(FakeGeminiClient):
+    """fake Gemini whose reply for any batch containing `poison` cannot be parsed"""
+
+    def __init__(self, poison):
+        super().__init__(latency_s=0)
+        self.poison = poison
+
+    def _generate(self, prompt):
+        if self.poison in prompt:
+            raise MalformedReply("unparseable reply")
+        return super()._generate(prompt)
+
+
+def test_split_block_with_a_failed_part_stays_unannotated(monkeypatch):
+    monkeypatch.setattr(llm, "get_glossary", lambda: None)
+    sentences = [f"Sentence {n} talks about regularization and generalization in models." for n in range(400)]
+    sentences[300] = "The POISONED sentence breaks the reply."
+    blocks = [
+        {"id": "long", "type": "paragraph", "content": " ".join(sentences)},
+        {"id": "short", "type": "paragraph", "content": "A short paragraph about optimization."},
+    ]
+    report = {}
+    document = llm.enrich_blocks(blocks, "doc1", "Title", client=PoisonClient("POISONED"), client_type="gemini",
+                                 use_cache=False, report=report)
+
+    by_id = {block.id: block for block in document.blocks}
+    # the other parts of "long" were answered, but half a block is not kept
+    assert by_id["long"].annotations is None
+    assert by_id["short"].annotations is not None
+    assert report["incomplete_blocks"] == 1
+    assert report["calls"]["failed_blocks"] == 1
+
+
+def test_empty_annotations_are_not_built():
+    assert llm.build_block_annotations({}) is None
+    assert llm.build_block_annotations({"topic_sentence_range": None, "bilingual_anchors": []}) is None
+    annotations = llm.build_block_annotations({"topic_sentence_range": [0, 4]})
+    assert annotations is not None and not llm.is_empty_annotations(annotations)
@@ -0,0 +1,61 @@
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from jobs import Job, QUEUED, CONVERTING, ENRICHING, FAILED
+
+
+class OneJob:
+    def __init__(self, job):
+        self.job = job
+
+    def get(self, doc_id):
+        return self.job if doc_id == self.job.doc_id else None
+
+
+def make_job(stage, mode):
+    job = Job("doc", "doc.pdf", 0, None, {}, {"mode": mode})
+    job.stage = stage
+    return job
+
+
+@pytest.fixture
+def disk_reads(monkeypatch):
+    reads = []
+
+    def representation(doc_id, doc_dir, accept_encoding):
+        reads.append(doc_id)
+        return None
+
+    monkeypatch.setattr(main.hot_documents, "representation", representation)
+    return reads
+
+
+@pytest.mark.parametrize("stage, mode", [(QUEUED, "full"), (CONVERTING, "full"), (ENRICHING, "llm")])
+def test_poll_before_any_document_is_answered_from_job_state(monkeypatch, disk_reads, stage, mode):
+    monkeypatch.setattr(main, "scheduler", OneJob(make_job(stage, mode)))
+    assert TestClient(main.app).get("/api/get_pdf/doc").json() == {"status": "processing"}
+    assert disk_reads == []
+
+
+@pytest.mark.parametrize("stage, expected", [(ENRICHING, {"status": "processing"}),
+                                             (FAILED, {"status": "failed", "error": FAILED})])
+def test_skim_tier_or_failure_is_looked_up(monkeypatch, disk_reads, stage, expected):
+    monkeypatch.setattr(main, "scheduler", OneJob(make_job(stage, "full")))
+    assert TestClient(main.app).get("/api/get_pdf/doc").json() == expected
+    assert disk_reads == ["doc"]
+
+
+@pytest.mark.parametrize("requested, queued", [(None, 0), (-100, 0), (3, 3), (10 ** 6, main.UPLOAD_MAX_PRIORITY)])
+def test_upload_priority_is_clamped(monkeypatch, tmp_path, requested, queued):
+    submitted = []
+    monkeypatch.setattr(main, "UPLOAD_DIR", tmp_path)
+    monkeypatch.setattr(main, "ARTIFACT_DIR", tmp_path)
+    monkeypatch.setattr(main.content_index, "lookup_or_reserve", lambda digest, doc_id: (doc_id, False))
+    monkeypatch.setattr(main, "submit_job", lambda doc_id, path, digest, priority, mode: submitted.append(priority))
+
+    params = {} if requested is None else {"priority": requested}
+    response = TestClient(main.app).post("/api/upload_pdf", params=params,
+                                         files={"file": ("a.pdf", b"%PDF-1.4 test", "application/pdf")})
+    assert response.status_code == 200
+    assert submitted == [queued]
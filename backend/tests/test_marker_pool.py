@@ -0,0 +1,47 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+import marker_pool
+
+
+def slow_job(input_pdf, output_folder, submitted_at, page_range, task_id):
+    marker_pool._job_started(task_id, output_folder)
+    time.sleep(float(os.path.basename(input_pdf)))
+    return {"pid": os.getpid()}
+
+
+class SlowPool(marker_pool.MarkerPool):
+    job = staticmethod(slow_job)
+
+
+def test_timed_out_job_has_its_worker_replaced(tmp_path):
+    pool = SlowPool(1, 0)
+    try:
+        first = pool.convert(tmp_path / "0", tmp_path)["pid"]
+        with pytest.raises(multiprocessing.TimeoutError):
+            pool.convert(tmp_path / "60", tmp_path, timeout=1)
+        assert pool.terminated_workers == 1
+        # a fresh worker takes the next job instead of waiting behind the abandoned one
+        start = time.monotonic()
+        assert pool.convert(tmp_path / "0", tmp_path, timeout=30)["pid"] != first
+        assert time.monotonic() - start < 30
+    finally:
+        start = time.monotonic()
+        pool.close()
+        assert time.monotonic() - start < 10
+
+
+def test_job_given_up_before_it_started_is_skipped(tmp_path):
+    pool = SlowPool(1, 0)
+    try:
+        (tmp_path / "busy").mkdir()
+        busy = pool._pool.apply_async(slow_job, (str(tmp_path / "2"), str(tmp_path / "busy"), 0, None, 0))
+        with pytest.raises(RuntimeError, match="abandoned"):
+            pool.convert(tmp_path / "60", tmp_path / "removed", timeout=10)
+        busy.get(10)
+        assert pool.terminated_workers == 0
+    finally:
+        pool.close()
@@ -0,0 +1,41 @@
+import json
+
+from page_ranges import plan_ranges, range_dir, merge_range_outputs
+
+
+def write_range(ranges_root, page_range, children, images=()):
+    out = range_dir(ranges_root, page_range) / "part"
+    out.mkdir(parents=True)
+    (out / "part.json").write_text(json.dumps({"block_type": "Document", "children": children}))
+    for name in images:
+        (out / name).write_bytes(b"png")
+
+
+def test_plan_ranges():
+    assert plan_ranges(60, 25) == [(0, 24), (25, 49), (50, 59)]
+    assert plan_ranges(3, 25) == [(0, 2)]
+
+
+def test_ranges_numbered_from_zero_are_shifted_in_refs_only(tmp_path):
+    first = [{"id": "/page/0/Page/0", "html": "", "children": [
+        {"id": "/page/0/Text/1", "html": "<p>intro</p>"}]}]
+    # Marker numbered the second range (pages 25-49) from 0 again
+    second = [{"id": "/page/0/Page/0", "html": "", "children": [
+        {"id": "/page/0/Text/1", "html": "<p>See /page/3/ and _page_3_ in the text.</p>"},
+        {"id": "/page/0/Figure/2", "html": "<content-ref src='/page/0/Text/1'></content-ref><img src=\"_page_0_Figure_2.png\">",
+         "images": {"_page_0_Figure_2.png": "..."}, "section_hierarchy": {"1": "/page/0/SectionHeader/0"}}]}]
+    write_range(tmp_path, (0, 24), first, images=["_page_0_Figure_2.png"])
+    write_range(tmp_path, (25, 49), second, images=["_page_0_Figure_2.png"])
+
+    merged = merge_range_outputs([(0, 24), (25, 49)], tmp_path, tmp_path / "out.json", tmp_path / "images")
+
+    page = merged["children"][1]
+    text, figure = page["children"]
+    assert page["id"] == "/page/25/Page/0"
+    assert text["id"] == "/page/25/Text/1"
+    assert text["html"] == "<p>See /page/3/ and _page_3_ in the text.</p>"
+    assert figure["html"] == "<content-ref src='/page/25/Text/1'></content-ref><img src=\"_page_25_Figure_2.png\">"
+    assert list(figure["images"]) == ["_page_25_Figure_2.png"]
+    assert figure["section_hierarchy"] == {"1": "/page/25/SectionHeader/0"}
+    assert sorted(p.name for p in (tmp_path / "images").iterdir()) == ["_page_0_Figure_2.png", "_page_25_Figure_2.png"]
+    assert json.loads((tmp_path / "out.json").read_text()) == merged
@@ -0,0 +1,13 @@
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+import pipeline
+
+
+def test_unknown_enrichment_mode_fails_at_import():
+    result = subprocess.run([sys.executable, "-c", "import pipeline"], cwd=Path(pipeline.__file__).parent,
+                            env=dict(os.environ, ENRICHMENT_MODE="fast"), capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "ENRICHMENT_MODE must be one of full, skim, llm, got 'fast'" in result.stderr
@@ -0,0 +1,109 @@
+import pytest
+
+from resilience import (CircuitBreaker, CircuitOpenError, CallStats, MalformedReply, call_with_retries,
+                        call_with_salvage, classify_error, TRANSIENT, BATCH, FATAL)
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_classify_error():
+    assert classify_error(StatusError(429)) == TRANSIENT
+    assert classify_error(TimeoutError()) == TRANSIENT
+    assert classify_error(StatusError(401)) == FATAL
+    assert classify_error(MalformedReply("bad json")) == BATCH
+    assert classify_error(ValueError("anything else")) == BATCH
+
+
+def test_transient_errors_are_retried():
+    replies = [StatusError(503), StatusError(503), {"ok": True}]
+    delays = []
+
+    def call():
+        reply = replies.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return reply
+
+    stats = CallStats()
+    result = call_with_retries(call, 100, CircuitBreaker(failures=0), stats, max_retries=3, sleep=delays.append)
+    assert result == {"ok": True}
+    assert len(delays) == 2
+    assert stats.snapshot()["retries"] == 2
+    assert stats.snapshot()["wasted_input_tokens"] == 200
+
+
+def test_salvage_bisects_down_to_the_failing_item():
+    sent = []
+
+    def send(items):
+        sent.append(list(items))
+        if "bad" in items:
+            raise MalformedReply("cannot parse")
+        return {"items": list(items)}
+
+    stats = CallStats()
+    items = ["a", "b", "c", "bad", "e", "f", "g", "h"]
+    parts = call_with_salvage(items, send, len, CircuitBreaker(failures=0), stats)
+
+    assert [item for sub_items, _ in parts for item in sub_items] == ["a", "b", "c", "e", "f", "g", "h"]
+    assert all(result == {"items": sub_items} for sub_items, result in parts)
+    snapshot = stats.snapshot()
+    assert snapshot["failed_blocks"] == 1
+    assert snapshot["bisections"] == 3
+
+
+def test_fatal_error_stops_the_bisection():
+    calls = []
+
+    def send(items):
+        calls.append(items)
+        raise StatusError(403)
+
+    stats = CallStats()
+    assert call_with_salvage(list("abcd"), send, len, CircuitBreaker(failures=0), stats) == []
+    assert len(calls) == 1
+    assert stats.snapshot()["failed_blocks"] == 4
+
+
+def test_breaker_opens_then_probes_after_cooldown():
+    clock = Clock()
+    breaker = CircuitBreaker(failures=2, cooldown_s=10, clock=clock)
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.stats()["state"] == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now = 10
+    assert breaker.allow()          # the single half-open probe
+    assert not breaker.allow()
+    breaker.record_failure()        # failed probe: open again
+    assert not breaker.allow()
+
+    clock.now = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.stats()["state"] == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.times_opened == 2
+
+
+def test_open_breaker_refuses_calls():
+    breaker = CircuitBreaker(failures=1, cooldown_s=60, clock=Clock())
+    breaker.record_failure(fatal=True)
+    stats = CallStats()
+    with pytest.raises(CircuitOpenError):
+        call_with_retries(lambda: {}, 10, breaker, stats)
+    assert stats.snapshot()["breaker_rejections"] == 1
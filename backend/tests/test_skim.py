@@ -0,0 +1,25 @@
+from schemas import BlockAnnotations
+from skim import merge_skim
+
+SKIM = BlockAnnotations(topic_sentence_range=(0, 20), svo_structure={"subject": (0, 3), "verb": (4, 8)})
+
+
+def test_unannotated_block_takes_the_skim_tier():
+    assert merge_skim(None, SKIM) == (SKIM, True)
+
+
+def test_empty_llm_fields_are_filled_per_field():
+    llm_only_anchors = BlockAnnotations(bilingual_anchors=[{"term": "cat", "range": (4, 7), "translation": "猫"}])
+    merged, filled = merge_skim(llm_only_anchors, SKIM)
+    assert filled
+    assert merged.topic_sentence_range == (0, 20)
+    assert merged.svo_structure == SKIM.svo_structure
+    assert merged.bilingual_anchors == llm_only_anchors.bilingual_anchors
+
+
+def test_skim_svo_only_goes_with_the_skim_topic_sentence():
+    # SVO ranges are relative to the topic sentence: the LLM's own sentence gets no skim SVO
+    llm_topic = BlockAnnotations(topic_sentence_range=(25, 60))
+    merged, filled = merge_skim(llm_topic, SKIM)
+    assert not filled
+    assert merged is llm_topic
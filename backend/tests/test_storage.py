@@ -0,0 +1,73 @@
+import os
+
+from storage import StorageManager
+
+
+def add_document(artifact_dir, doc_id, size, mtime=None, checkpoint=False):
+    doc_dir = artifact_dir / doc_id
+    doc_dir.mkdir(parents=True)
+    (doc_dir / "content.json").write_bytes(b"x" * size)
+    if mtime is not None:
+        os.utime(doc_dir / "content.json", (mtime, mtime))
+    if checkpoint:
+        (doc_dir / "checkpoints").mkdir()
+
+
+def make_storage(tmp_path, quota, evict_target=0.5):
+    artifact_dir, upload_dir = tmp_path / "artifacts", tmp_path / "uploads"
+    artifact_dir.mkdir()
+    upload_dir.mkdir()
+    return StorageManager(artifact_dir, upload_dir, tmp_path / "storage.json", quota_bytes=quota,
+                          evict_target=evict_target)
+
+
+def test_least_recently_read_documents_go_first(tmp_path):
+    storage = make_storage(tmp_path, quota=3500, evict_target=0.6)
+    for n in range(4):
+        add_document(storage.artifact_dir, f"doc{n}", 1000, mtime=1000 + n)
+    (storage.upload_dir / "doc0.pdf").write_bytes(b"%PDF-")
+    storage.scan()
+    storage.touch("doc0")  # read just now: newest
+
+    evicted = []
+    freed = storage.enforce(on_evict=evicted.append)
+
+    # 4005 bytes, down to quota * evict_target = 2100: the two least recently read documents
+    assert evicted == ["doc1", "doc2"]
+    assert freed == 2000
+    assert not (storage.artifact_dir / "doc1").exists()
+    assert storage.is_evicted("doc1") and not storage.is_evicted("doc0")
+    assert (storage.upload_dir / "doc0.pdf").exists()
+
+
+def test_busy_and_unfinished_documents_are_kept(tmp_path):
+    storage = make_storage(tmp_path, quota=1500)
+    add_document(storage.artifact_dir, "running", 1000, mtime=1)
+    add_document(storage.artifact_dir, "resumable", 1000, mtime=2, checkpoint=True)
+    add_document(storage.artifact_dir, "done", 1000, mtime=3)
+    storage.scan()
+
+    evicted = []
+    storage.enforce(busy=["running"], on_evict=evicted.append)
+    assert evicted == ["done"]
+
+
+def test_evictions_survive_a_restart(tmp_path):
+    storage = make_storage(tmp_path, quota=500)
+    add_document(storage.artifact_dir, "doc0", 1000)
+    storage.scan()
+    storage.enforce()
+
+    reopened = StorageManager(storage.artifact_dir, storage.upload_dir, storage.state_path, quota_bytes=500)
+    assert reopened.is_evicted("doc0")
+    # processed again: no longer reported as evicted
+    add_document(storage.artifact_dir, "doc0", 10)
+    reopened.document_finished("doc0")
+    assert not reopened.is_evicted("doc0")
+
+
+def test_no_quota_evicts_nothing(tmp_path):
+    storage = make_storage(tmp_path, quota=0)
+    add_document(storage.artifact_dir, "doc0", 1000)
+    assert storage.enforce() == 0
+    assert (storage.artifact_dir / "doc0").exists()